@@ -0,0 +1,141 @@
+"""A local stand-in for the Gemini REST API, for exercising the real SDK and network path.
+
+    python -m benchmarks.fake_server --port 8765 --fail-rate 0.1 --slow-rate 0.05
+    GEMINI_API_ENDPOINT=http://127.0.0.1:8765 python -m src.app
+
+    # a fast and a strong model for GEMINI_FAST_MODEL routing
+    python -m benchmarks.fake_server --model-first-token fast-model=0.08 --model-first-token pro-model=0.6
+
+Serves `models/*:generateContent` and `models/*:streamGenerateContent` (JSON
+array or `alt=sse`) with the canned replies and latency model of
+`FakeModelConfig`; failed calls answer 503 and stalled calls sleep first.
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+from benchmarks.fakes import FakeModelConfig
+
+
+def _candidate(text: str, finish: bool) -> dict:
+    candidate = {"content": {"role": "model", "parts": [{"text": text}]}, "index": 0}
+    if finish:
+        candidate["finishReason"] = "STOP"
+    return {"candidates": [candidate]}
+
+
+def _prompt_of(body: dict) -> str:
+    for turn in reversed(body.get("contents", [])):
+        if turn.get("role", "user") == "user":
+            return " ".join(p.get("text", "") for p in turn.get("parts", []))
+    return ""
+
+
+class Handler(BaseHTTPRequestHandler):
+    config: FakeModelConfig = FakeModelConfig()
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, fmt, *args):
+        pass  # keep benchmark output clean
+
+    def _send_json(self, status: int, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def do_POST(self):
+        path, _, query = self.path.partition("?")
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        cfg = self.config
+
+        if not path.endswith((":generateContent", ":streamGenerateContent")):
+            self._send_json(404, {"error": {"code": 404, "message": f"Unknown method {path}",
+                                            "status": "NOT_FOUND"}})
+            return
+
+        # models/<name>:generateContent
+        model = path.rsplit("/", 1)[-1].split(":", 1)[0]
+        fails, stall = cfg.next_call(model)
+        time.sleep(cfg.first_token_for(model) + stall)
+        if fails:
+            self._send_json(503, {"error": {"code": 503, "message": "The model is overloaded.",
+                                            "status": "UNAVAILABLE"}})
+            return
+
+        reply = cfg.reply_for(_prompt_of(body), model)
+        if path.endswith(":generateContent"):
+            time.sleep(cfg.chunk_latency * (len(reply) // cfg.chunk_chars))
+            self._send_json(200, _candidate(reply, finish=True))
+            return
+
+        sse = "alt=sse" in query
+        chunks = [reply[i:i + cfg.chunk_chars] for i in range(0, len(reply), cfg.chunk_chars)] or [""]
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream" if sse else "application/json")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        if not sse:
+            self._write_chunk(b"[")
+        for i, chunk in enumerate(chunks):
+            if i:
+                time.sleep(cfg.chunk_latency)
+            event = json.dumps(_candidate(chunk, finish=i == len(chunks) - 1))
+            if sse:
+                self._write_chunk(f"data: {event}\r\n\r\n".encode())
+            else:
+                self._write_chunk((("," if i else "") + event).encode())
+        if not sse:
+            self._write_chunk(b"]")
+        self._write_chunk(b"")
+
+
+def serve(port: int = 0, config: Optional[FakeModelConfig] = None) -> ThreadingHTTPServer:
+    """Start the server on a background thread; `server.server_port` has the bound port."""
+    handler = type("ConfiguredHandler", (Handler,), {"config": config or FakeModelConfig()})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="fake-gemini", daemon=True).start()
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fake Gemini REST server")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--first-token", type=float, default=0.3, help="seconds to first chunk")
+    parser.add_argument("--chunk-latency", type=float, default=0.02)
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="share of calls answered with 503")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="share of calls that stall")
+    parser.add_argument("--slow-latency", type=float, default=2.0, help="seconds a stalled call adds")
+    parser.add_argument("--model-first-token", action="append", default=[], metavar="MODEL=SECONDS",
+                        help="first-token latency for one model name (repeatable)")
+    args = parser.parse_args(argv)
+
+    per_model = {}
+    for item in args.model_first_token:
+        name, _, seconds = item.partition("=")
+        per_model[name] = float(seconds)
+    config = FakeModelConfig(first_token_latency=args.first_token, chunk_latency=args.chunk_latency,
+                             fail_rate=args.fail_rate, slow_rate=args.slow_rate,
+                             slow_latency=args.slow_latency, model_first_token=per_model)
+    server = serve(args.port, config)
+    print(f"Fake Gemini listening on http://127.0.0.1:{server.server_port} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,331 @@
+"""Local stand-ins for Gemini and the Windows desktop, so benchmarks run headless.
+
+- `FakeGenerativeModel` replaces `genai.GenerativeModel`: configurable
+  first-token and per-chunk latency, streaming, canned JSON plans. Latency
+  and replies can differ per model name, to exercise fast/strong routing.
+- `FakeDesktop` replaces pyautogui / pygetwindow / pyperclip (and the
+  subprocess / webbrowser calls the commands make). It records every call
+  and simulates Office windows opening, new documents and the save dialog,
+  so the readiness waits in the real command code are exercised.
+"""
+import json
+import ntpath
+import random
+import re
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from types import ModuleType, SimpleNamespace
+from typing import Dict, List, Optional, Tuple
+
+ARTICLE = (
+    "## The Rise of the Machines: Exploring Automotive Electronics\n\n"
+    + " ".join(["Modern vehicles rely on electronic control units to manage engines, "
+                "transmissions, braking and infotainment."] * 30)
+)
+
+
+def _plan(*steps) -> str:
+    return json.dumps([{"command": c, "args": a, "say": s} for c, a, s in steps], indent=2)
+
+
+DEFAULT_RULES: List[Tuple[str, str]] = [
+    (r"open (?:microsoft )?word and write (?P<text>.+?) and save (?:it )?as (?P<name>\S+)",
+     _plan(("open_app", {"app": "word"}, "Opening Word for you."),
+           ("new_document", {"app": "word"}, "Creating a new document."),
+           ("type", {"text": "{text}"}, "Typing your text."),
+           ("save_file", {"filename": "{name}"}, "Saving."))),
+    (r"youtube.*word|word.*youtube",
+     _plan(("open_url", {"url": "https://www.youtube.com"}, "Opening YouTube."),
+           ("open_app", {"app": "word"}, "Opening Word for you."))),
+    (r"article", ARTICLE),
+]
+
+
+# ---------------- Fake Gemini ----------------
+@dataclass
+class FakeModelConfig:
+    first_token_latency: float = 0.3   # seconds until the first chunk
+    chunk_latency: float = 0.02        # seconds between chunks
+    chunk_chars: int = 40
+    fail_rate: float = 0.0             # share of calls that fail with a 503
+    slow_rate: float = 0.0             # share of calls that stall before answering
+    slow_latency: float = 2.0          # extra seconds for a stalled call
+    seed: Optional[int] = None
+    default_reply: str = "Hey there! How can I help you today?"
+    rules: List[Tuple[str, str]] = field(default_factory=lambda: list(DEFAULT_RULES))
+    model_first_token: Dict[str, float] = field(default_factory=dict)          # per model name
+    model_rules: Dict[str, List[Tuple[str, str]]] = field(default_factory=dict)  # tried before `rules`
+    calls: int = 0
+    calls_by_model: Dict[str, int] = field(default_factory=dict)
+
+    def __post_init__(self):
+        self._random = random.Random(self.seed)
+        self._lock = threading.Lock()
+
+    def next_call(self, model: str = "") -> Tuple[bool, float]:
+        """Count a call and decide its fate: (fails?, extra latency)."""
+        with self._lock:
+            self.calls += 1
+            self.calls_by_model[model] = self.calls_by_model.get(model, 0) + 1
+            fails = self._random.random() < self.fail_rate
+            stall = self.slow_latency if self._random.random() < self.slow_rate else 0.0
+        return fails, stall
+
+    def first_token_for(self, model: str) -> float:
+        return self.model_first_token.get(model, self.first_token_latency)
+
+    def reply_for(self, prompt: str, model: str = "") -> str:
+        for pattern, reply in self.model_rules.get(model, []) + self.rules:
+            m = re.search(pattern, prompt, re.IGNORECASE)
+            if m:
+                # Fill slots without tripping over JSON braces
+                for k, v in m.groupdict().items():
+                    reply = reply.replace("{" + k + "}", v)
+                return reply
+        return self.default_reply
+
+
+class ServiceUnavailable(Exception):
+    """Stands in for google.api_core.exceptions.ServiceUnavailable."""
+    code = 503
+
+
+class DeadlineExceeded(Exception):
+    code = 504
+
+
+class FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+def _last_user_text(contents) -> str:
+    if isinstance(contents, str):
+        return contents
+    for turn in reversed(contents):
+        if turn.get("role") == "user":
+            return str(turn["parts"][-1])
+    return ""
+
+
+class FakeGenerativeModel:
+    config = FakeModelConfig()
+
+    def __init__(self, model_name: str, system_instruction: Optional[str] = None, **kwargs):
+        self.model_name = model_name
+        self.system_instruction = system_instruction
+
+    def generate_content(self, contents, stream: bool = False, request_options=None, **kwargs):
+        cfg = self.config
+        fails, stall = cfg.next_call(self.model_name)
+        timeout = (request_options or {}).get("timeout")
+        reply = cfg.reply_for(_last_user_text(contents), self.model_name)
+        chunks = [reply[i:i + cfg.chunk_chars] for i in range(0, len(reply), cfg.chunk_chars)] or [""]
+        if stream:
+            return self._stream(chunks, stall, fails, timeout)
+        self._wait(cfg.first_token_for(self.model_name) + stall, timeout)
+        if fails:
+            raise ServiceUnavailable("503 The model is overloaded. Please try again later.")
+        time.sleep(cfg.chunk_latency * (len(chunks) - 1))
+        return FakeResponse(reply)
+
+    @staticmethod
+    def _wait(seconds: float, timeout: Optional[float]):
+        """Sleep like a slow server, honouring the client's request timeout."""
+        if timeout is not None and seconds > timeout:
+            time.sleep(timeout)
+            raise DeadlineExceeded(f"504 Deadline of {timeout:.1f}s exceeded")
+        time.sleep(seconds)
+
+    def _stream(self, chunks, stall=0.0, fails=False, timeout=None):
+        self._wait(self.config.first_token_for(self.model_name) + stall, timeout)
+        if fails:
+            raise ServiceUnavailable("503 The model is overloaded. Please try again later.")
+        for i, chunk in enumerate(chunks):
+            if i:
+                time.sleep(self.config.chunk_latency)
+            yield FakeResponse(chunk)
+
+
+def install_fake_genai(config: Optional[FakeModelConfig] = None) -> ModuleType:
+    """Register a fake `google.generativeai` before src.ai.gemini_client is imported."""
+    if config is not None:
+        FakeGenerativeModel.config = config
+    module = ModuleType("google.generativeai")
+    module.configure = lambda **kwargs: None
+    module.GenerativeModel = FakeGenerativeModel
+    sys.modules["google.generativeai"] = module
+    return module
+
+
+# ---------------- Fake desktop ----------------
+class FakeWindow:
+    _next = 1
+
+    def __init__(self, desktop: "FakeDesktop", title: str):
+        self._desktop = desktop
+        self.title = title
+        self._hWnd = FakeWindow._next
+        self.isMinimized = False
+        FakeWindow._next += 1
+
+    def restore(self):
+        self._desktop.record("restore", self.title)
+        self.isMinimized = False
+
+    def activate(self):
+        self._desktop.record("activate", self.title)
+        if not self.isMinimized:  # like Windows: a minimized window stays minimized
+            self._desktop.active = self
+
+
+APP_TITLES = {"winword.exe": "Word", "excel.exe": "Excel", "powerpnt.exe": "PowerPoint"}
+
+
+class FakeDesktop:
+    def __init__(self, launch_delay: float = 0.2, new_doc_delay: float = 0.05,
+                 dialog_delay: float = 0.03, key_cost: float = 0.0005):
+        self.launch_delay = launch_delay
+        self.new_doc_delay = new_doc_delay
+        self.dialog_delay = dialog_delay
+        self.key_cost = key_cost  # simulated time per keystroke
+
+        self.windows: List[FakeWindow] = []
+        self.active: Optional[FakeWindow] = None
+        self.calls: List[tuple] = []
+        self.clipboard = ""
+        self.typed: List[str] = []
+        self._doc_count = 0
+        self._processes: List[SimpleNamespace] = []
+        self._lock = threading.Lock()
+
+    def record(self, *call):
+        with self._lock:
+            self.calls.append(call)
+
+    def _later(self, delay: float, fn):
+        t = threading.Timer(delay, fn)
+        t.daemon = True
+        t.start()
+
+    def _open_window(self, title: str) -> FakeWindow:
+        w = FakeWindow(self, title)
+        with self._lock:
+            self.windows.append(w)
+        self.active = w
+        return w
+
+    def _app_of(self, window: Optional[FakeWindow]) -> str:
+        if window is None:
+            return ""
+        for app in APP_TITLES.values():
+            if window.title.endswith(app):
+                return app
+        return ""
+
+    # --- subprocess / webbrowser ---
+    def popen(self, args, **kwargs):
+        path = args[0] if isinstance(args, (list, tuple)) else args
+        exe = ntpath.basename(path).lower()  # APP_PATHS are Windows paths
+        self.record("popen", exe)
+        app = APP_TITLES.get(exe)
+        if app:
+            self._later(self.launch_delay, lambda: self._open_window(app))
+        # Runs until reset() closes everything
+        process = SimpleNamespace(pid=0, returncode=None)
+        process.poll = lambda: process.returncode
+        with self._lock:
+            self._processes.append(process)
+        return process
+
+    def open_url(self, url: str):
+        self.record("open_url", url)
+        self._later(self.launch_delay / 2, lambda: self._open_window(f"{url} - Browser"))
+        return True
+
+    # --- pygetwindow ---
+    def getAllWindows(self):
+        with self._lock:
+            return list(self.windows)
+
+    def getAllTitles(self):
+        return [w.title for w in self.getAllWindows()]
+
+    def getActiveWindow(self):
+        return self.active
+
+    def getWindowsWithTitle(self, title: str):
+        return [w for w in self.getAllWindows() if title.lower() in w.title.lower()]
+
+    # --- pyautogui ---
+    def press(self, key, *args, **kwargs):
+        self.record("press", key)
+        active = self.active
+        if key == "enter" and active is not None and active.title == "Save As":
+            name = "".join(self.typed).strip() or "Document"
+            self.typed.clear()
+            with self._lock:
+                self.windows.remove(active)
+            doc = self._save_target
+            doc.title = f"{name} - {self._app_of(doc)}"
+            self.active = doc
+
+    def hotkey(self, *keys, **kwargs):
+        self.record("hotkey", *keys)
+        active = self.active
+        app = self._app_of(active)
+        if keys == ("ctrl", "n") and app:
+            self._doc_count += 1
+            title = f"Document{self._doc_count} - {app}"
+            self._later(self.new_doc_delay, lambda: self._open_window(title))
+        elif keys == ("ctrl", "s") and app:
+            self._save_target = active
+            self.typed.clear()
+            self._later(self.dialog_delay, lambda: self._open_window("Save As"))
+        elif keys == ("ctrl", "v"):
+            self.typed.append(self.clipboard)
+
+    def write(self, text, interval: float = 0.0, **kwargs):
+        self.record("write", len(text))
+        time.sleep(len(text) * max(interval, self.key_cost))
+        self.typed.append(text)
+
+    typewrite = write
+
+    # --- pyperclip ---
+    def copy(self, text: str):
+        self.clipboard = text
+
+    def paste(self) -> str:
+        return self.clipboard
+
+    # --- Installation ---
+    def install(self):
+        """Register fake pyautogui / pygetwindow / pyperclip modules (call before importing src)."""
+        gui = ModuleType("pyautogui")
+        gui.FAILSAFE = True
+        gui.press, gui.hotkey, gui.write, gui.typewrite = self.press, self.hotkey, self.write, self.write
+        gw = ModuleType("pygetwindow")
+        gw.getAllWindows, gw.getAllTitles = self.getAllWindows, self.getAllTitles
+        gw.getActiveWindow, gw.getWindowsWithTitle = self.getActiveWindow, self.getWindowsWithTitle
+        clip = ModuleType("pyperclip")
+        clip.copy, clip.paste = self.copy, self.paste
+        sys.modules.update({"pyautogui": gui, "pygetwindow": gw, "pyperclip": clip})
+
+    def patch_commands(self, apps_module, desktop_module):
+        """Route process launches and browser opens to the fake."""
+        apps_module.subprocess = SimpleNamespace(Popen=self.popen)
+        desktop_module.webbrowser = SimpleNamespace(open=self.open_url)
+
+    def reset(self):
+        with self._lock:
+            self.windows.clear()
+            self.calls.clear()
+            for process in self._processes:
+                process.returncode = 0
+            self._processes.clear()
+        self.active = None
+        self.typed.clear()
+        self._doc_count = 0
@@ -1,9 +1,21 @@
+from collections import defaultdict
 from dataclasses import dataclass
-from typing import Callable, Dict, Any
-import pyautogui
-import pygetwindow as gw
-import time
-import subprocess
+from typing import Callable, Dict, Any, Optional, Set, Tuple
+from pathlib import Path
+from urllib.parse import quote_plus, urlparse
+import os
+from src.automation import apps, desktop, readiness, text_input
+from src.automation.windows import tracker
+from src.lazy_import import lazy_import
+from src.tracing import span
+
+pyautogui = lazy_import("pyautogui")
+
+# Shared resources used by the plan scheduler. Steps that need the same
+# resource run in plan order; FOCUS (keyboard/foreground window) conflicts
+# with every other step.
+FOCUS = "focus"
+BROWSER = "browser"
 
 @dataclass
 class Command:
@@ -11,6 +23,19 @@ class Command:
     func: Callable[[Dict[str, Any]], str]
     description: str
     schema: Dict[str, Any]
+    # Resource names, formatted with the call args (e.g. "window:{app}")
+    resources: Tuple[str, ...] = (FOCUS,)
+    # Optional first phase that needs none of the resources (e.g. launching an
+    # app): the scheduler starts it as soon as the step is submitted and hands
+    # its result to `func` as args["_prepared"]
+    prepare: Optional[Callable[[Dict[str, Any]], Any]] = None
+
+    def resources_for(self, args: Dict[str, Any]) -> Set[str]:
+        """Concrete resources a call with `args` needs."""
+        values = defaultdict(str, {k: str(v).lower() for k, v in args.items()})
+        if values["app"]:
+            values["app"] = APP_ALIASES.get(values["app"], values["app"])
+        return {r.format_map(values) for r in self.resources}
 
 REGISTRY: Dict[str, Command] = {}
 
@@ -36,27 +61,32 @@ APP_ALIASES = {
     "powerpoint": "powerpoint"
 }
 
+# Reuses running apps and pre-launches predicted ones. App history stays in
+# memory until the app picks its data directory (see use_data_dir)
+app_registry = apps.AppRegistry(APP_PATHS, APP_ALIASES, None)
+
+
+def use_data_dir(data_dir: str, prewarm: bool = True):
+    """Remember recently opened apps in `data_dir`/app_history.json."""
+    global app_registry
+    app_registry = apps.AppRegistry(APP_PATHS, APP_ALIASES, Path(data_dir) / "app_history.json")
+    app_registry.prewarm_enabled = prewarm
+
 # --- Helper functions ---
 def _wait_for_window(app_name: str, timeout: float = 15) -> bool:
-    """Wait until the app window is active and ready."""
-    start = time.time()
-    while time.time() - start < timeout:
-        try:
-            windows = gw.getAllTitles()
-            matches = [w for w in windows if app_name.lower() in w.lower()]
-            if matches:
-                gw.getWindowsWithTitle(matches[0])[0].activate()
-                time.sleep(0.5)
-                return True
-        except Exception:
-            pass
-        time.sleep(0.3)
-    return False
+    """Wait until the app window exists, then bring it to the foreground."""
+    with span("wait.window", app=app_name) as attrs:
+        attrs["ok"] = tracker.activate(app_name, timeout=timeout)
+    return attrs["ok"]
 
 def _get_active_office_app() -> str:
-    """Detect which Office app is currently active."""
+    """Detect which Office app is currently active (focusing one if none is)."""
+    active = tracker.active_title().lower()
+    for app in APP_PATHS:
+        if app in active:
+            return app
     for app in APP_PATHS:
-        if _wait_for_window(app, timeout=0.5):
+        if tracker.activate(app):
             return app
     return ""
 
@@ -91,15 +121,36 @@ def parse_natural_command(command_text: str) -> Dict[str, str]:
     return args
 
 # --- Commands ---
+def _launch_app(args: Dict[str, Any]) -> str:
+    """
+    First phase of open_app, safe to overlap with other steps: start the app
+    and wait for its window without touching focus. Returns how it went
+    ("reused", "warming", "launched", "missing" or "unknown").
+    """
+    app = APP_ALIASES.get(args.get("app", "").lower())
+    if not app:
+        return "unknown"
+    how = app_registry.open(app)
+    if how == "reused":
+        return how
+    # Pre-launched apps are partway up already; keep their timings apart from cold launches
+    step = "launch_warm" if how == "warming" else "launch"
+    if not readiness.wait_for_window(app, step, app, default_timeout=15):
+        return "missing"
+    return how
+
 def _cmd_open_app(args: Dict[str, Any]) -> str:
     app_input = args.get("app", "").lower()
     app = APP_ALIASES.get(app_input)
     if not app:
         return f"⚠️ Unknown or missing app: '{app_input}'"
 
-    subprocess.Popen([APP_PATHS[app]])
-    if not _wait_for_window(app):
+    # Bringing the window forward changes focus, so it runs in plan order (FOCUS)
+    how = args.get("_prepared") or _launch_app(args)
+    if how == "missing" or not _wait_for_window(app, timeout=1):
         return f"⚠️ Could not detect {app.capitalize()} window."
+    if how == "reused":
+        return f"✅ Switched to {app.capitalize()}"
     return f"✅ Opened {app.capitalize()}"
 
 def _cmd_new_document(args: Dict[str, Any]) -> str:
@@ -109,8 +160,17 @@ def _cmd_new_document(args: Dict[str, Any]) -> str:
     if not _wait_for_window(app, timeout=15):
         return f"⚠️ {app.capitalize()} window not ready."
 
+    # Ready when a new document window opens or the foreground window changes
+    before = tracker.active_title()
+    count = sum(app in t.lower() for t in tracker.titles())
     pyautogui.hotkey("ctrl", "n")
-    time.sleep(2)
+    opened = readiness.wait_until(
+        app, "new_document",
+        lambda active, titles: active != before or sum(app in t.lower() for t in titles) > count,
+        default_timeout=4,
+    )
+    if not opened:
+        return f"⚠️ No new {app.capitalize()} document appeared."
     return f"📝 Created a new blank {app.capitalize()} document."
 
 def _cmd_type(args: Dict[str, Any]) -> str:
@@ -122,8 +182,12 @@ def _cmd_type(args: Dict[str, Any]) -> str:
     if not app:
         return "⚠️ No Office window is active."
 
-    pyautogui.typewrite(text, interval=0.05)
-    return f"✍️ Typed in {app.capitalize()}: '{text}'"
+    try:
+        text_input.inject_text(text, target=app)
+    except text_input.FocusLostError:
+        return f"⚠️ {app.capitalize()} lost focus while typing."
+    preview = text if len(text) <= 80 else text[:77] + "…"
+    return f"✍️ Typed in {app.capitalize()}: '{preview}'"
 
 def _cmd_save_file(args: Dict[str, Any]) -> str:
     filename = args.get("filename", "")
@@ -134,14 +198,37 @@ def _cmd_save_file(args: Dict[str, Any]) -> str:
     if not app:
         return "⚠️ No Office window is active."
 
+    before = tracker.active_title()
     pyautogui.hotkey("ctrl", "s")
-    time.sleep(0.5)
-    pyautogui.typewrite(filename)
-    time.sleep(0.2)
+    if not readiness.wait_for_active_change(app, "save_dialog", before, default_timeout=3):
+        # Typing now would put the file name into the document
+        return f"⚠️ {app.capitalize()} did not open the Save dialog."
+    text_input.inject_text(filename)
     pyautogui.press("enter")
-    time.sleep(0.5)
+    # Done once the document window title shows the new file name
+    stem = os.path.splitext(filename)[0]
+    if not readiness.wait_for_active_title(app, "save_done", stem, default_timeout=5):
+        return f"⚠️ Could not confirm {app.capitalize()} saved {filename}."
     return f"💾 Saved {app.capitalize()} file as: {filename}"
 
+def _cmd_open_url(args: Dict[str, Any]) -> str:
+    url = args.get("url", "").strip()
+    if not url:
+        return "⚠️ Missing 'url'"
+    if "://" not in url:
+        url = "https://" + url
+    if urlparse(url).scheme not in ("http", "https"):
+        return f"⚠️ Refusing to open non-web URL: {url}"
+    desktop.open_url(url)
+    return f"🌐 Opened {url}"
+
+def _cmd_download(args: Dict[str, Any]) -> str:
+    item = args.get("item", "").strip()
+    if not item:
+        return "⚠️ Missing 'item'"
+    desktop.open_url(f"https://www.google.com/search?q={quote_plus('download ' + item)}")
+    return f"🔎 Opened download search for: {item}"
+
 # --- Full automated flow command ---
 def _cmd_open_type_save(args: Dict[str, Any]) -> str:
     """Open app, create new document, type text, and optionally save."""
@@ -174,8 +261,10 @@ def _cmd_open_type_save(args: Dict[str, Any]) -> str:
     return "\n".join(filter(None, [open_result, new_doc_result, type_result, save_result]))
 
 # --- Register commands ---
-register(Command("open_app", _cmd_open_app, "Open an Office application", {"app": "str"}))
+register(Command("open_app", _cmd_open_app, "Open an Office application", {"app": "str"}, prepare=_launch_app))
 register(Command("new_document", _cmd_new_document, "Create a new blank document/workbook/presentation", {"app": "str"}))
 register(Command("type", _cmd_type, "Type text into the active Office window", {"text": "str"}))
 register(Command("save_file", _cmd_save_file, "Save the current document/workbook/presentation", {"filename": "str"}))
 register(Command("open_type_save", _cmd_open_type_save, "Open app, create new document, type text, and save", {"app": "str", "text": "str", "filename": "str", "command_text": "str"}))
+register(Command("open_url", _cmd_open_url, "Open a URL in the default browser", {"url": "str"}, resources=(BROWSER,)))
+register(Command("download", _cmd_download, "Open a download/search page for an item", {"item": "str"}, resources=(BROWSER,)))
@@ -1,48 +1,78 @@
 """Parse model suggestions and execute only safe-listed commands."""
-import json
-from typing import Tuple, Union
-from . import commands
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from src.tracing import span, traced
+from . import commands, plan_cache
+from .scheduler import PlanScheduler, Step
+from .stream_parser import CommandStreamParser
 
 
-def try_execute_from_text(text: str) -> Tuple[str, str]:
-    text = text.strip()
-    start = text.find("{")
-    end = text.rfind("}")
-    list_start = text.find("[")
-    list_end = text.rfind("]")
+def new_plan_parser() -> CommandStreamParser:
+    """Incremental parser that only yields safe-listed commands."""
+    return CommandStreamParser(allowed=commands.REGISTRY)
 
-    # Detect whether we have a list of commands or a single JSON object
-    if list_start != -1 and list_end != -1 and list_end > list_start:
-        maybe = text[list_start:list_end + 1]
-    elif start != -1 and end != -1 and end > start:
-        maybe = text[start:end + 1]
-    else:
-        return text, ""  # no JSON found
 
-    try:
-        data = json.loads(maybe)
-    except Exception:
-        return text, ""  # not valid JSON; treat as chat
+def parse_plan(text: str) -> Optional[List[Dict[str, Any]]]:
+    """Extract a command plan (list, single object, fenced or inside prose) from a reply, or None."""
+    with span("executor.parse", chars=len(text)) as attrs:
+        plan = new_plan_parser().feed(text)
+        attrs["commands"] = len(plan)
+    return plan or None
 
-    results = []
-    say_output = []
 
-    # Handle both a list of commands and a single command dict
-    commands_to_run = data if isinstance(data, list) else [data]
+def reply_text(text: str) -> str:
+    """
+    What to show for a reply without a runnable plan: the reply itself, or if
+    it only asked for commands we don't have, their `say` lines and a warning
+    instead of the raw JSON.
+    """
+    parser = new_plan_parser()
+    parser.feed(text)
+    if not parser.rejected:
+        return text.strip()
+    say = [obj["say"].strip() for obj in parser.rejected
+           if isinstance(obj.get("say"), str) and obj["say"].strip()]
+    names = list(dict.fromkeys(str(obj["command"]) for obj in parser.rejected))
+    label = "command" if len(names) == 1 else "commands"
+    return "\n".join(say + [f"⚠️ Unsupported {label}: {', '.join(names)}"])
 
-    for cmd_data in commands_to_run:
-        cmd_name = cmd_data.get("command")
-        args = cmd_data.get("args", {})
-        say = cmd_data.get("say", "")
 
-        if not cmd_name or cmd_name not in commands.REGISTRY:
-            continue  # skip unknown command
+@traced("executor.try_execute")
+def try_execute_from_text(text: str, prompt: Optional[str] = None) -> Tuple[str, str]:
+    """
+    Run the plan in a model reply, if there is one. With the `prompt` that
+    produced the reply, a successful plan is learned as a template (see plan_cache).
+    """
+    plan = parse_plan(text)
+    if plan is None:
+        return reply_text(text), ""
+    say, results = execute_commands(plan)
+    if prompt:
+        plan_cache.templates.observe(prompt, plan, results.splitlines())
+    return say or text.strip(), results
 
-        cmd = commands.REGISTRY[cmd_name]
-        result = cmd.func(args)
 
-        if say:
-            say_output.append(say)
-        results.append(result)
+def execute_commands(commands_to_run: Iterable[Dict[str, Any]],
+                     cancel_event: Optional[threading.Event] = None,
+                     on_step: Optional[Callable[[Step, str], None]] = None) -> Tuple[str, str]:
+    """
+    Run a command plan. Independent steps run concurrently (see PlanScheduler)
+    and each step starts as soon as it is yielded, so `commands_to_run` may be
+    a generator fed from a streaming reply; output stays in plan order.
+    `on_step(step, result)` is called as each step completes, and setting
+    `cancel_event` skips the steps that have not started yet.
+    Returns (say text, results text).
+    """
+    with span("executor.plan") as attrs:
+        scheduler = PlanScheduler(cancel_event=cancel_event, on_step=on_step)
+        try:
+            for cmd_data in commands_to_run:
+                scheduler.submit(cmd_data)
+            steps = scheduler.wait()
+        finally:
+            scheduler.shutdown()
+        attrs["steps"] = len(steps)
 
-    return "\n".join(say_output) or text, "\n".join(results)
+    say_output = [step.say for step in steps if step.say]
+    results = [step.future.result() for step in steps]
+    return "\n".join(say_output), "\n".join(results)
@@ -0,0 +1,394 @@
+"""Plan templates learned from Gemini: run repeat-shaped requests locally.
+
+"open word and write hello and save it as notes" and "open excel and write
+totals and save it as q3" get the same plan from Gemini with different
+values. After a plan succeeds, the request is turned into a pattern with
+argument slots ("open {0} and write {1} and save it as {2}") and the plan
+into a template referring to those slots. Later requests with the same shape
+are filled in and executed without a model round trip. A template whose
+plan fails is dropped.
+"""
+import json
+import logging
+import os
+import re
+import threading
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from . import commands
+
+logger = logging.getLogger(__name__)
+
+MAX_TEMPLATES = 500
+MIN_SLOT_CHARS = 2       # shorter values ("a", "1") are too ambiguous to slot
+MAX_CONSTANT_CHARS = 40  # longer fixed text was written by the model; don't replay it
+MIN_LITERAL_WORDS = 2    # "write {0}" matches nearly anything
+SLOT_WORD_MARGIN = 1     # a slot may capture this many words more or fewer than it was learned with
+# Words that start another step; a slot value only contains them if the learned one did
+CONNECTORS = frozenset({"and", "then", "also", "after"})
+FAILURE_MARKS = ("⚠️", "❌")
+
+# How a slot value is derived from the text it was captured from
+_TRANSFORMS: Dict[str, Callable[[str], str]] = {
+    "same": lambda s: s,
+    "lower": str.lower,
+    "upper": str.upper,
+    "capitalize": str.capitalize,
+    "title": str.title,
+}
+
+
+def normalize(prompt: str) -> str:
+    return " ".join(prompt.split()).rstrip(".!?")
+
+
+def failed(results: List[str]) -> bool:
+    """True if any step result reports a failure (see commands.py)."""
+    return any(r.startswith(FAILURE_MARKS) for r in results)
+
+
+def _escape(text: str) -> str:
+    return text.replace("{", "{{").replace("}", "}}")
+
+
+@dataclass
+class Template:
+    pattern: str                        # e.g. "open {0} and write {1}", for display and as key
+    regex: str                          # matches requests of this shape, one group per slot
+    transforms: List[str]               # per slot, a _TRANSFORMS name
+    plan: List[Dict[str, Any]]          # string values are format templates: {s0}, {s0_capitalize}, ...
+    hits: int = 0
+    successes: int = 0
+    connectors: List[bool] = field(default_factory=list)  # per slot: learned value had "and"/"then"
+
+    def __post_init__(self):
+        self._compiled = re.compile(self.regex, re.IGNORECASE | re.DOTALL)
+
+    @property
+    def leading_word(self) -> str:
+        return _leading_word(self.pattern)
+
+    def instantiate(self, prompt: str) -> Optional[List[Dict[str, Any]]]:
+        """The plan for `prompt` if it has this template's shape, else None."""
+        m = self._compiled.fullmatch(prompt)
+        if not m:
+            return None
+        values = [_TRANSFORMS[t](v.strip()) for t, v in zip(self.transforms, m.groups())]
+        if any(len(v) < MIN_SLOT_CHARS for v in values):
+            return None
+        # "save it as notes and email it to bob" is two requests, not one filename
+        if any(not allowed and _has_connector(v) for v, allowed in zip(values, self.connectors)):
+            return None
+        fields = {f"s{i}_{name}": fn(v) for i, v in enumerate(values) for name, fn in _TRANSFORMS.items()}
+        fields.update((f"s{i}", v) for i, v in enumerate(values))
+        try:
+            plan = [_fill(cmd, fields) for cmd in self.plan]
+        except (IndexError, KeyError, ValueError):
+            return None
+        return plan if all(_valid(cmd) for cmd in plan) else None
+
+    def to_json(self) -> dict:
+        return asdict(self)
+
+
+def _has_connector(text: str) -> bool:
+    return any(word in CONNECTORS for word in text.lower().split())
+
+
+def _slot_regex(value: str) -> str:
+    """Capture about as many words as `value` has, never an open-ended tail."""
+    words = len(value.split())
+    low, high = max(1, words - SLOT_WORD_MARGIN), words + SLOT_WORD_MARGIN
+    return rf"(\S+(?:\s+\S+){{{low - 1},{high - 1}}})"
+
+
+def _leading_word(pattern: str) -> str:
+    first = pattern.split(" ", 1)[0].lower()
+    return "" if first.startswith("{") else first
+
+
+def _fill(value, fields: Dict[str, str]):
+    if isinstance(value, str):
+        return value.format_map(fields)
+    if isinstance(value, dict):
+        return {k: _fill(v, fields) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_fill(v, fields) for v in value]
+    return value
+
+
+def _valid(cmd: Dict[str, Any]) -> bool:
+    """Only replay plans the executor would accept as written."""
+    if cmd.get("command") not in commands.REGISTRY:
+        return False
+    app = (cmd.get("args") or {}).get("app")
+    return app is None or str(app).lower() in commands.APP_ALIASES
+
+
+def build_template(prompt: str, plan: List[Dict[str, Any]]) -> Optional[Template]:
+    """
+    Derive a template from a request and the plan that answered it, or None
+    if the plan can't be tied to the request unambiguously. Every argument
+    value that appears once in the request becomes a slot that captures about
+    as many words as the value had; the template is only kept if it has at
+    least MIN_LITERAL_WORDS fixed words and filling it back in reproduces
+    `plan` exactly.
+    """
+    prompt = normalize(prompt)
+    values = []
+    for cmd in plan:
+        if not isinstance(cmd, dict) or cmd.get("command") not in commands.REGISTRY:
+            return None
+        for v in (cmd.get("args") or {}).values():
+            if isinstance(v, str) and v.strip() and v not in values:
+                values.append(v)
+
+    # Longest values first so "microsoft word" is slotted before "word"
+    slots: List[Tuple[int, int, str, str]] = []  # start, end, value, transform
+    for value in sorted(values, key=len, reverse=True):
+        if len(value) < MIN_SLOT_CHARS:
+            continue
+        found = [m for m in re.finditer(rf"(?<!\w){re.escape(value)}(?!\w)", prompt, re.IGNORECASE)
+                 if not any(m.start() < end and start < m.end() for start, end, _v, _t in slots)]
+        if len(found) > 1:
+            return None  # can't tell which occurrence the model used
+        if not found:
+            if len(value) > MAX_CONSTANT_CHARS:
+                return None
+            continue
+        span = found[0].group(0)
+        transform = next((name for name, fn in _TRANSFORMS.items() if fn(span) == value), None)
+        if transform is None:
+            continue
+        slots.append((found[0].start(), found[0].end(), value, transform))
+    slots.sort()
+
+    # Literal text between slots keeps the regex unambiguous
+    pattern_parts, regex_parts, literals, pos = [], [], [], 0
+    for i, (start, end, value, _t) in enumerate(slots):
+        literal = prompt[pos:start]
+        if i > 0 and not literal.strip():
+            return None
+        pattern_parts += [_escape(literal), f"{{{i}}}"]
+        regex_parts += [_literal_regex(literal), _slot_regex(value)]
+        literals.append(literal)
+        pos = end
+    pattern_parts.append(_escape(prompt[pos:]))
+    regex_parts.append(_literal_regex(prompt[pos:]))
+    literals.append(prompt[pos:])
+    if slots and len(" ".join(literals).split()) < MIN_LITERAL_WORDS:
+        return None
+
+    slot_of = {value: i for i, (_s, _e, value, _t) in enumerate(slots)}
+    template = Template(
+        pattern="".join(pattern_parts),
+        regex="".join(regex_parts),
+        transforms=[t for _s, _e, _v, t in slots],
+        plan=[_templated(cmd, slot_of) for cmd in plan],
+        connectors=[_has_connector(v) for _s, _e, v, _t in slots],
+    )
+    return template if template.instantiate(prompt) == plan else None
+
+
+def _literal_regex(text: str) -> str:
+    return r"\s+".join(re.escape(word) for word in text.split(" "))
+
+
+def _templated(cmd: Dict[str, Any], slot_of: Dict[str, int]) -> Dict[str, Any]:
+    """Replace slot values in a command: whole argument values, and mentions in `say`."""
+    args = {}
+    for k, v in (cmd.get("args") or {}).items():
+        if isinstance(v, str):
+            args[k] = f"{{s{slot_of[v]}}}" if v in slot_of else _escape(v)
+        else:
+            args[k] = v
+    out = dict(cmd, args=args)
+    if isinstance(cmd.get("say"), str):
+        out["say"] = _templated_text(cmd["say"], slot_of)
+    for k, v in out.items():
+        if k not in ("args", "say") and isinstance(v, str):
+            out[k] = _escape(v)
+    return out
+
+
+def _templated_text(text: str, slot_of: Dict[str, int]) -> str:
+    """Slot mentions in free text, in any casing ("Opening Word" for the value "word")."""
+    if not slot_of:
+        return _escape(text)
+    lowered = {v.lower(): v for v in slot_of}
+    alternation = "|".join(re.escape(v) for v in sorted(slot_of, key=len, reverse=True))
+    out = []
+    # re.split alternates literal text and captured mentions
+    for i, part in enumerate(re.split(rf"(?<!\w)({alternation})(?!\w)", text, flags=re.IGNORECASE)):
+        value = lowered.get(part.lower()) if i % 2 else None
+        name = value is not None and next((n for n, fn in _TRANSFORMS.items() if fn(value) == part), None)
+        out.append(f"{{s{slot_of[value]}_{name}}}" if name else _escape(part))
+    return "".join(out)
+
+
+@dataclass
+class Lookup:
+    template: Template
+    plan: List[Dict[str, Any]]
+
+
+@dataclass
+class CacheStats:
+    lookups: int = 0
+    hits: int = 0
+    learned: int = 0
+    invalidated: int = 0
+    by_template: Dict[str, Dict[str, int]] = field(default_factory=dict)
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / self.lookups if self.lookups else 0.0
+
+
+class PlanTemplateCache:
+    """Learned templates, indexed by their first literal word, persisted as JSON."""
+
+    def __init__(self, path: Optional[Path], max_templates: int = MAX_TEMPLATES, enabled: bool = True):
+        self.path = path
+        self.max_templates = max_templates
+        self.enabled = enabled
+        self._templates: Dict[str, Template] = {}          # pattern -> template
+        self._by_word: Dict[str, List[Template]] = {}      # leading word ("" = slot) -> templates
+        self._lookups = self._hits = self._learned = self._invalidated = 0
+        self._lock = threading.Lock()
+        self._load()
+
+    # --- Lookup ---
+    def lookup(self, prompt: str, record: bool = True) -> Optional[Lookup]:
+        """
+        A filled-in plan for `prompt` from a learned template, or None.
+
+        Args:
+            record (bool): False = just peek (e.g. while the user is still
+                typing); hit/lookup counters are left alone.
+        """
+        if not self.enabled:
+            return None
+        prompt = normalize(prompt)
+        word = prompt.split(" ", 1)[0].lower()
+        with self._lock:
+            if record:
+                self._lookups += 1
+            candidates = self._by_word.get(word, []) + self._by_word.get("", [])
+            # Most successful shapes first
+            for template in sorted(candidates, key=lambda t: -t.successes):
+                plan = template.instantiate(prompt)
+                if plan is not None:
+                    if record:
+                        self._hits += 1
+                        template.hits += 1
+                    return Lookup(template, plan)
+        return None
+
+    # --- Learning ---
+    def observe(self, prompt: str, plan: List[Dict[str, Any]], results: List[str],
+                template: Optional[Template] = None):
+        """
+        Report how a plan went. A Gemini plan that succeeded is learned; a
+        templated plan that failed invalidates its template.
+        """
+        if not self.enabled or not prompt or not plan:
+            return
+        if template is not None:
+            if failed(results):
+                self.invalidate(template)
+            else:
+                with self._lock:
+                    template.successes += 1
+                self._save()
+            return
+        if not failed(results):
+            self.learn(prompt, plan)
+
+    def learn(self, prompt: str, plan: List[Dict[str, Any]]) -> Optional[Template]:
+        template = build_template(prompt, plan)
+        if template is None:
+            logger.debug("No template for %r", prompt)
+            return None
+        with self._lock:
+            known = self._templates.get(template.pattern)
+            if known is not None and known.plan == template.plan:
+                return known
+            if known is not None:
+                self._unindex(known)
+            if len(self._templates) >= self.max_templates:
+                # Forget the least useful template
+                self._unindex(min(self._templates.values(), key=lambda t: (t.successes, t.hits)))
+            self._index(template)
+            self._learned += 1
+        logger.info("Learned plan template: %s", template.pattern)
+        self._save()
+        return template
+
+    def invalidate(self, template: Template):
+        with self._lock:
+            if self._templates.get(template.pattern) is not template:
+                return
+            self._unindex(template)
+            self._invalidated += 1
+        logger.info("Dropped plan template after a failed run: %s", template.pattern)
+        self._save()
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(
+                lookups=self._lookups,
+                hits=self._hits,
+                learned=self._learned,
+                invalidated=self._invalidated,
+                by_template={t.pattern: {"hits": t.hits, "successes": t.successes}
+                             for t in self._templates.values()},
+            )
+
+    def __len__(self) -> int:
+        return len(self._templates)
+
+    # --- Internals ---
+    def _index(self, template: Template):
+        self._templates[template.pattern] = template
+        self._by_word.setdefault(template.leading_word, []).append(template)
+
+    def _unindex(self, template: Template):
+        del self._templates[template.pattern]
+        self._by_word[template.leading_word].remove(template)
+
+    def _load(self):
+        if self.path is None or not self.path.exists():
+            return
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            for item in data:
+                self._index(Template(**item))
+        except Exception:
+            logger.warning("Ignoring unreadable plan templates %s", self.path)
+            self._templates, self._by_word = {}, {}
+
+    def _save(self):
+        if self.path is None:
+            return
+        with self._lock:
+            data = [t.to_json() for t in self._templates.values()]
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp, self.path)
+        except Exception:
+            logger.debug("Saving plan templates failed", exc_info=True)
+
+
+# In memory until the app picks its data directory (see use_data_dir)
+templates = PlanTemplateCache(None)
+
+
+def use_data_dir(data_dir: str, enabled: bool = True):
+    """Learn templates into (and load them from) `data_dir`/plan_templates.json."""
+    global templates
+    templates = PlanTemplateCache(Path(data_dir) / "plan_templates.json", enabled=enabled)
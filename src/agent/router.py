@@ -0,0 +1,147 @@
+"""Local fast path: turn recognizable requests into command plans without Gemini."""
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from .commands import APP_ALIASES, REGISTRY
+
+# Only route locally when every clause is understood with high confidence
+MIN_CONFIDENCE = 0.9
+
+# Longest aliases first so "microsoft word" wins over "word"
+_ALIASES = "|".join(re.escape(a) for a in sorted(APP_ALIASES, key=len, reverse=True))
+_VERBS = r"(?:open|launch|start|run|type|save|create|make)"
+
+# Split between clauses only where the next word starts a new command, so text
+# like "type salt and pepper" stays intact.
+_SPLIT_RE = re.compile(
+    rf"\s*(?:,\s*)?(?:\band\s+then\b|\band\b|\bthen\b|,)\s*(?={_VERBS}\b)", re.IGNORECASE
+)
+
+_CLAUSES = [
+    ("new_document", re.compile(
+        rf"^(?:please\s+)?(?:create|make|start|open)\s+(?:a\s+)?new\s+(?:blank\s+)?"
+        rf"(?:document|doc|workbook|spreadsheet|sheet|presentation|deck|file)"
+        rf"(?:\s+in\s+(?:the\s+)?(?P<app>{_ALIASES}))?$", re.IGNORECASE)),
+    ("open_app", re.compile(
+        rf"^(?:please\s+)?(?:open|launch|start|run)\s+(?:up\s+)?(?:the\s+)?(?P<app>{_ALIASES})"
+        rf"(?:\s+(?:app|application))?$", re.IGNORECASE)),
+    ("type", re.compile(
+        r"^(?:please\s+)?type\s+(?:in\s+)?(?P<text>.+)$", re.IGNORECASE | re.DOTALL)),
+    ("save_file", re.compile(
+        r"^(?:please\s+)?save\s+(?:it\s+|this\s+|the\s+(?:file|document|doc)\s+)?(?P<named>as\s+)?"
+        r"(?P<filename>[\w][\w\-. ]*)$", re.IGNORECASE)),
+]
+
+# "type an article about X" asks Gemini to write something, not to type literally
+_GENERATIVE_TEXT_RE = re.compile(
+    r"^(?:me\s+)?(?:an?|some|the)\s+(?:\w+\s+){0,3}?(?:about|on|for|regarding)\b", re.IGNORECASE
+)
+
+# "what type of music do you like?" is chat, even if a clause regex matches
+_QUESTION_RE = re.compile(
+    r"^(?:what|how|why|who|whom|which|when|where|do|does|did|can|could|would|should|is|are)\b"
+    r"|\?\s*$", re.IGNORECASE
+)
+SAVE_NAME_MAX_WORDS = 2   # "save as quarterly report" yes, "save the planet from aliens" no
+
+_SAY = {
+    "open_app": "Opening {app} for you.",
+    "new_document": "Creating a new {app} document.",
+    "type": "Typing your text.",
+    "save_file": "Saving as {filename}.",
+}
+
+
+@dataclass
+class Route:
+    commands: List[Dict[str, Any]]
+    confidence: float
+
+
+def _strip_quotes(text: str) -> str:
+    text = text.strip()
+    if len(text) >= 2 and text[0] == text[-1] and text[0] in "\"'“”":
+        return text[1:-1]
+    return text
+
+
+def _match_clause(clause: str, app_context: bool = False):
+    """
+    Return (command name, args, confidence) for one clause, or None.
+
+    Args:
+        clause (str): One clause of the request.
+        app_context (bool): An earlier clause opened an app or document, so
+            "type ..." clearly means keystrokes.
+    """
+    for name, pattern in _CLAUSES:
+        m = pattern.match(clause)
+        if not m:
+            continue
+        args = {k: v for k, v in m.groupdict().items() if v}
+        named = bool(args.pop("named", None))
+        confidence = 1.0
+        if "app" in args:
+            args["app"] = APP_ALIASES[args["app"].lower()]
+        if name == "type":
+            text = args["text"].strip()
+            quoted = _strip_quotes(text) != text
+            args["text"] = _strip_quotes(text)
+            if _GENERATIVE_TEXT_RE.match(args["text"]):
+                confidence = 0.4
+            elif not quoted and not app_context:
+                confidence = 0.6   # "type of music do you like": maybe just chat
+        if name == "save_file":
+            args["filename"] = args["filename"].strip()
+            words = len(args["filename"].split())
+            if words > SAVE_NAME_MAX_WORDS or (words > 1 and not named):
+                confidence = 0.5   # "save the world" is not a filename
+        return name, args, confidence
+    return None
+
+
+def route_command(text: str, min_confidence: float = MIN_CONFIDENCE) -> Optional[Route]:
+    """
+    Match `text` against the registered commands and app aliases.
+    Returns a command plan when every clause is recognized with at least
+    `min_confidence`, otherwise None so the caller falls back to Gemini.
+    """
+    text = text.strip().rstrip(".!")
+    if not text:
+        return None
+
+    steps = []
+    confidence = 0.3 if _QUESTION_RE.search(text) else 1.0
+    for clause in _SPLIT_RE.split(text):
+        app_context = any(name in ("open_app", "new_document") for name, _args in steps)
+        match = _match_clause(clause.strip(), app_context)
+        if match is None:
+            return None
+        steps.append(match[:2])
+        confidence = min(confidence, match[2])
+    if confidence < min_confidence:
+        return None
+
+    plan: List[Dict[str, Any]] = []
+    app = ""
+    for i, (name, args) in enumerate(steps):
+        if name not in REGISTRY:
+            return None
+        if name == "open_app":
+            app = args["app"]
+        if name == "new_document":
+            args.setdefault("app", app or "word")
+        fields = dict(args, app=args.get("app", app).capitalize())
+        plan.append({"command": name, "args": args, "say": _SAY[name].format(**fields)})
+        # Office apps open on their start screen: add a blank document before
+        # typing, like the open_type_save flow does
+        nxt = steps[i + 1][0] if i + 1 < len(steps) else None
+        if name == "open_app" and nxt == "type":
+            plan.append({
+                "command": "new_document",
+                "args": {"app": app},
+                "say": _SAY["new_document"].format(app=app.capitalize()),
+            })
+
+    return Route(commands=plan, confidence=confidence)
@@ -0,0 +1,134 @@
+"""Run command plans as a dependency graph instead of strictly one by one."""
+import contextvars
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from src.tracing import span
+from . import commands
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Step:
+    index: int
+    data: Dict[str, Any]
+    resources: Set[str]
+    future: Future = field(default_factory=Future)
+    prepared: Optional[Future] = None   # the command's prepare phase, started at submit
+    waiting_on: int = 0
+    dependents: List["Step"] = field(default_factory=list)
+    # Captured at submit so spans from the step join the caller's trace
+    context: contextvars.Context = field(default_factory=contextvars.copy_context)
+
+    @property
+    def say(self) -> str:
+        return self.data.get("say", "")
+
+
+def _conflicts(a: Set[str], b: Set[str]) -> bool:
+    """Steps conflict if they share a resource or either needs keyboard focus."""
+    return commands.FOCUS in a or commands.FOCUS in b or bool(a & b)
+
+
+class PlanScheduler:
+    """
+    Steps are submitted in plan order (possibly while the plan is still
+    arriving). Each new step depends on every earlier step it conflicts with
+    and starts as soon as those finish, so independent steps (e.g. `open_url`
+    while Word is launching) overlap and total time approaches the critical
+    path. Focus-dependent steps keep their relative order; a command's
+    `prepare` phase (e.g. launching an app) still starts right away.
+    """
+
+    def __init__(self, max_workers: int = 4, cancel_event: Optional[threading.Event] = None,
+                 on_step: Optional[Callable[[Step, str], None]] = None):
+        """
+        Args:
+            max_workers (int): Max steps running at once.
+            cancel_event (threading.Event): When set, steps that have not started are skipped.
+            on_step (Callable): Called with (step, result) as each step finishes.
+        """
+        self.cancel_event = cancel_event or threading.Event()
+        self.on_step = on_step
+        self.steps: List[Step] = []
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="plan-step")
+        self._lock = threading.Lock()
+
+    def submit(self, cmd_data: Dict[str, Any]) -> Optional[Step]:
+        """Add the next step of the plan. Unknown commands are skipped (None)."""
+        cmd = commands.REGISTRY.get(cmd_data.get("command"))
+        if cmd is None:
+            return None
+        args = cmd_data.get("args", {}) or {}
+
+        with self._lock:
+            step = Step(len(self.steps), cmd_data, cmd.resources_for(args))
+            for earlier in self.steps:
+                if not earlier.future.done() and _conflicts(earlier.resources, step.resources):
+                    earlier.dependents.append(step)
+                    step.waiting_on += 1
+            self.steps.append(step)
+            ready = step.waiting_on == 0
+            if cmd.prepare is not None:
+                # Queued before the step itself, so a step waiting on it never holds up the pool.
+                # A copy of the context: one Context can't be entered by two threads at once
+                step.prepared = self._pool.submit(step.context.copy().run, self._prepare, cmd, args)
+        if ready:
+            self._start(step)
+        return step
+
+    def _start(self, step: Step):
+        self._pool.submit(step.context.run, self._run, step)
+
+    def _prepare(self, cmd: "commands.Command", args: Dict[str, Any]) -> Any:
+        if self.cancel_event.is_set():
+            return None
+        with span(f"command.{cmd.name}.prepare"):
+            return cmd.prepare(args)
+
+    def _run(self, step: Step):
+        result = ""
+        try:
+            if self.cancel_event.is_set():
+                result = "⏹️ Cancelled"
+            else:
+                cmd = commands.REGISTRY[step.data["command"]]
+                args = step.data.get("args", {}) or {}
+                if step.prepared is not None:
+                    args = dict(args, _prepared=step.prepared.result())
+                with span(f"command.{cmd.name}", step=step.index):
+                    result = cmd.func(args)
+        except Exception as e:
+            logger.exception("Step %d (%s) failed", step.index, step.data.get("command"))
+            result = f"⚠️ {step.data.get('command')} failed: {e}"
+        finally:
+            self._finish(step, result)
+
+    def _finish(self, step: Step, result: str):
+        with self._lock:
+            step.future.set_result(result)
+            ready = []
+            for dep in step.dependents:
+                dep.waiting_on -= 1
+                if dep.waiting_on == 0:
+                    ready.append(dep)
+        if self.on_step is not None:
+            try:
+                self.on_step(step, result)
+            except Exception:
+                logger.exception("on_step callback failed")
+        for dep in ready:
+            self._start(dep)
+
+    def wait(self) -> List[Step]:
+        """Block until every submitted step has finished; return them in plan order."""
+        for step in list(self.steps):
+            step.future.result()
+        return self.steps
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False)
@@ -0,0 +1,124 @@
+"""Single-pass incremental extraction of command objects from model output."""
+import json
+import re
+from typing import Any, Container, Dict, List, Optional
+
+# The only characters that change parser state; everything else is skipped in bulk.
+# Newlines and backticks matter only inside an object: a blank line or a ``` fence
+# can't occur in JSON there, so they mean the "{" was prose and the object is dropped.
+_SPECIAL_RE = re.compile(r'[{}"\\\n`]')
+
+
+class CommandStreamParser:
+    """
+    Feed reply text in chunks; every time a top-level JSON object closes it is
+    decoded and returned right away. Works for a bare object, objects inside a
+    JSON list, ```json fences and objects surrounded by prose, because anything
+    outside an object (brackets, commas, fences, words) is simply skipped.
+
+    The scan only stops at structural characters ({, }, ", \\, newlines and
+    backticks); only the text of the object currently being read is buffered.
+    An open object is abandoned at a blank line or a ``` fence, so a stray "{"
+    in prose can't swallow the commands that follow it.
+    """
+
+    def __init__(self, allowed: Optional[Container[str]] = None):
+        """
+        Args:
+            allowed: If given, only objects whose "command" is in it are returned.
+        """
+        self.allowed = allowed
+        self.rejected: List[Dict[str, Any]] = []  # command objects not in `allowed`
+        self._buf: List[str] = []   # text of the open object from earlier chunks
+        self._depth = 0
+        self._in_string = False
+        self._escape_at: Optional[int] = None  # index of a char escaped by "\\"
+        self._newline_at: Optional[int] = None  # last newline inside the object (-1: end of last chunk)
+        self._tick_at: Optional[int] = None     # last backtick, and how many in a row
+        self._ticks = 0
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """Consume `chunk` and return the command objects completed by it."""
+        done = []
+        start = 0 if self._depth else None  # where the open object starts in this chunk
+        for m in _SPECIAL_RE.finditer(chunk):
+            i = m.start()
+            if self._escape_at is not None:
+                escaped = i == self._escape_at
+                self._escape_at = None
+                if escaped:
+                    continue
+            ch = chunk[i]
+
+            if self._depth == 0:
+                if ch == "{":
+                    self._depth = 1
+                    start = i
+                    self._newline_at = self._tick_at = None
+                continue
+
+            if ch == "\n":
+                blank = self._newline_at is not None and not chunk[self._newline_at + 1:i].strip()
+                self._newline_at = i
+                if blank:
+                    self._reset()
+                    start = None
+                continue
+            if ch == "`":
+                self._ticks = self._ticks + 1 if self._tick_at == i - 1 else 1
+                self._tick_at = i
+                if self._ticks == 3 and not self._in_string:
+                    self._reset()
+                    start = None
+                continue
+
+            if self._in_string:
+                if ch == "\\":
+                    self._escape_at = i + 1
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch == "{":
+                self._depth += 1
+            elif ch == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._buf.append(chunk[start:i + 1])
+                    obj = self._decode("".join(self._buf))
+                    self._buf.clear()
+                    start = None
+                    if obj is not None:
+                        done.append(obj)
+
+        if start is not None:
+            self._buf.append(chunk[start:])
+        if self._escape_at is not None:
+            # The escaped char is the first one of the next chunk
+            self._escape_at = 0 if self._escape_at == len(chunk) else None
+        # Carry a trailing newline / backtick run over to the next chunk
+        if self._newline_at is not None:
+            self._newline_at = -1 if not chunk[self._newline_at + 1:].strip() else None
+        if self._tick_at is not None:
+            self._tick_at = -1 if self._tick_at == len(chunk) - 1 else None
+        return done
+
+    def _reset(self):
+        """Drop the open object: its "{" was part of the prose."""
+        self._buf.clear()
+        self._depth = 0
+        self._in_string = False
+        self._escape_at = None
+        self._newline_at = self._tick_at = None
+
+    def _decode(self, raw: str) -> Optional[Dict[str, Any]]:
+        try:
+            obj = json.loads(raw)
+        except ValueError:
+            return None  # braces in prose, not a JSON object
+        if not isinstance(obj, dict) or not obj.get("command"):
+            return None
+        if self.allowed is not None and obj["command"] not in self.allowed:
+            self.rejected.append(obj)
+            return None
+        return obj
@@ -0,0 +1,218 @@
+"""Token-budgeted conversation context with a rolling summary of older turns."""
+import json
+import logging
+import os
+import threading
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+Turn = Dict[str, str]
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for English text)."""
+    return len(text) // 4 + 1
+
+
+class ContextBuilder:
+    """
+    Builds the `contents` list sent to Gemini:
+
+    [running summary of older turns] + [older turns relevant to the prompt]
+    + [recent turns that fit the budget] + [prompt]
+
+    The summary is cached (and persisted to `summary_file`) and is brought up
+    to date on a background thread, so building a request never waits on it.
+    Relevant older turns come from `retrieve` (e.g. a MemoryIndex search).
+    """
+
+    SUMMARY_PROMPT = (
+        "You maintain a running summary of a conversation between a user and a "
+        "desktop assistant. Update the summary with the new turns below. Keep "
+        "facts, names, file names and open tasks; drop small talk. Reply with the "
+        "summary only, at most {words} words.\n\n"
+        "Current summary:\n{summary}\n\nNew turns:\n{turns}"
+    )
+
+    def __init__(self, summarize: Callable[[str], str], budget_tokens: int = 4000,
+                 summary_tokens: int = 400, summary_file: Optional[str] = None,
+                 retrieve: Optional[Callable[[str, int], List[int]]] = None,
+                 retrieval_tokens: int = 600):
+        """
+        Args:
+            summarize (Callable[[str], str]): Sends a prompt to a model and returns its text.
+            budget_tokens (int): Max tokens of history + summary + prompt per request.
+            summary_tokens (int): Target size of the running summary.
+            summary_file (str): Where to cache the summary between runs.
+            retrieve (Callable[[str, int], List[int]]): retrieve(prompt, before) returns
+                positions of past turns relevant to the prompt, best first, all < before.
+            retrieval_tokens (int): Part of the budget set aside for retrieved turns.
+        """
+        self.summarize = summarize
+        self.budget_tokens = budget_tokens
+        self.summary_tokens = summary_tokens
+        self.summary_file = summary_file
+        self.retrieve = retrieve
+        self.retrieval_tokens = retrieval_tokens
+
+        self.summary = ""
+        self.summarized_upto = 0  # history[:summarized_upto] is covered by the summary
+        self._lock = threading.Lock()
+        self._worker: Optional[threading.Thread] = None
+        self._load_summary()
+
+    # --- Building requests ---
+    def build(self, history: Sequence[Turn], prompt: str) -> List[dict]:
+        """
+        Return Gemini `contents` for `prompt` given the prior `history`.
+        Only the turns that are used are read, so `history` may page lazily.
+        """
+        with self._lock:
+            if self.summarized_upto > len(history):
+                # Memory was reset underneath a cached summary
+                self.summary, self.summarized_upto = "", 0
+            summary = self.summary
+
+        remaining = self.budget_tokens - estimate_tokens(prompt)
+        if summary:
+            remaining -= estimate_tokens(summary)
+
+        # Walk back from the newest turn until the budget is used up
+        recent: List[Turn] = []
+        start = len(history)
+        while start > 0 and remaining > 0:
+            turn = history[start - 1]
+            cost = estimate_tokens(turn["content"])
+            if cost > remaining:
+                if remaining > 50 and not recent:
+                    # Keep the tail of a long latest turn rather than nothing
+                    recent.append({"role": turn["role"],
+                                   "content": "…" + turn["content"][-remaining * 4:]})
+                    start -= 1
+                break
+            recent.append(turn)
+            remaining -= cost
+            start -= 1
+        recent.reverse()
+
+        # With older turns left out, trade the oldest recent turns for relevant
+        # ones, but only as many as the hits that were actually found need
+        relevant = ""
+        if self.retrieve and start > 0:
+            free = max(0, remaining)
+            tradable = sum(estimate_tokens(t["content"]) for t in recent[:-2])
+            budget = min(max(free, self.retrieval_tokens), free + tradable)
+            relevant, cost = self._relevant(history, prompt, start, budget) if budget > 0 else ("", 0)
+            while cost > free and len(recent) > 2:
+                free += estimate_tokens(recent.pop(0)["content"])
+                start += 1
+
+        if start > self.summarized_upto:
+            self._refresh_summary(history, start)
+
+        contents: List[dict] = []
+        if summary:
+            contents.append({"role": "user", "parts": [f"Summary of our earlier conversation:\n{summary}"]})
+            contents.append({"role": "model", "parts": ["Understood."]})
+        if relevant:
+            contents.append({"role": "user", "parts": [f"Possibly relevant earlier messages:\n{relevant}"]})
+            contents.append({"role": "model", "parts": ["Noted."]})
+        for turn in recent:
+            self._add_turn(contents, turn["role"], turn["content"])
+        self._add_turn(contents, "user", prompt)
+        return contents
+
+    def _relevant(self, history: Sequence[Turn], prompt: str, before: int,
+                  budget: int) -> Tuple[str, int]:
+        """Older turns matching the prompt, each with its question/answer partner, in order; and their token cost."""
+        try:
+            hits = self.retrieve(prompt, before)
+        except Exception:
+            logger.exception("Retrieving relevant turns failed")
+            return "", 0
+        picked, used = set(), 0
+        for pos in hits:
+            # Show an exchange: a question with its answer, an answer with its question
+            partner = pos + 1 if history[pos]["role"] == "user" else pos - 1
+            group = [p for p in (pos, partner) if 0 <= p < before and p not in picked]
+            cost = sum(estimate_tokens(history[p]["content"][:1000]) for p in group)
+            if cost > budget:
+                continue
+            picked.update(group)
+            budget -= cost
+            used += cost
+        text = "\n".join(f"{history[p]['role']}: {history[p]['content'][:1000]}" for p in sorted(picked))
+        return text, used
+
+    @staticmethod
+    def _add_turn(contents: List[dict], role: str, text: str):
+        """Append a turn, merging consecutive same-role turns (Gemini wants alternation)."""
+        if not contents and role != "user":
+            return  # a conversation must start with the user
+        if contents and contents[-1]["role"] == role:
+            contents[-1]["parts"].append(text)
+        else:
+            contents.append({"role": role, "parts": [text]})
+
+    # --- Rolling summary ---
+    def _refresh_summary(self, history: Sequence[Turn], upto: int):
+        """Summarize history[summarized_upto:upto] in the background (one job at a time)."""
+        if self._worker is not None and self._worker.is_alive():
+            return
+        self._worker = threading.Thread(
+            target=self._summarize_turns, args=(history, self.summarized_upto, upto),
+            name="context-summary", daemon=True
+        )
+        self._worker.start()
+
+    def _summarize_turns(self, history: Sequence[Turn], pos: int, upto: int):
+        # Feed turns in budget-sized chunks so a long backlog never makes one huge request.
+        # Turns are read one at a time: history before `upto` never changes, and a
+        # segmented history only keeps the segments being read in memory.
+        chunk_budget = max(500, self.budget_tokens // 2)
+        summary = self.summary
+        try:
+            while pos < upto:
+                chunk, used = [], 0
+                while pos < upto:
+                    turn = history[pos]
+                    line = f"{turn['role']}: {turn['content'][:2000]}"
+                    cost = estimate_tokens(line)
+                    if chunk and used + cost > chunk_budget:
+                        break
+                    chunk.append(line)
+                    used += cost
+                    pos += 1
+                summary = self.summarize(self.SUMMARY_PROMPT.format(
+                    words=int(self.summary_tokens * 0.75),
+                    summary=summary or "(empty)",
+                    turns="\n".join(chunk),
+                )).strip()
+                with self._lock:
+                    self.summary = summary
+                    self.summarized_upto = pos
+            self._save_summary()
+        except Exception:
+            logger.exception("Updating conversation summary failed")
+
+    def _load_summary(self):
+        if not self.summary_file or not os.path.exists(self.summary_file):
+            return
+        try:
+            with open(self.summary_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.summary = data.get("summary", "")
+            self.summarized_upto = int(data.get("upto", 0))
+        except Exception:
+            self.summary, self.summarized_upto = "", 0
+
+    def _save_summary(self):
+        if not self.summary_file:
+            return
+        with self._lock:
+            data = {"summary": self.summary, "upto": self.summarized_upto}
+        tmp = self.summary_file + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp, self.summary_file)
@@ -1,32 +1,31 @@
 import os
-import json
-import google.generativeai as genai
+import logging
+import shutil
+import threading
+import time
+from typing import Container, Dict, Iterator, List, Tuple
+from .context import ContextBuilder
+from .memory_index import MemoryIndex
+from .memory_store import MemoryJournal
+from .model_router import FAST, FAST_MAX_WORDS, STRONG, ModelRouter, Route
+from .resilience import ResilientCaller, RetryPolicy
+from .response_cache import ResponseCache
+from src.lazy_import import lazy_import
+from src import tracing
 
+genai = lazy_import("google.generativeai")
 
-class GeminiClient:
-    """
-    Wrapper for Google Gemini Generative AI API.
-    Provides text generation, automation commands, and memory persistence.
-    """
+logger = logging.getLogger(__name__)
 
-    def __init__(self, api_key: str = None, model: str = "gemini-1.5-flash"):
-        """
-        Initialize Gemini client.
-        Args:
-            api_key (str): Google Gemini API key. If None, will read from env var GEMINI_API_KEY.
-            model (str): Gemini model name.
-        """
-        self.api_key = api_key or os.getenv("GEMINI_API_KEY")
-        if not self.api_key:
-            raise ValueError("Gemini API key not provided. Set GEMINI_API_KEY env variable.")
+ERROR_PREFIX = "[Gemini Error]"
 
-        genai.configure(api_key=self.api_key)
-        self.model_name = model
+DEFAULT_DATA_DIR = os.path.join(os.path.expanduser("~"), ".gemini_agent")
+# Memory used to be kept next to this module, inside the source tree
+LEGACY_DATA_DIR = os.path.dirname(__file__)
+DATA_FILES = ("gemini_memory.json", "gemini_memory.journal.jsonl", "gemini_memory.segments",
+              "gemini_summary.json", "gemini_index.pkl", "gemini_cache.json")
 
-        # 🔹 Force automation instructions
-        self.model = genai.GenerativeModel(
-            self.model_name,
-            system_instruction="""
+SYSTEM_INSTRUCTION = """
 You are a desktop automation agent.
 
 When the user asks to open apps, type text, open URLs, or download anything,
@@ -64,54 +63,405 @@ Supported commands:
 - Always return JSON when automation is possible.
 - If the request is purely conversational (not automation), reply normally in plain text.
 """
+
+
+class GeminiClient:
+    """
+    Wrapper for Google Gemini Generative AI API.
+    Provides text generation, automation commands, and memory persistence.
+    """
+
+    def __init__(self, api_key: str = None, model: str = "gemini-1.5-flash",
+                 context_tokens: int = 4000, cache_enabled: bool = True,
+                 cache_ttl: float = 7 * 24 * 3600, data_dir: str = None,
+                 request_timeout: float = 30.0, retries: int = 2, hedge: bool = True,
+                 api_endpoint: str = None, fast_model: str = None,
+                 fast_max_words: int = FAST_MAX_WORDS, escalate: bool = True,
+                 plan_commands: Container[str] = None):
+        """
+        Initialize Gemini client.
+        Args:
+            api_key (str): Google Gemini API key. If None, will read from env var GEMINI_API_KEY.
+            model (str): Gemini model name.
+            context_tokens (int): Token budget for prior turns + summary + prompt per request.
+            cache_enabled (bool): Serve repeated prompts from the on-disk response cache.
+            cache_ttl (float): Seconds before a cached reply expires.
+            data_dir (str): Where memory, summary and cache files live. Defaults to
+                ~/.gemini_agent (memory from the old in-package location is copied there once).
+            request_timeout (float): Seconds one attempt may take before it is abandoned.
+            retries (int): Extra attempts after rate limits, 5xx errors and timeouts.
+            hedge (bool): Send a second copy of requests that run past the recent p95.
+            api_endpoint (str): Alternative API endpoint, e.g. a local fake server
+                ("http://127.0.0.1:8765"). Uses the REST transport.
+            fast_model (str): Low-latency model for short and command-like prompts;
+                `model` then handles long-form ones (see ModelRouter). None = one model.
+            fast_max_words (int): Longest prompt (in words) still sent to the fast model.
+            escalate (bool): Re-ask `model` when the fast model's plan doesn't parse.
+            plan_commands (Container[str]): Command names a valid plan may use.
+        """
+        self.api_key = api_key or os.getenv("GEMINI_API_KEY")
+        if not self.api_key:
+            raise ValueError("Gemini API key not provided. Set GEMINI_API_KEY env variable.")
+
+        if api_endpoint:
+            genai.configure(api_key=self.api_key, transport="rest",
+                            client_options={"api_endpoint": api_endpoint})
+        else:
+            genai.configure(api_key=self.api_key)
+        self.model_name = model
+
+        # 🔹 Force automation instructions
+        self.model = genai.GenerativeModel(
+            self.model_name,
+            system_instruction=SYSTEM_INSTRUCTION,
         )
 
-        # Simple chat history
+        # Short / command-like prompts go to the fast model when there is one
+        self.router = ModelRouter(model, fast_model, fast_max_words=fast_max_words,
+                                  escalate=escalate, commands=plan_commands)
+        self.models = {STRONG: self.model}
+        if self.router.enabled:
+            self.models[FAST] = genai.GenerativeModel(fast_model, system_instruction=SYSTEM_INSTRUCTION)
+
+        # Every call goes through here: deadlines, retries, hedging
+        self.caller = ResilientCaller(RetryPolicy(
+            attempt_timeout=request_timeout,
+            deadline=request_timeout * (retries + 1),
+            retries=retries,
+            hedge=hedge,
+        ))
+
+        # Chat history, persisted turn by turn through an append-only journal.
+        # Older turns stay on disk in segments until something reads them.
         self.history = []
-        self.memory_file = os.path.join(os.path.dirname(__file__), "gemini_memory.json")
+        self._history_lock = threading.RLock()  # requests may run on several threads
+        self.data_dir = data_dir or DEFAULT_DATA_DIR
+        os.makedirs(self.data_dir, exist_ok=True)
+        if data_dir is None:
+            self._adopt_legacy_data()
+        self.memory_file = os.path.join(self.data_dir, "gemini_memory.json")
+        self._journal = MemoryJournal(self.memory_file)
         self._load_memory()
 
-    def generate(self, prompt: str) -> str:
+        # Search index over every turn; feeds relevant old turns into requests
+        self.index = MemoryIndex(os.path.join(self.data_dir, "gemini_index.pkl"))
+        self.index.sync(self.history)
+
+        # Recent turns within budget + a running summary of everything older.
+        # The summarizer has no automation instructions so it replies in prose.
+        self._summary_model = genai.GenerativeModel(self.model_name)
+        self._context = ContextBuilder(
+            self._summarize,
+            budget_tokens=context_tokens,
+            summary_file=os.path.join(self.data_dir, "gemini_summary.json"),
+            retrieve=self._retrieve,
+        )
+
+        # Repeated prompts ("hey", "open notepad") are answered from disk
+        self.cache = ResponseCache(
+            os.path.join(self.data_dir, "gemini_cache.json"),
+            ttl=cache_ttl,
+            enabled=cache_enabled,
+        )
+
+    def generate(self, prompt: str, use_cache: bool = True, remember: bool = True) -> str:
         """
         Generate a response from Gemini.
         Args:
             prompt (str): User input.
+            use_cache (bool): Set to False to bypass the response cache.
+            remember (bool): Set to False to leave history alone (the caller
+                commits the exchange with `record()` when it is ready).
         Returns:
             str: AI response text.
         """
-        try:
-            # Append to history
-            self.history.append({"role": "user", "content": prompt})
+        with tracing.span("gemini.generate") as attrs:
+            key = self._cache_key(prompt)
+            cached = self.cache.get(key) if use_cache else None
+            attrs["cached"] = cached is not None
+            if cached is not None:
+                if remember:
+                    self.record(prompt, cached)
+                return cached.strip()
 
-            response = self.model.generate_content(prompt)
+            try:
+                contents = self._build_contents(prompt)
 
-            if hasattr(response, "text"):
-                reply = response.text
-            elif hasattr(response, "candidates") and response.candidates:
-                reply = response.candidates[0].content.parts[0].text
-            else:
-                reply = str(response)
+                # Append to history
+                if remember:
+                    self._remember("user", prompt)
+
+                route = self.router.route(prompt)
+                attrs["route"] = route.tier
+                reply = self._generate_routed(route, contents, attrs)
+
+                # Append AI reply
+                if remember:
+                    self._remember("model", reply)
+                if use_cache and reply.strip():
+                    self.cache.put(key, reply)
+
+                return reply.strip()
+            except Exception as e:
+                attrs["error"] = type(e).__name__
+                return f"{ERROR_PREFIX} {str(e)}"
+
+    def generate_stream(self, prompt: str, use_cache: bool = True,
+                        remember: bool = True) -> Iterator[str]:
+        """
+        Stream a response from Gemini as it is produced.
+        Args:
+            prompt (str): User input.
+            use_cache (bool): Set to False to bypass the response cache.
+            remember (bool): Set to False to leave history alone (see `generate`).
+        Yields:
+            str: Text chunks in arrival order. The full reply is appended
+            to history once the stream completes.
+        """
+        # Spans can't wrap a generator's yields, so this one is recorded by hand
+        wall, start = time.time(), time.perf_counter()
+        attrs = {"cached": False}
+        try:
+            yield from self._stream(prompt, use_cache, remember, attrs, start)
+        finally:
+            tracing.record("gemini.stream", wall, time.perf_counter() - start, **attrs)
 
-            # Append AI reply
-            self.history.append({"role": "model", "content": reply})
+    def _stream(self, prompt, use_cache, remember, attrs, start):
+        """Body of generate_stream; fills in `attrs` for its span."""
+        key = self._cache_key(prompt)
+        cached = self.cache.get(key) if use_cache else None
+        if cached is not None:
+            attrs["cached"] = True
+            if remember:
+                self.record(prompt, cached)
+            yield cached
+            return
 
-            return reply.strip()
+        contents = self._build_contents(prompt)
+        if remember:
+            self._remember("user", prompt)
+        route = self.router.route(prompt)
+        attrs["route"] = route.tier
+        parts = []
+        try:
+            for piece in self._stream_routed(route, contents, attrs):
+                if not parts:
+                    attrs["ttft_ms"] = round((time.perf_counter() - start) * 1000, 1)
+                parts.append(piece)
+                yield piece
         except Exception as e:
-            return f"[Gemini Error] {str(e)}"
+            attrs["error"] = type(e).__name__
+            yield f"{ERROR_PREFIX} {str(e)}"
+            return
 
-    def _load_memory(self):
-        """Load previous chat memory if available."""
-        if os.path.exists(self.memory_file):
+        reply = "".join(parts)
+        if remember:
+            self._remember("model", reply)
+        if use_cache and reply.strip():
+            self.cache.put(key, reply)
+
+    # --- Model routing ---
+    def _generate_routed(self, route: Route, contents: list, attrs: dict) -> str:
+        """Blocking reply from the routed model, escalated to the strong one if it fails or isn't a valid plan."""
+        if route.tier == FAST:
+            try:
+                reply = self._generate_with(FAST, contents)
+                if not self.router.needs_escalation(route, reply):
+                    return reply
+            except Exception as e:
+                if not self.router.escalate:
+                    raise
+                logger.warning("Fast model failed (%s); asking %s", e, self.model_name)
+            attrs["escalated"] = True
+            self.router.escalated()
+        return self._generate_with(STRONG, contents)
+
+    def _generate_with(self, tier: str, contents: list) -> str:
+        model = self.models[tier]
+        start = time.perf_counter()
+        response = self.caller.call(
+            lambda timeout: model.generate_content(contents, request_options={"timeout": timeout}),
+            kind=self._call_kind("generate", tier),
+        )
+        self.router.observe(tier, time.perf_counter() - start, kind="generate")
+        return self._response_text(response)
+
+    def _stream_routed(self, route: Route, contents: list, attrs: dict) -> Iterator[str]:
+        """
+        Stream from the routed model. A fast reply is held back until it is
+        known to be fine (see ReplyCheck); if it ends up not being a valid plan,
+        or the fast model fails before anything was shown, the strong model
+        answers instead.
+        """
+        if route.tier == FAST:
+            check = self.router.check(route)
+            shown = False
             try:
-                with open(self.memory_file, "r", encoding="utf-8") as f:
-                    self.history = json.load(f)
-            except Exception:
-                self.history = []
+                for piece in self._stream_with(FAST, contents):
+                    if shown:
+                        yield piece
+                    elif check.feed(piece) or not self.router.escalate:
+                        shown = True
+                        yield check.text
+                if shown:
+                    return
+                if not check.needs_escalation():
+                    if check.text:
+                        yield check.text
+                    return
+            except Exception as e:
+                if shown or not self.router.escalate:
+                    raise
+                logger.warning("Fast model failed (%s); asking %s", e, self.model_name)
+            attrs["escalated"] = True
+            self.router.escalated()
+        yield from self._stream_with(STRONG, contents)
+
+    def _stream_with(self, tier: str, contents: list) -> Iterator[str]:
+        # Retries and hedging cover the wait for the first chunk; once
+        # text has been shown the stream can't be restarted transparently.
+        model = self.models[tier]
+        start = time.perf_counter()
+        first, chunks = self.caller.call(
+            lambda timeout: self._open_stream(model, contents, timeout),
+            kind=self._call_kind("stream", tier),
+            discard=self._close_stream,
+        )
+        self.router.observe(tier, time.perf_counter() - start, kind="stream")
+        if first:
+            yield first
+        for chunk in chunks:
+            piece = self._response_text(chunk)
+            if piece:
+                yield piece
+
+    @staticmethod
+    def _call_kind(kind: str, tier: str) -> str:
+        """Separate latency history (and hedge delays) for the fast model."""
+        return kind if tier == STRONG else f"{kind}.{tier}"
+
+    def record(self, prompt: str, reply: str):
+        """Add a finished exchange (answered locally, or generated with remember=False) to history."""
+        with self._history_lock:
+            self._remember("user", prompt)
+            self._remember("model", reply)
+
+    def _build_contents(self, prompt: str) -> list:
+        with tracing.span("gemini.context"):
+            with self._history_lock:
+                return self._context.build(self.history, prompt)
+
+    def _open_stream(self, model, contents, timeout: float):
+        """Start a streamed request and wait for its first text chunk."""
+        response = model.generate_content(
+            contents, stream=True, request_options={"timeout": timeout})
+        chunks = iter(response)
+        for chunk in chunks:
+            piece = self._response_text(chunk)
+            if piece:
+                return piece, chunks
+        return "", chunks
+
+    @staticmethod
+    def _close_stream(opened):
+        """Stop reading a stream that lost a hedge race."""
+        close = getattr(opened[1], "close", None)
+        if close is not None:
+            close()
+
+    def page(self, start: int, stop: int) -> List[Dict[str, str]]:
+        """history[start:stop], reading older segments from disk if needed."""
+        with tracing.span("memory.page", turns=max(0, stop - start)):
+            with self._history_lock:
+                return self.history[start:stop]
+
+    def search(self, query: str, limit: int = 20) -> List[Tuple[int, Dict[str, str]]]:
+        """
+        Search the whole conversation memory.
+        Returns:
+            list: (position, turn) pairs, best match first.
+        """
+        with tracing.span("memory.search"):
+            hits = self.index.search(query, k=limit)
+            with self._history_lock:
+                return [(pos, self.history[pos]) for pos, _score in hits if pos < len(self.history)]
+
+    def _retrieve(self, prompt: str, before: int) -> List[int]:
+        with tracing.span("gemini.retrieve"):
+            return [pos for pos, _score in self.index.search(prompt, k=4, before=before)]
+
+    def cache_reply(self, prompt: str, reply: str):
+        """Store a reply that was generated with use_cache=False (e.g. a used speculation)."""
+        if reply.strip() and ERROR_PREFIX not in reply:
+            self.cache.put(self._cache_key(prompt), reply)
+
+    def _cache_key(self, prompt: str) -> str:
+        return self.cache.key(prompt, self.model_name, SYSTEM_INSTRUCTION)
+
+    def _summarize(self, prompt: str) -> str:
+        """Used by the context builder to update the running summary."""
+        response = self.caller.call(
+            lambda timeout: self._summary_model.generate_content(
+                prompt, request_options={"timeout": timeout}),
+            kind="summary",
+            hedge=False,  # runs in the background; latency doesn't matter
+        )
+        return self._response_text(response)
+
+    def _remember(self, role: str, content: str):
+        """Append a turn to history and journal it once."""
+        turn = {"role": role, "content": content}
+        with self._history_lock:
+            self.history.append(turn)
+            self._journal.append(turn)
+            self.index.add(content)
+
+    @staticmethod
+    def _response_text(response) -> str:
+        """Extract text from a full response or a streamed chunk."""
+        try:
+            if hasattr(response, "text"):
+                return response.text
+        except ValueError:
+            # Chunks without text parts (e.g. finish markers) raise here
+            return ""
+        if hasattr(response, "candidates") and response.candidates:
+            return response.candidates[0].content.parts[0].text
+        return str(response)
+
+    def _adopt_legacy_data(self):
+        """Copy memory files from the source tree on first use of the new data dir (never moves them)."""
+        if any(os.path.exists(os.path.join(self.data_dir, name)) for name in DATA_FILES[:3]):
+            return
+        for name in DATA_FILES:
+            src = os.path.join(LEGACY_DATA_DIR, name)
+            try:
+                if os.path.isdir(src):
+                    shutil.copytree(src, os.path.join(self.data_dir, name))
+                elif os.path.exists(src):
+                    shutil.copy2(src, os.path.join(self.data_dir, name))
+                else:
+                    continue
+                logger.info("Copied %s to %s", name, self.data_dir)
+            except OSError:
+                logger.exception("Could not copy %s from %s", name, LEGACY_DATA_DIR)
+
+    def _load_memory(self):
+        """Load previous chat memory (snapshot + journal) if available."""
+        try:
+            self.history = self._journal.load()
+        except Exception:
+            self.history = []
 
     def save_memory(self):
-        """Save chat history to file."""
+        """Make sure every journaled turn and cached reply is on disk."""
         try:
-            with open(self.memory_file, "w", encoding="utf-8") as f:
-                json.dump(self.history, f, indent=2, ensure_ascii=False)
+            self._journal.flush()
+            self.index.save()
+            self.cache.save()
+            logger.info("Response cache stats: %s", self.cache.stats())
+            logger.info("Gemini call stats: %s", self.caller.stats())
+            if self.router.enabled:
+                logger.info("Model routing stats: %s", self.router.stats())
         except Exception as e:
             print(f"Error saving memory: {e}")
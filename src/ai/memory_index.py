@@ -0,0 +1,183 @@
+"""Incremental BM25 index over conversation turns, for retrieval and history search."""
+import heapq
+import logging
+import math
+import os
+import pickle
+import re
+import threading
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from typing import Dict, List, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+TOKEN_RE = re.compile(r"\w+")
+STOPWORDS = frozenset(
+    "a an and are as at be but by can do for from has have he her him his how i if in into is it "
+    "its me my no not of on or our please she so that the their them then there these they this "
+    "to too us was we were what when where which who why will with would you your".split()
+)
+MAX_DOC_TOKENS = 2000   # long replies (articles) are indexed by their first part
+MAX_POSTINGS = 400      # newest postings scored per term; keeps lookups sub-millisecond
+COMMON_DF = 0.2         # terms in more than this share of turns are skipped in multi-term queries
+K1, B = 1.2, 0.75
+INDEX_VERSION = 1
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in TOKEN_RE.findall(text.lower()) if len(t) > 1 and t not in STOPWORDS]
+
+
+class MemoryIndex:
+    """
+    Inverted index keyed by history position. Postings are kept in id order
+    in compact arrays, so new turns are appended in O(terms). The index is
+    snapshotted to disk every `save_every` turns (and on save); turns added
+    after the last snapshot are re-indexed from history by `sync()` at
+    startup, so the history journal doubles as the index's log.
+    """
+
+    def __init__(self, path: str, save_every: int = 500):
+        """
+        Args:
+            path (str): Snapshot file.
+            save_every (int): Snapshot after this many new turns.
+        """
+        self.path = path
+        self.save_every = save_every
+        self._postings: Dict[str, array] = {}   # term -> doc ids, ascending
+        self._freqs: Dict[str, array] = {}      # term -> term frequency per posting
+        self._lengths = array("H")              # tokens per doc
+        self._total_len = 0
+        self._unsaved = 0
+        self._lock = threading.Lock()
+        self._saver = None
+        self._load()
+
+    @property
+    def count(self) -> int:
+        return len(self._lengths)
+
+    # --- Indexing ---
+    def sync(self, history: Sequence[Dict[str, str]]):
+        """Bring the index in line with `history` (catch up, or rebuild if history shrank)."""
+        if self.count > len(history):
+            logger.info("Memory shrank below the index; rebuilding it")
+            self._reset()
+        start = self.count
+        for pos in range(start, len(history)):  # by position: segmented history pages lazily
+            self.add(history[pos].get("content", ""), autosave=False)
+        if len(history) > start:
+            logger.info("Indexed %d turns", len(history) - start)
+            self.save(background=True)
+
+    def add(self, text: str, autosave: bool = True) -> int:
+        """Index the next turn and return its id (= its position in history)."""
+        tokens = tokenize(text)[:MAX_DOC_TOKENS]
+        with self._lock:
+            doc = len(self._lengths)
+            for term, tf in Counter(tokens).items():
+                ids = self._postings.get(term)
+                if ids is None:
+                    ids = self._postings[term] = array("I")
+                    self._freqs[term] = array("H")
+                ids.append(doc)
+                self._freqs[term].append(min(tf, 0xFFFF))
+            self._lengths.append(min(len(tokens), 0xFFFF))
+            self._total_len += len(tokens)
+            self._unsaved += 1
+            due = self._unsaved >= self.save_every
+        if due and autosave:
+            self.save(background=True)
+        return doc
+
+    # --- Lookup ---
+    def search(self, query: str, k: int = 5, before: int = None) -> List[Tuple[int, float]]:
+        """
+        Top-k (doc id, BM25 score) for `query`, best first, among ids < `before`.
+        Only the newest MAX_POSTINGS postings of each term are scored, which
+        favours recent turns when a term is very common.
+        """
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        with self._lock:
+            n = len(self._lengths) if before is None else min(before, len(self._lengths))
+            if n == 0:
+                return []
+            avg_len = max(1.0, self._total_len / len(self._lengths))
+            lengths = self._lengths
+            scored = []
+            for term in terms:
+                ids = self._postings.get(term)
+                if ids is not None:
+                    scored.append((term, ids, self._freqs[term]))
+            if len(scored) > 1:
+                # Near-stopwords ("open", JSON keys) add cost, not signal
+                rare = [s for s in scored if len(s[1]) <= n * COMMON_DF]
+                scored = rare or scored
+
+            scores: Dict[int, float] = {}
+            get = scores.get
+            c1, c2 = K1 * (1 - B), K1 * B / avg_len
+            for _term, ids, freqs in scored:
+                df = len(ids)
+                weight = math.log(1 + (n - df + 0.5) / (df + 0.5)) * (K1 + 1)
+                end = bisect_left(ids, n) if before is not None else df
+                lo = max(0, end - MAX_POSTINGS)
+                for doc, tf in zip(ids[lo:end], freqs[lo:end]):
+                    scores[doc] = get(doc, 0.0) + weight * tf / (tf + c1 + c2 * lengths[doc])
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    # --- Persistence ---
+    def save(self, background: bool = False):
+        """Write a snapshot (atomically). With `background`, on a thread; one at a time."""
+        if background:
+            if self._saver is not None and self._saver.is_alive():
+                return
+            self._saver = threading.Thread(target=self.save, name="memory-index", daemon=True)
+            self._saver.start()
+            return
+        with self._lock:
+            if not self._unsaved:
+                return
+            data = pickle.dumps({
+                "version": INDEX_VERSION,
+                "postings": self._postings,
+                "freqs": self._freqs,
+                "lengths": self._lengths,
+                "total_len": self._total_len,
+            }, protocol=pickle.HIGHEST_PROTOCOL)
+            self._unsaved = 0
+        try:
+            tmp = self.path + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, self.path)
+        except Exception:
+            logger.exception("Saving the memory index failed")
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "rb") as f:
+                data = pickle.load(f)
+            if data.get("version") != INDEX_VERSION:
+                return
+            self._postings = data["postings"]
+            self._freqs = data["freqs"]
+            self._lengths = data["lengths"]
+            self._total_len = data["total_len"]
+        except Exception:
+            logger.warning("Ignoring unreadable memory index %s", self.path)
+            self._reset()
+
+    def _reset(self):
+        with self._lock:
+            self._postings, self._freqs = {}, {}
+            self._lengths = array("H")
+            self._total_len = 0
+            self._unsaved = 1  # make the next save() write the empty index
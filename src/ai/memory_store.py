@@ -0,0 +1,363 @@
+"""Segmented conversation history with an append-only journal and lazy paging.
+
+History lives next to the old memory file:
+
+- ``gemini_memory.segments/``: sealed segments of ``segment_size`` turns each
+  (``000000.json``, ``000001.json``, ...) plus ``index.json`` listing them.
+  Sealed segments are never rewritten.
+- ``gemini_memory.journal.jsonl``: one JSON turn per line for the turns after
+  the last sealed segment, after a ``{"_base": n}`` header recording how many
+  turns the segments hold.
+
+Each turn is written exactly once. A background thread batches appends and
+fsyncs them, and seals a new segment whenever the journal holds a full one, so
+the cost of saving a turn does not grow with the history. At startup only the
+journal is read; older segments are paged in when someone asks for them
+(see SegmentedHistory). An old single-file ``gemini_memory.json`` is split into
+segments on first load and kept as ``gemini_memory.json.bak``.
+
+If the stored history can't be read, the segments and journal are moved aside
+(``*.broken-<time>``) before anything new is written, so a fresh history never
+overwrites the old segment files.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Sequence
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+Turn = Dict[str, str]
+INDEX_VERSION = 1
+
+
+class SegmentedHistory(Sequence):
+    """
+    The conversation as a read-mostly list: `len()`, indexing and slicing work
+    as on a plain list, but only the unsealed tail and the `cache_segments`
+    most recently used segments are held in memory. Other segments are read
+    from disk when a position inside them is accessed.
+    """
+
+    def __init__(self, journal: "MemoryJournal", sealed: int, tail: List[Turn],
+                 cache_segments: int = 4):
+        self._journal = journal
+        self._size = journal.segment_size
+        self._start = sealed                # position of tail[0]; a multiple of the segment size
+        self._tail = tail
+        self._cache: "OrderedDict[int, List[Turn]]" = OrderedDict()
+        self._cache_segments = cache_segments
+        self._lock = threading.Lock()       # the summary thread reads while the GUI appends
+
+    def __len__(self) -> int:
+        return self._start + len(self._tail)
+
+    def __getitem__(self, pos):
+        if isinstance(pos, slice):
+            return [self[i] for i in range(*pos.indices(len(self)))]
+        with self._lock:
+            n = self._start + len(self._tail)
+            if pos < 0:
+                pos += n
+            if not 0 <= pos < n:
+                raise IndexError("history index out of range")
+            if pos >= self._start:
+                return self._tail[pos - self._start]
+            return self._segment(pos // self._size)[pos % self._size]
+
+    def append(self, turn: Turn):
+        """Add a turn in memory (journaling it is the caller's job)."""
+        with self._lock:
+            self._tail.append(turn)
+            # Turns the writer has sealed move out of the tail into the page cache
+            sealed = self._journal.sealed
+            while sealed - self._start >= self._size and len(self._tail) >= self._size:
+                self._remember_segment(self._start // self._size, self._tail[:self._size])
+                del self._tail[:self._size]
+                self._start += self._size
+
+    @property
+    def resident(self) -> int:
+        """Turns currently held in memory."""
+        with self._lock:
+            return len(self._tail) + sum(len(seg) for seg in self._cache.values())
+
+    def _segment(self, number: int) -> List[Turn]:
+        seg = self._cache.get(number)
+        if seg is None:
+            seg = self._journal.read_segment(number)
+            self._remember_segment(number, seg)
+        else:
+            self._cache.move_to_end(number)
+        return seg
+
+    def _remember_segment(self, number: int, seg: List[Turn]):
+        self._cache[number] = seg
+        self._cache.move_to_end(number)
+        while len(self._cache) > self._cache_segments:
+            self._cache.popitem(last=False)
+
+
+class MemoryJournal:
+    def __init__(self, snapshot_path: str, segment_size: int = 200,
+                 batch_size: int = 64, linger: float = 0.05, cache_segments: int = 4):
+        """
+        Args:
+            snapshot_path (str): Path of the (old single-file) JSON memory file;
+                segments and journal are stored next to it.
+            segment_size (int): Turns per sealed segment.
+            batch_size (int): Max turns written per fsync.
+            linger (float): Seconds to wait for more turns before flushing a batch.
+            cache_segments (int): Sealed segments kept in memory by the loaded history.
+        """
+        self.snapshot_path = snapshot_path
+        stem = os.path.splitext(snapshot_path)[0]
+        self.journal_path = stem + ".journal.jsonl"
+        self.segment_dir = stem + ".segments"
+        self.index_path = os.path.join(self.segment_dir, "index.json")
+        self.segment_size = segment_size
+        self.batch_size = batch_size
+        self.linger = linger
+        self.cache_segments = cache_segments
+
+        self._queue: "queue.Queue" = queue.Queue()
+        self._journal_len = 0
+        self._segments: List[dict] = []  # index entries: file, start, count
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="memory-journal", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    @property
+    def sealed(self) -> int:
+        """Number of turns stored in sealed segments."""
+        return len(self._segments) * self.segment_size
+
+    # --- Reading ---
+    def load(self) -> SegmentedHistory:
+        """Return the history, with only the unsealed tail read from disk."""
+        try:
+            return self._load()
+        except Exception:
+            logger.exception("Could not read conversation memory; starting a new one")
+            self._set_aside()
+            self._segments, self._journal_len = [], 0
+            return SegmentedHistory(self, 0, [], self.cache_segments)
+
+    def _load(self) -> SegmentedHistory:
+        if os.path.exists(self.snapshot_path):
+            self._migrate()
+        self._segments = self._read_index()
+
+        base, journaled = self._read_journal()
+        sealed = self.sealed
+        if base is not None and base < sealed:
+            # Crashed after sealing a segment but before the journal was reset:
+            # its first turns are already in the segment.
+            journaled = journaled[sealed - base:]
+        elif base is not None and base > sealed:
+            logger.warning("Memory journal starts at turn %d but segments end at %d", base, sealed)
+        self._journal_len = len(journaled)
+        return SegmentedHistory(self, sealed, journaled, self.cache_segments)
+
+    def _set_aside(self):
+        """Move unreadable history out of the way; if that fails, stop writing."""
+        suffix = time.strftime(".broken-%Y%m%d-%H%M%S")
+        try:
+            for path in (self.segment_dir, self.journal_path):
+                if os.path.exists(path):
+                    os.replace(path, path + suffix)
+                    logger.warning("Moved %s to %s", path, path + suffix)
+        except OSError:
+            logger.exception("Could not move old memory aside; new turns won't be saved")
+            self._closed = True
+
+    def read_segment(self, number: int) -> List[Turn]:
+        entry = self._segments[number]
+        with open(os.path.join(self.segment_dir, entry["file"]), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _read_index(self) -> List[dict]:
+        if not os.path.exists(self.index_path):
+            return []
+        with open(self.index_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        # Segments already on disk decide the size
+        self.segment_size = data.get("segment_size", self.segment_size)
+        return data["segments"]
+
+    def _read_journal(self) -> Tuple[Optional[int], List[Turn]]:
+        base, turns = None, []
+        if not os.path.exists(self.journal_path):
+            return base, turns
+        with open(self.journal_path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Torn last line after a crash; everything before it is intact
+                    logger.warning("Skipping unreadable journal line")
+                    continue
+                if "_base" in entry:
+                    base = entry["_base"]
+                else:
+                    turns.append(entry)
+        return base, turns
+
+    # --- Writing ---
+    def append(self, turn: Turn):
+        """Queue a turn for the background writer (O(1), never blocks on disk)."""
+        if not self._closed:
+            self._queue.put(turn)
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Block until every turn queued so far is on disk."""
+        if self._closed or not self._thread.is_alive():
+            return True
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def compact(self, timeout: float = 30.0) -> bool:
+        """Seal every full segment in the journal now (runs on the writer thread)."""
+        if self._closed or not self._thread.is_alive():
+            return False
+        done = threading.Event()
+        self._queue.put(("compact", done))
+        return done.wait(timeout)
+
+    def close(self):
+        if self._closed:
+            return
+        self.flush()
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join(timeout=5.0)
+
+    # --- Writer thread ---
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+
+            batch, waiters, compact_now = [], [], False
+            deadline = time.monotonic() + self.linger
+            while True:
+                if isinstance(item, threading.Event):
+                    waiters.append(item)
+                elif isinstance(item, tuple):
+                    compact_now = True
+                    waiters.append(item[1])
+                elif item is not None:
+                    batch.append(item)
+
+                if item is None or waiters or len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+
+            try:
+                if batch:
+                    self._write_batch(batch)
+                if compact_now or self._journal_len >= self.segment_size:
+                    self._seal()
+            except Exception:
+                logger.exception("Memory journal write failed")
+            for w in waiters:
+                w.set()
+            if item is None:
+                return
+
+    def _write_batch(self, batch: List[Turn]):
+        with open(self.journal_path, "a", encoding="utf-8") as f:
+            if f.tell() == 0:
+                f.write(json.dumps({"_base": self.sealed}) + "\n")
+            for turn in batch:
+                f.write(json.dumps(turn, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self._journal_len += len(batch)
+
+    def _seal(self):
+        """Move full segments from the journal into segment files."""
+        if self._journal_len < self.segment_size:
+            return
+        base, turns = self._read_journal()
+        if base is not None and base < self.sealed:
+            turns = turns[self.sealed - base:]
+        segments = list(self._segments)
+        while len(turns) >= self.segment_size:
+            self._write_segment(segments, turns[:self.segment_size])
+            turns = turns[self.segment_size:]
+        # Index first: if we crash before the journal is rewritten, load() skips
+        # the journal turns the new segments already hold.
+        self._write_index(segments)
+        self._segments = segments
+        self._write_journal(turns)
+        logger.info("Sealed memory segments up to turn %d", self.sealed)
+
+    def _write_segment(self, segments: List[dict], turns: List[Turn]):
+        os.makedirs(self.segment_dir, exist_ok=True)
+        name = f"{len(segments):06d}.json"
+        self._atomic_write(os.path.join(self.segment_dir, name), json.dumps(turns, ensure_ascii=False))
+        segments.append({"file": name, "start": len(segments) * self.segment_size, "count": len(turns)})
+
+    def _write_index(self, segments: List[dict]):
+        os.makedirs(self.segment_dir, exist_ok=True)
+        self._atomic_write(self.index_path, json.dumps({
+            "version": INDEX_VERSION,
+            "segment_size": self.segment_size,
+            "segments": segments,
+        }))
+
+    def _write_journal(self, turns: List[Turn]):
+        lines = [json.dumps({"_base": self.sealed})]
+        lines += [json.dumps(turn, ensure_ascii=False) for turn in turns]
+        self._atomic_write(self.journal_path, "\n".join(lines) + "\n")
+        self._journal_len = len(turns)
+
+    @staticmethod
+    def _atomic_write(path: str, text: str):
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    # --- One-time upgrade from the single-file format ---
+    def _migrate(self):
+        """Split an old gemini_memory.json (+ its journal) into segments."""
+        try:
+            with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                history = json.load(f)
+        except Exception:
+            logger.exception("Could not read memory snapshot; leaving it in place")
+            return
+        sealed = len(history) // self.segment_size * self.segment_size
+        base, journaled = self._read_journal()
+        if base == sealed and base != len(history):
+            tail = journaled  # an earlier migration already rewrote the journal
+        else:
+            tail = history[sealed:] + (journaled if base == len(history) else [])
+
+        segments: List[dict] = []
+        for start in range(0, sealed, self.segment_size):
+            self._write_segment(segments, history[start:start + self.segment_size])
+        self._write_index(segments)
+        self._segments = segments
+        self._write_journal(tail)
+        os.replace(self.snapshot_path, self.snapshot_path + ".bak")
+        logger.info("Split %d remembered turns into %d segments", len(history), len(segments))
@@ -0,0 +1,195 @@
+"""Fast/strong model routing: quick answers for commands, the stronger model for long-form text."""
+import re
+import threading
+from dataclasses import dataclass
+from typing import Container, Dict, Optional, Tuple
+
+from src.agent.stream_parser import CommandStreamParser
+from .resilience import LatencyTracker
+
+FAST, STRONG = "fast", "strong"
+LATENCY_KINDS = ("generate", "stream")   # whole reply vs. first chunk
+
+FAST_MAX_WORDS = 25   # longer prompts without an automation verb go to the strong model
+MIN_SAMPLES = 5       # latency samples per model before they influence routing
+PROBE_EVERY = 10      # while the fast model looks slow, still send it 1 in N fast prompts
+
+# "open notepad", "please type hello", "can you search for cats"
+_AUTOMATION_RE = re.compile(
+    r"^(?:(?:please|can you|could you|hey)\s+)*"
+    r"(?:open|launch|start|run|close|type|search|google|download|install|play|go to|visit|save|new)\b",
+    re.IGNORECASE,
+)
+# Asks for text worth the stronger model, even inside a command ("open word and write an essay")
+_LONG_FORM_RE = re.compile(
+    r"\b(?:article|essay|story|poem|report|letter|blog|explain|summar(?:y|ize|ise)|compare|"
+    r"analy[sz]e|detailed|in detail|step by step|code|script|function|translate|outline)\b",
+    re.IGNORECASE,
+)
+
+
+def _looks_like_plan(text: str) -> bool:
+    """The reply started out as JSON (or a fence) or mentions a command key."""
+    return text.startswith(("{", "[", "```")) or '"command"' in text
+
+
+@dataclass
+class Route:
+    tier: str            # FAST or STRONG
+    model: str           # model name
+    reason: str          # "automation", "short", "long-form", "long", "fast slower", "single model"
+    expects_plan: bool   # the prompt reads like a command, so the reply should be a plan
+
+
+class ReplyCheck:
+    """
+    Watches a fast model's reply as it streams in and decides when it is safe
+    to pass on: as soon as a valid command object closes, or once the reply is
+    clearly prose for a prompt that didn't ask for a command. Until then the
+    text is held back so a bad reply can still be replaced by the strong model.
+    """
+
+    def __init__(self, route: Route, commands: Optional[Container[str]]):
+        self.route = route
+        self.parser = CommandStreamParser(allowed=commands)
+        self.text = ""
+        self.valid = False
+
+    def feed(self, piece: str) -> bool:
+        """Add a chunk; True once the reply can be shown as it is."""
+        self.text += piece
+        if self.parser.feed(piece):
+            self.valid = True
+            return True
+        if self.route.expects_plan:
+            return False
+        head = self.text.lstrip()
+        return len(head) >= 3 and not _looks_like_plan(head)
+
+    def needs_escalation(self) -> bool:
+        """Checked when the reply is complete: it should have been a plan but isn't a valid one."""
+        if self.valid:
+            return False
+        return self.route.expects_plan or _looks_like_plan(self.text.lstrip())
+
+
+class ModelRouter:
+    """
+    Sends short and command-like prompts to a low-latency model and long-form
+    requests to a stronger one. Rolling time-to-first-text per model steers the
+    choice: if the fast model is currently no faster than the strong one,
+    everything goes to the strong one (with an occasional probe so the fast
+    model can win its traffic back). Without a fast model every prompt uses
+    the strong model.
+    """
+
+    def __init__(self, strong_model: str, fast_model: Optional[str] = None,
+                 fast_max_words: int = FAST_MAX_WORDS, escalate: bool = True,
+                 commands: Optional[Container[str]] = None):
+        """
+        Args:
+            strong_model (str): Model for long-form prompts and escalations.
+            fast_model (str): Low-latency model; None or "" disables routing.
+            fast_max_words (int): Prompts up to this many words count as short.
+            escalate (bool): Re-ask the strong model when the fast one returns a
+                broken plan (or fails).
+            commands (Container[str]): Command names a plan may use; None accepts any.
+        """
+        self.strong_model = strong_model
+        self.fast_model = fast_model or None
+        self.fast_max_words = fast_max_words
+        self.escalate = escalate and self.fast_model is not None
+        self.commands = commands
+        # (tier, "generate" | "stream") -> seconds. A full reply and a first chunk
+        # aren't comparable, so each kind of call gets its own history.
+        self.latency: Dict[Tuple[str, str], LatencyTracker] = {
+            (tier, kind): LatencyTracker(100) for tier in (FAST, STRONG) for kind in LATENCY_KINDS
+        }
+        self._lock = threading.Lock()
+        self._counts = {FAST: 0, STRONG: 0, "escalated": 0, "probes": 0}
+        self._skipped_fast = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.fast_model is not None
+
+    def model_for(self, tier: str) -> str:
+        return self.fast_model if tier == FAST and self.fast_model else self.strong_model
+
+    # --- Routing ---
+    def route(self, prompt: str) -> Route:
+        text = prompt.strip()
+        expects_plan = bool(_AUTOMATION_RE.match(text))
+        if not self.enabled:
+            return self._routed(STRONG, "single model", expects_plan)
+        if _LONG_FORM_RE.search(text):
+            return self._routed(STRONG, "long-form", expects_plan)
+        if expects_plan:
+            reason = "automation"
+        elif len(text.split()) <= self.fast_max_words:
+            reason = "short"
+        else:
+            return self._routed(STRONG, "long", expects_plan)
+        if self._fast_slower():
+            with self._lock:
+                self._skipped_fast += 1
+                probe = self._skipped_fast % PROBE_EVERY == 0
+                if probe:
+                    self._counts["probes"] += 1
+            if not probe:
+                return self._routed(STRONG, "fast slower", expects_plan)
+        return self._routed(FAST, reason, expects_plan)
+
+    def _routed(self, tier: str, reason: str, expects_plan: bool) -> Route:
+        with self._lock:
+            self._counts[tier] += 1
+        return Route(tier, self.model_for(tier), reason, expects_plan)
+
+    def _fast_slower(self) -> bool:
+        """True if the fast model is slower on every kind of call there's enough data for."""
+        compared = False
+        for kind in LATENCY_KINDS:
+            fast, strong = self.latency[FAST, kind], self.latency[STRONG, kind]
+            if len(fast) < MIN_SAMPLES or len(strong) < MIN_SAMPLES:
+                continue
+            if fast.percentile(0.5) < strong.percentile(0.5):
+                return False
+            compared = True
+        return compared
+
+    # --- Feedback ---
+    def observe(self, tier: str, seconds: float, kind: str = "stream"):
+        """
+        Record how long a model took to answer.
+
+        Args:
+            tier (str): FAST or STRONG.
+            seconds (float): Time to the whole reply for "generate", to the
+                first chunk for "stream".
+            kind (str): "generate" or "stream".
+        """
+        self.latency[tier, kind].add(seconds)
+
+    def check(self, route: Route) -> ReplyCheck:
+        return ReplyCheck(route, self.commands)
+
+    def needs_escalation(self, route: Route, reply: str) -> bool:
+        """For a complete (non-streamed) reply from the fast model."""
+        if route.tier != FAST or not self.escalate:
+            return False
+        check = self.check(route)
+        check.feed(reply)
+        return check.needs_escalation()
+
+    def escalated(self):
+        with self._lock:
+            self._counts["escalated"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._counts)
+        for (tier, kind), tracker in self.latency.items():
+            p50 = tracker.percentile(0.5)
+            if p50 is not None:
+                stats[f"{tier}_{kind}_p50_ms"] = round(p50 * 1000)
+        return stats
@@ -0,0 +1,235 @@
+"""Speculative replies: start asking Gemini while the user pauses typing, reuse it on send."""
+import logging
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Iterator, List, Optional
+
+from src import tracing
+from .gemini_client import ERROR_PREFIX
+from .response_cache import ResponseCache
+
+logger = logging.getLogger(__name__)
+
+MIN_CHARS = 4            # "ope" is not worth a request
+MAX_WORDS = 12           # only short prompts are usually final before Enter
+WASTED_PER_MINUTE = 5    # unused speculative calls allowed per minute before pausing
+MAX_RUNNING = 2          # calls in flight, counting cancelled ones still draining
+
+
+class Speculation:
+    """
+    One speculative streamed request. Chunks are buffered as they arrive;
+    `stream()` replays them and then follows the live stream, so a reply that
+    is still being generated when the user hits Enter picks up where it is.
+    Nothing is executed, and neither history nor the response cache is
+    touched; the reply is cached only once the speculation is used.
+    """
+
+    def __init__(self, prompt: str, key: str, history_len: int):
+        self.prompt = prompt
+        self.key = key
+        self.history_len = history_len   # the context it was built from
+        self.started = time.perf_counter()
+        self.trace_id = tracing.new_trace()
+        self.cancel_event = threading.Event()
+        self._chunks: List[str] = []
+        self._done = False
+        self._used = False
+        self._error: Optional[BaseException] = None
+        self._cond = threading.Condition()
+
+    @property
+    def done(self) -> bool:
+        with self._cond:
+            return self._done
+
+    @property
+    def failed(self) -> bool:
+        """Finished with an error (raised, or an error reply from the client)."""
+        with self._cond:
+            return self._done and (self._error is not None or ERROR_PREFIX in "".join(self._chunks))
+
+    def cancel(self):
+        """Stop reading after the current chunk (a call still waiting on Gemini runs to its timeout)."""
+        self.cancel_event.set()
+
+    def use(self, client):
+        """The user sent this prompt: cache the reply once it is complete."""
+        with self._cond:
+            self._used = True
+            done = self._done
+        if done:
+            self._cache(client)
+
+    def run(self, client):
+        with tracing.trace(self.trace_id), tracing.span("prefetch.speculate", chars=len(self.prompt)):
+            try:
+                # A speculation may never be sent, so it neither reads nor fills the cache
+                for piece in client.generate_stream(self.prompt, use_cache=False, remember=False):
+                    if self.cancel_event.is_set():
+                        break
+                    with self._cond:
+                        self._chunks.append(piece)
+                        self._cond.notify_all()
+            except Exception as e:
+                self._error = e
+            finally:
+                with self._cond:
+                    self._done = True
+                    used = self._used
+                    self._cond.notify_all()
+                if used:
+                    self._cache(client)
+
+    def _cache(self, client):
+        # A cancelled speculation only has part of the reply
+        if not self.failed and not self.cancel_event.is_set():
+            client.cache_reply(self.prompt, "".join(self._chunks))
+
+    def stream(self) -> Iterator[str]:
+        """Chunks received so far, then the rest as it arrives."""
+        i = 0
+        while True:
+            with self._cond:
+                while i >= len(self._chunks) and not self._done:
+                    self._cond.wait()
+                if i < len(self._chunks):
+                    piece = self._chunks[i]
+                    i += 1
+                elif self._error is not None:
+                    raise self._error
+                else:
+                    return
+            yield piece
+
+
+@dataclass
+class PrefetchStats:
+    started: int = 0
+    hits: int = 0          # submitted text matched a speculation
+    in_flight_hits: int = 0  # ... that was still streaming at the time
+    misses: int = 0        # sends with no matching speculation
+    wasted: int = 0        # speculations cancelled or replaced without being used
+    stale: int = 0         # matched, but history had changed since it started
+    skipped: int = 0       # not started because of the waste budget or running calls
+    lead_ms: float = 0.0   # total head start of hits
+
+    @property
+    def hit_rate(self) -> float:
+        """Share of speculations that were used."""
+        return self.hits / self.started if self.started else 0.0
+
+    @property
+    def avg_lead_ms(self) -> float:
+        return self.lead_ms / self.hits if self.hits else 0.0
+
+
+class Prefetcher:
+    """
+    Keeps at most one speculation for the text currently in the input box.
+    `speculate()` is called after a typing pause, `take()` when the text is
+    submitted: it hands over the speculation if the normalized text matches
+    and the conversation hasn't moved on since it started. Unused calls are
+    budgeted (`wasted_per_minute`), and no more than MAX_RUNNING calls run at
+    once, so editing a prompt can't flood the API.
+    """
+
+    def __init__(self, client=None, enabled: bool = True, max_words: int = MAX_WORDS,
+                 wasted_per_minute: int = WASTED_PER_MINUTE):
+        """
+        Args:
+            client (GeminiClient): Set later if it isn't built yet.
+            enabled (bool): Off = `speculate()` never starts anything.
+            max_words (int): Longer prompts are not speculated on.
+            wasted_per_minute (int): Unused speculative calls allowed per minute.
+        """
+        self.client = client
+        self.enabled = enabled
+        self.max_words = max_words
+        self.wasted_per_minute = wasted_per_minute
+        self._current: Optional[Speculation] = None
+        self._wasted_at = deque()
+        self._running = 0
+        self._lock = threading.Lock()
+        self._stats = PrefetchStats()
+
+    def speculate(self, text: str) -> Optional[Speculation]:
+        """Start a speculative request for `text` (if it is worth one); returns it."""
+        key = ResponseCache.normalize(text)
+        if not self.enabled or self.client is None or not self._worth_it(key):
+            self.cancel()
+            return None
+        with self._lock:
+            current = self._current
+            if current is not None and current.key == key and not current.failed:
+                return current
+            self._discard_locked()
+            now = time.monotonic()
+            while self._wasted_at and now - self._wasted_at[0] > 60:
+                self._wasted_at.popleft()
+            if len(self._wasted_at) >= self.wasted_per_minute or self._running >= MAX_RUNNING:
+                self._stats.skipped += 1
+                return None
+            spec = Speculation(text, key, len(self.client.history))
+            self._current = spec
+            self._running += 1
+            self._stats.started += 1
+        threading.Thread(target=self._run, args=(spec,), name="prefetch", daemon=True).start()
+        return spec
+
+    def take(self, text: str) -> Optional[Speculation]:
+        """The speculation for submitted `text`, or None (any other one is dropped)."""
+        key = ResponseCache.normalize(text)
+        with tracing.span("prefetch.take") as attrs, self._lock:
+            spec, self._current = self._current, None
+            attrs["hit"] = False
+            if spec is None or spec.key != key:
+                self._stats.misses += 1
+                self._waste(spec)
+                return None
+            if spec.failed or len(self.client.history) != spec.history_len:
+                # An earlier reply was committed meanwhile: the context is out of date
+                self._stats.stale += 1
+                self._waste(spec)
+                return None
+            lead = (time.perf_counter() - spec.started) * 1000
+            self._stats.hits += 1
+            self._stats.lead_ms += lead
+            if not spec.done:
+                self._stats.in_flight_hits += 1
+            attrs.update(hit=True, lead_ms=round(lead, 1), done=spec.done)
+            spec.use(self.client)
+            return spec
+
+    def cancel(self):
+        """Drop the current speculation (the text no longer qualifies)."""
+        with self._lock:
+            self._discard_locked()
+
+    def stats(self) -> PrefetchStats:
+        with self._lock:
+            return PrefetchStats(**vars(self._stats))
+
+    # --- Internals ---
+    def _worth_it(self, key: str) -> bool:
+        return len(key) >= MIN_CHARS and len(key.split()) <= self.max_words
+
+    def _run(self, spec: Speculation):
+        try:
+            spec.run(self.client)
+        finally:
+            with self._lock:
+                self._running -= 1
+
+    def _discard_locked(self):
+        spec, self._current = self._current, None
+        self._waste(spec)
+
+    def _waste(self, spec: Optional[Speculation]):
+        if spec is None:
+            return
+        spec.cancel()
+        self._stats.wasted += 1
+        self._wasted_at.append(time.monotonic())
@@ -0,0 +1,198 @@
+"""Deadlines, retry with backoff and hedged requests for Gemini calls."""
+import contextvars
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, TypeVar
+
+from src.tracing import span
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Transient failures worth another attempt, matched by class name so neither
+# google.api_core nor requests has to be imported here
+RETRYABLE_ERRORS = {
+    "ResourceExhausted", "TooManyRequests", "ServiceUnavailable", "InternalServerError",
+    "DeadlineExceeded", "GatewayTimeout", "Aborted", "RetryError",
+    "TimeoutError", "ConnectionError", "Timeout", "ChunkedEncodingError",
+}
+
+
+class GeminiTimeout(TimeoutError):
+    """No attempt answered before its deadline."""
+
+
+def is_retryable(error: BaseException) -> bool:
+    """True for rate limits, 5xx responses, timeouts and dropped connections."""
+    if any(cls.__name__ in RETRYABLE_ERRORS for cls in type(error).__mro__):
+        return True
+    code = getattr(error, "code", None)
+    return isinstance(code, int) and (code == 429 or 500 <= code < 600)
+
+
+@dataclass
+class RetryPolicy:
+    attempt_timeout: float = 30.0   # deadline for one attempt (also passed to the SDK)
+    deadline: float = 60.0          # overall deadline, retries and backoff included
+    retries: int = 2                # extra attempts after a retryable failure
+    backoff_base: float = 0.5
+    backoff_max: float = 8.0
+    hedge: bool = True
+    hedge_min_delay: float = 0.5    # never hedge sooner than this
+    hedge_ratio: float = 0.1        # at most this share of requests get a second copy
+    min_samples: int = 20           # latency samples needed before hedging kicks in
+
+    def backoff(self, retry: int) -> float:
+        """Full-jitter exponential backoff before retry number `retry` (1-based)."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (retry - 1)))
+
+
+class LatencyTracker:
+    """Rolling window of recent latencies."""
+
+    def __init__(self, size: int = 200):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def add(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+class ResilientCaller:
+    """
+    Runs blocking backend calls on a shared thread pool with a per-attempt
+    deadline, retries retryable failures with jittered backoff, and hedges:
+    if an attempt is slower than the recent p95 a second copy is started and
+    whichever answers first wins.
+    """
+
+    def __init__(self, policy: RetryPolicy = None, max_workers: int = 8):
+        self.policy = policy or RetryPolicy()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="gemini-call")
+        self._latency: Dict[str, LatencyTracker] = {}
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._hedges = 0
+
+    def latency(self, kind: str) -> LatencyTracker:
+        with self._lock:
+            return self._latency.setdefault(kind, LatencyTracker())
+
+    def stats(self) -> dict:
+        with self._lock:
+            kinds = dict(self._latency)
+            stats = {"requests": self._requests, "hedges": self._hedges}
+        for kind, tracker in kinds.items():
+            p50, p95 = tracker.percentile(0.5), tracker.percentile(0.95)
+            if p50 is not None:
+                stats[kind] = {"p50_ms": round(p50 * 1000), "p95_ms": round(p95 * 1000)}
+        return stats
+
+    def hedge_delay(self, kind: str) -> Optional[float]:
+        """Seconds to wait before hedging, or None if this request shouldn't be hedged."""
+        policy = self.policy
+        tracker = self.latency(kind)
+        if not policy.hedge or len(tracker) < policy.min_samples:
+            return None
+        with self._lock:
+            if self._hedges >= policy.hedge_ratio * self._requests:
+                return None  # hedge budget spent; don't double the load on a slow backend
+        return max(policy.hedge_min_delay, tracker.percentile(0.95))
+
+    def call(self, fn: Callable[[float], T], kind: str = "generate", hedge: bool = True,
+             discard: Callable[[T], None] = None) -> T:
+        """
+        Call `fn(timeout)` under the policy and return the first successful result.
+        `fn` gets the seconds left for its attempt and should pass them on to the
+        transport. `discard` is called with results that lost a hedge race (e.g.
+        to close a stream). Raises the last error, or GeminiTimeout.
+        """
+        policy = self.policy
+        deadline = time.monotonic() + policy.deadline
+        with self._lock:
+            self._requests += 1
+        retry = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise GeminiTimeout(f"No reply within {policy.deadline:.1f}s")
+            try:
+                return self._attempt(fn, kind, min(policy.attempt_timeout, remaining), hedge, discard)
+            except Exception as e:
+                retry += 1
+                if retry > policy.retries or not is_retryable(e):
+                    raise
+                delay = policy.backoff(retry)
+                if time.monotonic() + delay >= deadline:
+                    raise
+                logger.warning("Gemini %s failed (%s); retry %d in %.2fs", kind, e, retry, delay)
+                time.sleep(delay)
+
+    def _attempt(self, fn, kind, timeout, hedge, discard):
+        start = time.monotonic()
+        end = start + timeout
+        pending = [self._submit(fn, kind, timeout, hedged=False)]
+        hedge_at = None
+        if hedge:
+            delay = self.hedge_delay(kind)
+            hedge_at = start + delay if delay is not None and delay < timeout else None
+        error = None
+
+        while pending:
+            now = time.monotonic()
+            if now >= end:
+                break
+            until = min(end, hedge_at) if hedge_at is not None else end
+            done, _ = wait(pending, timeout=max(0.0, until - now), return_when=FIRST_COMPLETED)
+            for future in done:
+                pending.remove(future)
+                if future.exception() is None:
+                    self.latency(kind).add(time.monotonic() - start)
+                    self._abandon(pending, discard)
+                    return future.result()
+                error = future.exception()
+            if hedge_at is not None and pending and time.monotonic() >= hedge_at:
+                hedge_at = None
+                with self._lock:
+                    self._hedges += 1
+                logger.info("Gemini %s slower than p95; sending a hedged request", kind)
+                pending.append(self._submit(fn, kind, max(0.1, end - time.monotonic()), hedged=True))
+
+        if pending:
+            self._abandon(pending, discard)
+            raise GeminiTimeout(f"No reply within {timeout:.1f}s")
+        raise error
+
+    def _submit(self, fn, kind, timeout, hedged):
+        """Run one attempt on the pool, inside the caller's trace."""
+        def attempt():
+            with span(f"gemini.{kind}.attempt", hedged=hedged):
+                return fn(timeout)
+        return self._pool.submit(contextvars.copy_context().run, attempt)
+
+    @staticmethod
+    def _abandon(futures, discard):
+        """Let losing attempts finish in the background and clean up after them."""
+        for future in futures:
+            if future.cancel() or discard is None:
+                continue
+            future.add_done_callback(
+                lambda f: f.exception() is None and discard(f.result())
+            )
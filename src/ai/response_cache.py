@@ -0,0 +1,129 @@
+"""Persistent LRU + TTL cache of Gemini replies."""
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+_WS_RE = re.compile(r"\s+")
+_TRAILING_PUNCT_RE = re.compile(r"[\s.!?,;:]+$")
+
+
+class ResponseCache:
+    """
+    Maps (normalized prompt, model, system instruction) -> reply text.
+
+    Entries are evicted least-recently-used first once `max_entries` is
+    exceeded, and ignored once older than `ttl` seconds. The cache is written
+    to `path` in the background shortly after it changes.
+    """
+
+    def __init__(self, path: str, max_entries: int = 512, ttl: float = 7 * 24 * 3600,
+                 enabled: bool = True, save_delay: float = 1.0):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.enabled = enabled
+        self.save_delay = save_delay
+
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._save_timer: Optional[threading.Timer] = None
+        self._load()
+
+    # --- Keys ---
+    @staticmethod
+    def normalize(prompt: str) -> str:
+        """Case/whitespace/trailing-punctuation insensitive form of a prompt."""
+        text = _WS_RE.sub(" ", prompt.strip().lower())
+        return _TRAILING_PUNCT_RE.sub("", text)
+
+    def key(self, prompt: str, model: str, system_instruction: str) -> str:
+        raw = "\x1f".join([self.normalize(prompt), model, system_instruction])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    # --- Lookups ---
+    def get(self, key: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry["t"] > self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry["reply"]
+
+    def put(self, key: str, reply: str):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = {"reply": reply, "t": time.time()}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        self._schedule_save()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        self._schedule_save()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "size": len(self._entries),
+            }
+
+    # --- Persistence ---
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception:
+            logger.warning("Ignoring unreadable response cache %s", self.path)
+            return
+        now = time.time()
+        # Stored oldest-first, so insertion order restores the LRU order
+        for key, entry in data.items():
+            if now - entry.get("t", 0) <= self.ttl:
+                self._entries[key] = entry
+
+    def _schedule_save(self):
+        with self._lock:
+            if self._save_timer is not None:
+                return
+            self._save_timer = threading.Timer(self.save_delay, self.save)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def save(self):
+        """Write the cache to disk now."""
+        with self._lock:
+            self._save_timer = None
+            data = dict(self._entries)
+        try:
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp, self.path)
+        except Exception:
+            logger.exception("Saving response cache failed")
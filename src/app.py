@@ -1,18 +1,31 @@
 import sys
-from PySide6.QtWidgets import QApplication
-from src.ui.main_window import MainWindow
-from src.settings import Settings
-from src.logging_config import configure_logging
+from src.startup_profile import profiler
 
 
 def main():
-    configure_logging()
-    settings = Settings.load()
+    profiler.enabled = "--profile-startup" in sys.argv
+    argv = [a for a in sys.argv if a != "--profile-startup"]
 
-    app = QApplication(sys.argv)
-    window = MainWindow(settings)
-    window.setWindowTitle(settings.app_name)
-    window.show()
+    with profiler.phase("import PySide6"):
+        from PySide6.QtWidgets import QApplication
+    with profiler.phase("import settings/logging"):
+        from src.settings import Settings
+        from src.logging_config import configure_logging
+    with profiler.phase("import main_window"):
+        from src.ui.main_window import MainWindow
+
+    with profiler.phase("configure_logging"):
+        configure_logging()
+    with profiler.phase("Settings.load"):
+        settings = Settings.load()
+
+    with profiler.phase("QApplication"):
+        app = QApplication(argv)
+    with profiler.phase("MainWindow()"):
+        window = MainWindow(settings)
+        window.setWindowTitle(settings.app_name)
+    with profiler.phase("window.show"):
+        window.show()
 
     sys.exit(app.exec())
 
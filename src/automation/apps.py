@@ -0,0 +1,174 @@
+"""App process registry: reuse running apps, launch each one once, pre-warm predicted ones."""
+import json
+import logging
+import os
+import re
+import subprocess
+import threading
+import time
+from collections import Counter, deque
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Deque, Dict, Optional
+
+from src.automation.windows import tracker
+from src.tracing import span
+
+logger = logging.getLogger(__name__)
+
+LAUNCH_GRACE = 20.0       # a launch younger than this is still expected to open its window
+PREWARM_COOLDOWN = 60.0   # seconds before the same app may be pre-launched again
+RECENT_OPENS = 50         # opened apps remembered for prediction
+MIN_PREFIX = 2            # "open w" is too early to guess
+
+# "open wo", "please launch micro", "start up the exc"
+_OPENING_RE = re.compile(
+    r"^(?:please\s+)?(?:open|launch|start|run)\s+(?:up\s+)?(?:the\s+)?(?P<prefix>[a-z][a-z ]*)$",
+    re.IGNORECASE,
+)
+
+# Windows: show a pre-launched app minimized and without stealing focus
+SW_SHOWMINNOACTIVE = 7
+
+
+@dataclass
+class AppProcess:
+    app: str
+    process: object   # subprocess.Popen
+    started: float
+    prewarmed: bool = False
+
+    def starting(self) -> bool:
+        """Launched recently and still running, so its window should be on the way."""
+        return self.process.poll() is None and time.monotonic() - self.started < LAUNCH_GRACE
+
+
+class AppRegistry:
+    """
+    Knows which apps are running (from the window tracker) and which ones it
+    launched itself. `open()` focuses a running instance instead of starting
+    another, and never launches an app twice while its window is still coming
+    up. `prewarm()` starts an app in the background ahead of an "open"
+    command; `predict()` guesses which app a half-typed request is about,
+    preferring apps the user opened recently.
+    """
+
+    def __init__(self, paths: Dict[str, str], aliases: Dict[str, str], history_path: Optional[Path]):
+        """
+        Args:
+            paths (Dict[str, str]): App name -> executable.
+            aliases (Dict[str, str]): Spoken name ("microsoft word") -> app name.
+            history_path (Path): Where recently opened apps are remembered
+                (None = only for this session).
+        """
+        self.paths = paths
+        self.aliases = aliases
+        self.history_path = history_path
+        self.prewarm_enabled = True
+        self._procs: Dict[str, AppProcess] = {}
+        self._prewarmed_at: Dict[str, float] = {}
+        self._recent: Deque[str] = deque(maxlen=RECENT_OPENS)
+        self._lock = threading.Lock()
+        self._load()
+
+    # --- Opening ---
+    def open(self, app: str) -> str:
+        """
+        Make sure `app` is running. Returns how:
+        "reused" (a window is already open), "warming" (launched earlier,
+        window on the way) or "launched".
+        """
+        with span("apps.open", app=app) as attrs:
+            with self._lock:
+                self._recent.append(app)
+                if tracker.find(app) is not None:
+                    how = "reused"
+                else:
+                    proc = self._procs.get(app)
+                    if proc is not None and proc.starting():
+                        how = "warming"
+                    else:
+                        self._procs[app] = AppProcess(app, self._launch(app), time.monotonic())
+                        how = "launched"
+            attrs["how"] = how
+        self._save()
+        return how
+
+    def running(self, app: str) -> bool:
+        return tracker.find(app) is not None
+
+    # --- Pre-warming ---
+    def prewarm(self, app: str) -> bool:
+        """Start `app` in the background unless it is running, starting, or was pre-launched lately."""
+        if not self.prewarm_enabled or app not in self.paths:
+            return False
+        with self._lock:
+            now = time.monotonic()
+            if now - self._prewarmed_at.get(app, -PREWARM_COOLDOWN) < PREWARM_COOLDOWN:
+                return False
+            proc = self._procs.get(app)
+            if (proc is not None and proc.starting()) or tracker.find(app) is not None:
+                return False
+            self._prewarmed_at[app] = now
+            self._procs[app] = AppProcess(app, self._launch(app, background=True), now, prewarmed=True)
+        logger.info("Pre-launched %s", app)
+        return True
+
+    def predict(self, text: str) -> Optional[str]:
+        """The app a half-typed "open ..." request is most likely about, or None."""
+        m = _OPENING_RE.match(text.strip())
+        if not m:
+            return None
+        prefix = " ".join(m.group("prefix").lower().split())
+        if len(prefix) < MIN_PREFIX:
+            return None
+        candidates = {app for alias, app in self.aliases.items() if alias.startswith(prefix)}
+        if len(candidates) == 1:
+            return candidates.pop()
+        if not candidates:
+            return None
+        # Ambiguous: go with the app opened most often lately, if it clearly leads
+        with self._lock:
+            counts = Counter(a for a in self._recent if a in candidates).most_common(2)
+        if counts and (len(counts) == 1 or counts[0][1] >= 2 * counts[1][1]):
+            return counts[0][0]
+        return None
+
+    def prewarm_for(self, text: str) -> Optional[str]:
+        """Pre-launch the app `text` is heading towards; returns it if a launch started."""
+        app = self.predict(text)
+        if app is not None and self.prewarm(app):
+            return app
+        return None
+
+    # --- Internals ---
+    def _launch(self, app: str, background: bool = False):
+        kwargs = {}
+        startupinfo = getattr(subprocess, "STARTUPINFO", None)
+        if background and startupinfo is not None:
+            info = startupinfo()
+            info.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+            info.wShowWindow = SW_SHOWMINNOACTIVE
+            kwargs["startupinfo"] = info
+        return subprocess.Popen([self.paths[app]], **kwargs)
+
+    def _load(self):
+        if self.history_path is None or not self.history_path.exists():
+            return
+        try:
+            self._recent.extend(json.loads(self.history_path.read_text(encoding="utf-8")))
+        except Exception:
+            logger.warning("Ignoring unreadable app history %s", self.history_path)
+
+    def _save(self):
+        if self.history_path is None:
+            return
+        with self._lock:
+            data = list(self._recent)
+        try:
+            self.history_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.history_path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(data), encoding="utf-8")
+            os.replace(tmp, self.history_path)
+        except Exception:
+            logger.debug("Saving app history failed", exc_info=True)
@@ -1,35 +1,38 @@
-"""Desktop automation using pyautogui, pygetwindow, and webbrowser only."""
+"""Desktop automation using pyautogui, pygetwindow (via the window tracker), and webbrowser only."""
 
 import time
 import webbrowser
-import pyautogui
-import pygetwindow as gw
+from src.automation import readiness, text_input
+from src.automation.windows import tracker
+from src.lazy_import import lazy_import
 
-pyautogui.FAILSAFE = True  # Move mouse to top-left to abort
+
+def _enable_failsafe(module):
+    module.FAILSAFE = True  # Move mouse to top-left to abort
+
+
+pyautogui = lazy_import("pyautogui", on_load=_enable_failsafe)
 
 
 def open_app_via_start(app_name: str):
     """Open an app via Windows Start Menu."""
+    before = tracker.active_title()
     pyautogui.press("win")
-    time.sleep(0.2)
+    readiness.wait_for_active_change("start", "start_menu", before, default_timeout=1)
     pyautogui.typewrite(app_name)
+    # Search results are not observable through window titles; give them a moment
     time.sleep(0.2)
     pyautogui.press("enter")
 
 
 def focus_window_by_title(partial: str) -> bool:
     """Bring a window with partial title into focus."""
-    wins = [w for w in gw.getAllTitles() if partial.lower() in w.lower()]
-    if not wins:
-        return False
-    w = gw.getWindowsWithTitle(wins[0])[0]
-    w.activate()
-    return True
+    return tracker.activate(partial)
 
 
 def type_text(text: str):
     """Type text into the currently focused window."""
-    pyautogui.typewrite(text, interval=0.02)
+    text_input.inject_text(text)
 
 
 def open_url(url: str):
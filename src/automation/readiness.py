@@ -0,0 +1,142 @@
+"""Condition-based readiness waits with per-app timing learned from past runs.
+
+Instead of sleeping a fixed amount after a keystroke, each automation step
+waits for something observable (a window appearing, the active title changing)
+and records how long that took. The recorded samples give every (app, step)
+pair an adaptive timeout: generous on slow machines, tight on fast ones. A
+wait that times out is recorded at its limit, so a timeout that was learned
+too tight grows back instead of failing forever.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Callable, Deque, Dict, List, Optional
+
+from src.automation.windows import tracker
+from src.tracing import span
+
+logger = logging.getLogger(__name__)
+
+MAX_SAMPLES = 50      # per (app, step)
+MIN_SAMPLES = 5       # before the learned timeout is trusted
+TIMEOUT_FACTOR = 2.0  # learned timeout = p95 * factor + slack
+TIMEOUT_SLACK = 0.5
+MIN_TIMEOUT = 0.5
+# Steps whose timeout is never learned below the default: a cold launch can
+# take far longer than the warm ones that make up most samples
+NO_SHRINK_STEPS = frozenset({"launch"})
+
+
+class TimingHistory:
+    """Recent step durations per (app, step), persisted as JSON (in memory only without a path)."""
+
+    def __init__(self, path: Optional[Path]):
+        self.path = path
+        self._samples: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    @staticmethod
+    def _key(app: str, step: str) -> str:
+        return f"{app or '*'}:{step}"
+
+    def record(self, app: str, step: str, seconds: float):
+        with self._lock:
+            samples = self._samples.setdefault(self._key(app, step), deque(maxlen=MAX_SAMPLES))
+            samples.append(round(seconds, 4))
+        self._save()
+
+    def percentile(self, app: str, step: str, q: float) -> float:
+        with self._lock:
+            samples = sorted(self._samples.get(self._key(app, step), ()))
+        if not samples:
+            return 0.0
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def timeout_for(self, app: str, step: str, default: float) -> float:
+        """Adaptive timeout: learned from history once enough samples exist, else `default`."""
+        with self._lock:
+            count = len(self._samples.get(self._key(app, step), ()))
+        if count < MIN_SAMPLES:
+            return default
+        learned = self.percentile(app, step, 0.95) * TIMEOUT_FACTOR + TIMEOUT_SLACK
+        floor = default if step in NO_SHRINK_STEPS else MIN_TIMEOUT
+        # Never exceed the hard-coded default by much; a hung app should still fail
+        return max(floor, min(learned, default * 2))
+
+    def _load(self):
+        if self.path is None or not self.path.exists():
+            return
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            for key, values in data.items():
+                self._samples[key] = deque(values, maxlen=MAX_SAMPLES)
+        except Exception:
+            logger.warning("Ignoring unreadable timing history %s", self.path)
+
+    def _save(self):
+        if self.path is None:
+            return
+        with self._lock:
+            data = {k: list(v) for k, v in self._samples.items()}
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(data), encoding="utf-8")
+            os.replace(tmp, self.path)
+        except Exception:
+            logger.debug("Saving timing history failed", exc_info=True)
+
+
+# In memory until the app picks its data directory (see use_data_dir)
+timings = TimingHistory(None)
+
+
+def use_data_dir(data_dir: str):
+    """Learn timings into (and load them from) `data_dir`/timings.json."""
+    global timings
+    timings = TimingHistory(Path(data_dir) / "timings.json")
+
+
+def wait_until(app: str, step: str, predicate: Callable[[str, List[str]], bool],
+               default_timeout: float) -> bool:
+    """
+    Wait for `predicate(active_title, titles)` with an adaptive timeout.
+    Waits are recorded so the next timeout is learned: a timeout counts as a
+    sample at the limit, and a condition that already held counts as nothing.
+    """
+    if predicate(tracker.active_title(), tracker.titles()):
+        return True  # e.g. the window was already open; says nothing about how long it takes
+    timeout = timings.timeout_for(app, step, default_timeout)
+    start = time.monotonic()
+    with span(f"wait.{step}", app=app, timeout=round(timeout, 2)) as attrs:
+        ok = attrs["ok"] = tracker.wait_until(predicate, timeout)
+    elapsed = time.monotonic() - start
+    if ok:
+        timings.record(app, step, elapsed)
+    else:
+        timings.record(app, step, timeout)
+        logger.warning("%s/%s not ready after %.2fs", app or "*", step, timeout)
+    return ok
+
+
+def wait_for_window(app: str, step: str, partial: str, default_timeout: float) -> bool:
+    """Wait until a window whose title contains `partial` exists."""
+    partial = partial.lower()
+    return wait_until(app, step, lambda _a, titles: any(partial in t.lower() for t in titles),
+                      default_timeout)
+
+
+def wait_for_active_change(app: str, step: str, before: str, default_timeout: float) -> bool:
+    """Wait until the foreground window is different from `before` (e.g. a dialog opened)."""
+    return wait_until(app, step, lambda active, _t: active != before, default_timeout)
+
+
+def wait_for_active_title(app: str, step: str, partial: str, default_timeout: float) -> bool:
+    """Wait until the foreground window title contains `partial`."""
+    partial = partial.lower()
+    return wait_until(app, step, lambda active, _t: partial in active.lower(), default_timeout)
@@ -0,0 +1,132 @@
+"""Fast text entry: pick paste, chunked typing or plain keystrokes per payload."""
+import logging
+import threading
+import time
+from typing import Optional
+
+from src.automation.windows import tracker
+from src.lazy_import import lazy_import
+from src.tracing import span
+
+pyautogui = lazy_import("pyautogui")
+pyperclip = lazy_import("pyperclip")
+
+logger = logging.getLogger(__name__)
+
+KEYSTROKE_MAX = 40     # up to this many ASCII chars: plain keystrokes
+PASTE_MIN = 200        # from this many chars (or any non-ASCII): clipboard paste
+CHUNK_SIZE = 20        # chars typed between focus checks
+MIN_INTERVAL = 0.002   # adaptive per-key interval bounds for chunked typing
+MAX_INTERVAL = 0.05
+RESTORE_DELAY = 0.5    # keep the pasted text on the clipboard this long
+
+
+class FocusLostError(RuntimeError):
+    """The target window lost focus while text was being entered."""
+
+
+def choose_strategy(text: str) -> str:
+    """Return "paste", "chunked" or "keys" for a payload."""
+    if not text.isascii() or len(text) >= PASTE_MIN:
+        return "paste"   # typewrite cannot produce non-ASCII and is slow for bulk text
+    if len(text) <= KEYSTROKE_MAX:
+        return "keys"
+    return "chunked"
+
+
+def _ensure_focus(target: str):
+    """Check the target still has focus; try to refocus once before giving up."""
+    if not target or target.lower() in tracker.active_title().lower():
+        return
+    logger.info("Focus moved away from %s; refocusing", target)
+    if not tracker.activate(target) or target.lower() not in tracker.active_title().lower():
+        raise FocusLostError(f"{target} is no longer the active window")
+
+
+# One pending clipboard restore for all pastes: a second paste within
+# RESTORE_DELAY must not get the first one's text "restored" over it, and
+# the user's own clipboard is what finally comes back
+_restore_lock = threading.Lock()
+_restore_timer: Optional[threading.Timer] = None
+_restore_text: Optional[str] = None
+
+
+def _paste(text: str, target: str):
+    global _restore_timer, _restore_text
+    with _restore_lock:
+        if _restore_timer is not None:
+            # The clipboard holds our last paste; keep the original we saved then
+            _restore_timer.cancel()
+            _restore_timer = None
+        else:
+            try:
+                _restore_text = pyperclip.paste()
+            except Exception:
+                _restore_text = None
+        pyperclip.copy(text)
+    try:
+        _ensure_focus(target)
+        pyautogui.hotkey("ctrl", "v")
+    finally:
+        # Also when focus was lost. The target reads the clipboard
+        # asynchronously, so restore it a little later
+        _schedule_restore()
+
+
+def _schedule_restore():
+    global _restore_timer
+    with _restore_lock:
+        if _restore_text is None:
+            return
+        if _restore_timer is not None:
+            _restore_timer.cancel()
+        _restore_timer = threading.Timer(RESTORE_DELAY, _restore_clipboard)
+        _restore_timer.daemon = True
+        _restore_timer.start()
+
+
+def _restore_clipboard():
+    global _restore_timer, _restore_text
+    with _restore_lock:
+        if _restore_timer is not threading.current_thread():
+            return  # a newer paste took over while this timer was firing
+        text, _restore_timer, _restore_text = _restore_text, None, None
+        pyperclip.copy(text)
+
+
+def _type_chunked(text: str, target: str):
+    interval = MIN_INTERVAL
+    for i in range(0, len(text), CHUNK_SIZE):
+        _ensure_focus(target)
+        chunk = text[i:i + CHUNK_SIZE]
+        start = time.monotonic()
+        pyautogui.write(chunk, interval=interval)
+        # write() sleeps pyautogui.PAUSE once after the call; only time the keys
+        elapsed = max(0.0, time.monotonic() - start - (getattr(pyautogui, "PAUSE", 0) or 0))
+        # If key events take much longer than requested the desktop is lagging:
+        # slow down so keystrokes are not dropped; otherwise speed back up.
+        expected = len(chunk) * max(interval, MIN_INTERVAL)
+        if elapsed > expected * 1.5:
+            interval = min(MAX_INTERVAL, interval * 2)
+        else:
+            interval = max(MIN_INTERVAL, interval * 0.75)
+
+
+def inject_text(text: str, target: str = "") -> str:
+    """
+    Enter `text` into the focused window, verifying that the window whose
+    title contains `target` keeps focus. Returns the strategy used.
+    Raises FocusLostError if focus cannot be kept on the target.
+    """
+    strategy = choose_strategy(text)
+    start = time.monotonic()
+    with span("input.inject", strategy=strategy, chars=len(text)):
+        if strategy == "paste":
+            _paste(text, target)
+        elif strategy == "chunked":
+            _type_chunked(text, target)
+        else:
+            _ensure_focus(target)
+            pyautogui.write(text, interval=0.01)
+    logger.info("Entered %d chars via %s in %.2fs", len(text), strategy, time.monotonic() - start)
+    return strategy
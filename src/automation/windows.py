@@ -0,0 +1,193 @@
+"""Shared window-state service: a title -> window index kept fresh in the background."""
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from src.lazy_import import lazy_import
+
+gw = lazy_import("pygetwindow")
+
+logger = logging.getLogger(__name__)
+
+# callback(event, title, window) with event "opened", "closed" or "renamed"
+WindowCallback = Callable[[str, str, object], None]
+
+
+def _handle(window) -> object:
+    return getattr(window, "_hWnd", None) or id(window)
+
+
+class WindowTracker:
+    """
+    Keeps an index of top-level windows that a background watcher updates
+    incrementally (only opened/closed/renamed windows are touched), and lets
+    callers wait for a window with subscribe/notify semantics instead of
+    polling `gw.getAllTitles()` themselves.
+    """
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self._windows: Dict[object, object] = {}   # handle -> window
+        self._titles: Dict[object, str] = {}       # handle -> title
+        self._active_title = ""
+        self._cond = threading.Condition()
+        self._subscribers: List[WindowCallback] = []
+        self._thread: Optional[threading.Thread] = None
+        self._last_refresh = 0.0
+
+    # --- Watcher ---
+    def start(self):
+        """Start the background watcher (idempotent)."""
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._watch, name="window-tracker", daemon=True)
+            self._thread.start()
+
+    def _watch(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception:
+                logger.debug("Window refresh failed", exc_info=True)
+            time.sleep(self.interval)
+
+    def refresh(self) -> bool:
+        """Diff the live window list against the index. Returns True if anything changed."""
+        windows = gw.getAllWindows()
+        try:
+            active = gw.getActiveWindow()
+            active_title = active.title if active is not None else ""
+        except Exception:
+            active_title = ""
+
+        events = []
+        with self._cond:
+            seen = set()
+            for w in windows:
+                title = w.title
+                if not title:
+                    continue
+                h = _handle(w)
+                seen.add(h)
+                old = self._titles.get(h)
+                if old is None:
+                    events.append(("opened", title, w))
+                elif old != title:
+                    events.append(("renamed", title, w))
+                else:
+                    continue
+                self._windows[h] = w
+                self._titles[h] = title
+            for h in [h for h in self._titles if h not in seen]:
+                events.append(("closed", self._titles.pop(h), self._windows.pop(h)))
+
+            changed = bool(events) or active_title != self._active_title
+            self._active_title = active_title
+            self._last_refresh = time.monotonic()
+            if changed:
+                self._cond.notify_all()
+            subscribers = list(self._subscribers)
+
+        for event in events:
+            for cb in subscribers:
+                try:
+                    cb(*event)
+                except Exception:
+                    logger.exception("Window subscriber failed")
+        return changed
+
+    def _ensure_fresh(self):
+        self.start()
+        if time.monotonic() - self._last_refresh > self.interval * 2:
+            self.refresh()
+
+    # --- Queries ---
+    def _find_locked(self, partial: str):
+        partial = partial.lower()
+        for h, title in self._titles.items():
+            if partial in title.lower():
+                return self._windows[h]
+        return None
+
+    def find(self, partial: str):
+        """Return a window whose title contains `partial` (case-insensitive), or None."""
+        self._ensure_fresh()
+        with self._cond:
+            return self._find_locked(partial)
+
+    def titles(self) -> List[str]:
+        self._ensure_fresh()
+        with self._cond:
+            return list(self._titles.values())
+
+    def active_title(self) -> str:
+        self._ensure_fresh()
+        with self._cond:
+            return self._active_title
+
+    def wait_for(self, partial: str, timeout: float = 15):
+        """Block until a matching window exists (woken by the watcher). Returns it or None."""
+        self._ensure_fresh()
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                w = self._find_locked(partial)
+                if w is not None:
+                    return w
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+
+    def wait_until(self, predicate: Callable[[str, List[str]], bool], timeout: float) -> bool:
+        """
+        Block until `predicate(active_title, titles)` holds, re-checking on every
+        window change, or until timeout.
+        """
+        self._ensure_fresh()
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while not predicate(self._active_title, list(self._titles.values())):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    def subscribe(self, callback: WindowCallback) -> Callable[[], None]:
+        """Call `callback(event, title, window)` on every change. Returns an unsubscribe function."""
+        self.start()
+        with self._cond:
+            self._subscribers.append(callback)
+
+        def unsubscribe():
+            with self._cond:
+                if callback in self._subscribers:
+                    self._subscribers.remove(callback)
+        return unsubscribe
+
+    # --- Actions ---
+    def activate(self, partial: str, timeout: float = 0, wait_active: float = 1.0) -> bool:
+        """Focus a window whose title contains `partial`; wait briefly until it is foreground."""
+        w = self.wait_for(partial, timeout) if timeout else self.find(partial)
+        if w is None:
+            return False
+        if getattr(w, "isMinimized", False):
+            # activate() alone leaves a minimized (e.g. pre-launched) window minimized
+            try:
+                w.restore()
+            except Exception:
+                logger.debug("restore() reported an error", exc_info=True)
+        try:
+            w.activate()
+        except Exception:
+            # pygetwindow raises "Error code from Windows: 0" even on success
+            logger.debug("activate() reported an error", exc_info=True)
+        title = partial.lower()
+        self.wait_until(lambda active, _titles: title in active.lower(), wait_active)
+        return True
+
+
+tracker = WindowTracker()
@@ -0,0 +1,331 @@
+"""Headless batch runner: push prompts through the agent pipeline without a GUI.
+
+    python -m src.batch prompts.txt --out results.jsonl --concurrency 8 --dry-run
+    cat prompts.txt | python -m src.batch - --endpoint http://127.0.0.1:8765 --dry-run
+
+Each prompt takes the same path as in the app (local router, learned plan
+templates, then Gemini) and any command plan in the reply is run through the
+executor. With --dry-run the desktop is never touched: every command just
+reports what it would have done, so this runs on a display-less box. Pair it
+with the fake model server (python -m benchmarks.fake_server) for load tests
+without an API key.
+
+One JSON line per prompt (in completion order, with its input `index`) goes
+to --out, or stdout; a throughput summary goes to stderr.
+"""
+import argparse
+import dataclasses
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from types import ModuleType
+from typing import Any, Dict, Iterable, List, Optional, TextIO, Tuple
+
+from src import tracing
+
+logger = logging.getLogger(__name__)
+
+
+# --- Input ---
+def read_prompts(lines: Iterable[str]) -> List[str]:
+    """One prompt per line; blank lines and #comments are skipped, {"prompt": ...} lines are unwrapped."""
+    prompts = []
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        if line.startswith("{"):
+            try:
+                line = json.loads(line)["prompt"]
+            except (ValueError, KeyError, TypeError):
+                pass
+        prompts.append(line)
+    return prompts
+
+
+# --- Dry-run desktop ---
+DESKTOP_MODULES = ("pyautogui", "pygetwindow", "pyperclip")
+
+
+class _NoDesktop(ModuleType):
+    """Stand-in for a desktop module in a dry run: any use is a bug, not a keystroke."""
+
+    def __getattr__(self, attr):
+        if attr.startswith("__"):
+            raise AttributeError(attr)
+        raise RuntimeError(f"--dry-run never touches the desktop ({self.__name__}.{attr})")
+
+
+def install_dry_run_modules():
+    """
+    Register stand-ins for the desktop modules. Call this before anything
+    imports src.agent.commands: importing the real pyautogui needs a display
+    (KeyError: 'DISPLAY' on a headless Linux box).
+    """
+    for name in DESKTOP_MODULES:
+        sys.modules.setdefault(name, _NoDesktop(name))
+
+
+def use_dry_run_desktop():
+    """Swap every registered command for one that only describes itself."""
+    from src.agent import commands
+
+    def describe(name: str):
+        return lambda args: f"🧪 {name} {json.dumps(args, ensure_ascii=False)}"
+
+    for name, cmd in list(commands.REGISTRY.items()):
+        # Resources are kept so steps are scheduled exactly as for real
+        # (and no prepare phase: that would launch the app for real)
+        commands.REGISTRY[name] = dataclasses.replace(cmd, func=describe(name), prepare=None)
+
+
+# --- Running ---
+class BatchRunner:
+    """Runs prompts concurrently and writes one JSON result line per prompt."""
+
+    def __init__(self, client, out: TextIO, concurrency: int = 4, dry_run: bool = False,
+                 local: bool = True, remember: bool = False, use_cache: bool = True):
+        """
+        Args:
+            client (GeminiClient): Client shared by every worker.
+            out (TextIO): Where result lines go.
+            concurrency (int): Prompts in flight at once.
+            dry_run (bool): Plans only describe their commands (see use_dry_run_desktop).
+                Without it, plans run one at a time: the desktop has one keyboard.
+            local (bool): Try the local router and plan templates before Gemini.
+            remember (bool): Add each exchange to the conversation memory.
+            use_cache (bool): Serve repeated prompts from the response cache.
+        """
+        self.client = client
+        self.out = out
+        self.concurrency = max(1, concurrency)
+        self.dry_run = dry_run
+        self.local = local
+        self.remember = remember
+        self.use_cache = use_cache
+        self._desktop_lock = threading.Lock()
+        self._out_lock = threading.Lock()
+        self.results: List[Dict[str, Any]] = []
+
+    def run(self, prompts: List[str]) -> Dict[str, Any]:
+        """Run every prompt; returns the summary."""
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="batch") as pool:
+            for i, prompt in enumerate(prompts):
+                pool.submit(self._run_one, i, prompt)
+        return summarize(self.results, time.perf_counter() - start)
+
+    def _run_one(self, index: int, prompt: str):
+        result: Dict[str, Any] = {"index": index, "prompt": prompt, "trace": tracing.new_trace()}
+        start = time.perf_counter()
+        try:
+            with tracing.trace(result["trace"]), tracing.span("batch.prompt"):
+                plan, template = self._local_plan(prompt, result) if self.local else (None, None)
+                if plan is None:
+                    plan = self._ask(prompt, result)
+                if plan:
+                    self._execute(prompt, plan, result, template)
+            result["ok"] = "error" not in result and not result.get("failed")
+        except Exception as e:
+            logger.exception("Prompt %d failed", index)
+            result.update(ok=False, error=f"{type(e).__name__}: {e}")
+        result["total_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        self._write(result)
+
+    def _local_plan(self, prompt: str, result: Dict[str, Any]) -> Tuple[Optional[list], object]:
+        """(plan, template it came from) without asking the model, or (None, None)."""
+        from src.agent import plan_cache
+        from src.agent.router import route_command
+
+        route = route_command(prompt)
+        if route is not None:
+            result["source"] = "router"
+            return route.commands, None
+        hit = plan_cache.templates.lookup(prompt)
+        if hit is not None:
+            result["source"] = "template"
+            return hit.plan, hit.template
+        return None, None
+
+    def _ask(self, prompt: str, result: Dict[str, Any]) -> Optional[list]:
+        from src.agent.executor import parse_plan
+        from src.ai.gemini_client import ERROR_PREFIX
+
+        result["source"] = "gemini"
+        start = time.perf_counter()
+        parts = []
+        for piece in self.client.generate_stream(prompt, use_cache=self.use_cache, remember=self.remember):
+            if not parts:
+                result["ttft_ms"] = round((time.perf_counter() - start) * 1000, 1)
+            parts.append(piece)
+        reply = "".join(parts).strip()
+        result["model_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        result["reply"] = reply
+        if ERROR_PREFIX in reply:
+            result["error"] = reply
+            return None
+        return parse_plan(reply)
+
+    def _execute(self, prompt: str, plan: list, result: Dict[str, Any], template=None):
+        from src.agent import plan_cache
+        from src.agent.executor import execute_commands
+
+        start = time.perf_counter()
+        if self.dry_run:
+            say, results = execute_commands(plan)
+        else:
+            with self._desktop_lock:
+                say, results = execute_commands(plan)
+        lines = results.splitlines()
+        result.update(
+            plan=plan,
+            say=say,
+            results=lines,
+            failed=plan_cache.failed(lines),
+            exec_ms=round((time.perf_counter() - start) * 1000, 1),
+        )
+        if result["source"] != "router":
+            plan_cache.templates.observe(prompt, plan, lines, template)
+
+    def _write(self, result: Dict[str, Any]):
+        with self._out_lock:
+            self.results.append(result)
+            self.out.write(json.dumps(result, ensure_ascii=False) + "\n")
+            self.out.flush()
+
+
+# --- Report ---
+def _pct(values: List[float], q: float) -> float:
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+def summarize(results: List[Dict[str, Any]], wall: float) -> Dict[str, Any]:
+    totals = sorted(r["total_ms"] for r in results)
+    ttfts = sorted(r["ttft_ms"] for r in results if "ttft_ms" in r)
+    sources: Dict[str, int] = {}
+    for r in results:
+        sources[r.get("source", "?")] = sources.get(r.get("source", "?"), 0) + 1
+    return {
+        "prompts": len(results),
+        "ok": sum(1 for r in results if r.get("ok")),
+        "errors": sum(1 for r in results if "error" in r),
+        "failed_plans": sum(1 for r in results if r.get("failed")),
+        "sources": sources,
+        "wall_s": round(wall, 3),
+        "prompts_per_s": round(len(results) / wall, 2) if wall > 0 else 0.0,
+        "total_p50_ms": _pct(totals, 0.5),
+        "total_p95_ms": _pct(totals, 0.95),
+        "ttft_p50_ms": _pct(ttfts, 0.5),
+        "ttft_p95_ms": _pct(ttfts, 0.95),
+    }
+
+
+def format_summary(summary: Dict[str, Any]) -> str:
+    routing = summary.get("routing")
+    return (
+        f"{summary['prompts']} prompts in {summary['wall_s']:.2f}s "
+        f"({summary['prompts_per_s']:.2f}/s): {summary['ok']} ok, {summary['errors']} errors, "
+        f"{summary['failed_plans']} failed plans\n"
+        f"sources: {', '.join(f'{k}={v}' for k, v in sorted(summary['sources'].items()))}\n"
+        f"total ms p50/p95: {summary['total_p50_ms']:.0f}/{summary['total_p95_ms']:.0f}   "
+        f"first token ms p50/p95: {summary['ttft_p50_ms']:.0f}/{summary['ttft_p95_ms']:.0f}"
+        + (f"\nmodels: fast={routing['fast']}, strong={routing['strong']}, "
+           f"escalated={routing['escalated']}" if routing else "")
+    )
+
+
+# --- CLI ---
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("prompts", help="file with one prompt per line, or - for stdin")
+    parser.add_argument("--out", help="JSONL results file (default: stdout)")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--dry-run", action="store_true", help="describe commands instead of running them")
+    parser.add_argument("--endpoint", help="model API endpoint, e.g. a fake server (http://127.0.0.1:8765)")
+    parser.add_argument("--data-dir", help="memory/cache/template files (default: a fresh temp dir)")
+    parser.add_argument("--no-local", action="store_true", help="send every prompt to the model")
+    parser.add_argument("--no-cache", action="store_true", help="skip the response cache")
+    parser.add_argument("--remember", action="store_true", help="add exchanges to the conversation memory")
+    parser.add_argument("--summary-json", help="also write the summary to this file")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args(argv)
+    if args.dry_run:
+        install_dry_run_modules()  # before src.agent.commands is imported
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format="%(asctime)s | %(levelname)s | %(name)s | %(message)s")
+
+    from dotenv import load_dotenv
+    load_dotenv(override=False)
+    if args.endpoint:
+        os.environ.setdefault("GEMINI_API_KEY", "fake-key")  # fake servers don't check it
+    from src.settings import Settings
+    settings = Settings.load()
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix="gemini-batch-")
+    os.makedirs(data_dir, exist_ok=True)
+
+    from src.agent import commands, plan_cache
+    from src.ai.gemini_client import GeminiClient
+    from src.automation import readiness
+    # Keep what the batch learns out of the app's files unless pointed at its data dir
+    readiness.use_data_dir(data_dir)
+    commands.use_data_dir(data_dir)
+    plan_cache.use_data_dir(data_dir, enabled=settings.plan_templates)
+    if args.dry_run:
+        use_dry_run_desktop()
+    else:
+        from src.automation.windows import tracker
+        tracker.start()
+
+    if args.prompts == "-":
+        prompts = read_prompts(sys.stdin)
+    else:
+        with open(args.prompts, encoding="utf-8") as f:
+            prompts = read_prompts(f)
+    if not prompts:
+        print("No prompts", file=sys.stderr)
+        return 1
+
+    client = GeminiClient(
+        api_key=settings.api_key,
+        model=settings.model,
+        context_tokens=settings.context_tokens,
+        cache_enabled=settings.cache_enabled and not args.no_cache,
+        cache_ttl=settings.cache_ttl,
+        data_dir=data_dir,
+        request_timeout=settings.request_timeout,
+        retries=settings.retries,
+        hedge=settings.hedge,
+        api_endpoint=args.endpoint or settings.api_endpoint or None,
+        fast_model=settings.fast_model or None,
+        fast_max_words=settings.fast_max_words,
+        escalate=settings.escalate,
+        plan_commands=commands.REGISTRY,
+    )
+    out = open(args.out, "w", encoding="utf-8") if args.out else sys.stdout
+    try:
+        runner = BatchRunner(client, out, concurrency=args.concurrency, dry_run=args.dry_run,
+                             local=not args.no_local, remember=args.remember,
+                             use_cache=not args.no_cache)
+        summary = runner.run(prompts)
+        if client.router.enabled:
+            summary["routing"] = client.router.stats()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        client.save_memory()
+
+    print(format_summary(summary), file=sys.stderr)
+    if args.summary_json:
+        Path(args.summary_json).write_text(json.dumps(summary, indent=2) + "\n", encoding="utf-8")
+    return 0 if summary["errors"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
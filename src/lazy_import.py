@@ -0,0 +1,86 @@
+"""Defer heavy third-party imports until first attribute access."""
+import importlib
+import importlib.util
+import sys
+import threading
+from types import ModuleType
+from typing import Callable, Dict, Optional
+
+# importlib.util.LazyLoader isn't thread-safe before Python 3.12: a second
+# thread touching the module mid-load can run its code twice or see it half
+# initialized. The GUI warms modules on a background thread, so load under a lock.
+_load_lock = threading.RLock()
+_proxies: Dict[str, "_LazyModule"] = {}   # one placeholder per module name
+
+
+class _LazyModule(ModuleType):
+    """
+    Stands in for a module until first use, then forwards everything to it.
+    Don't assign attributes at import time: that loads the module right away
+    (use the `on_load` hook of `lazy_import` instead).
+    """
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.__dict__["_lazy_hooks"] = []
+
+    def _load(self) -> ModuleType:
+        module = self.__dict__.get("_lazy_target")
+        if module is None:
+            with _load_lock:
+                module = self.__dict__.get("_lazy_target")
+                if module is None:
+                    module = importlib.import_module(self.__name__)
+                    for hook in self.__dict__["_lazy_hooks"]:
+                        hook(module)
+                    self.__dict__["_lazy_target"] = module   # published only after the hooks ran
+        return module
+
+    def __getattr__(self, attr):
+        # Only called for names the placeholder itself doesn't have
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    def __dir__(self):
+        return dir(self._load())
+
+
+def lazy_import(name: str, on_load: Optional[Callable[[ModuleType], None]] = None) -> ModuleType:
+    """
+    Return `name` as a module whose code only runs when an attribute is first
+    used, so e.g. `pyautogui = lazy_import("pyautogui")` at module level costs
+    nothing at startup. Falls back to a normal import if the module is already
+    loaded or cannot be found (so a missing dependency still raises ImportError).
+    Safe to first touch from several threads at once.
+
+    Args:
+        name (str): Module to import.
+        on_load (callable): Called with the real module once it is imported
+            (right away if it already is), e.g. to set module-level options.
+    """
+    with _load_lock:
+        proxy = _proxies.get(name)
+        if proxy is not None and "_lazy_target" not in proxy.__dict__:
+            if on_load is not None:
+                proxy.__dict__["_lazy_hooks"].append(on_load)
+            return proxy
+        if name not in sys.modules:
+            spec = importlib.util.find_spec(name)
+            if spec is not None and spec.loader is not None:
+                proxy = _proxies[name] = _LazyModule(name)
+                if on_load is not None:
+                    proxy.__dict__["_lazy_hooks"].append(on_load)
+                return proxy
+        module = importlib.import_module(name)
+        if on_load is not None:
+            on_load(module)
+        return module
+
+
+def preload(*modules: ModuleType):
+    """Force lazily imported modules to load now (e.g. on a background thread)."""
+    for module in modules:
+        if isinstance(module, _LazyModule):
+            module._load()
@@ -1,7 +1,11 @@
+import atexit
 import logging
-from logging.handlers import RotatingFileHandler
+import queue
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
 
+from src.tracing import PERF_LOG, SpanFormatter, is_span, perf_logger
+
 
 def configure_logging():
     log_dir = Path.home() / ".gemini_agent"
@@ -19,11 +23,27 @@ def configure_logging():
     # Console
     ch = logging.StreamHandler()
     ch.setFormatter(fmt)
-    root.addHandler(ch)
+    ch.addFilter(lambda r: not is_span(r))
 
     # Rotating file (2 MB max, 3 backups)
     fh = RotatingFileHandler(
         log_file, maxBytes=2_000_000, backupCount=3, encoding="utf-8"
     )
     fh.setFormatter(fmt)
-    root.addHandler(fh)
+    fh.addFilter(lambda r: not is_span(r))
+
+    # Perf spans as JSONL (see src.tracing)
+    ph = RotatingFileHandler(
+        PERF_LOG, maxBytes=5_000_000, backupCount=3, encoding="utf-8"
+    )
+    ph.setFormatter(SpanFormatter())
+    ph.addFilter(is_span)
+
+    # Loggers only enqueue; a background thread does the formatting and disk I/O
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, ch, fh, ph)
+    listener.start()
+    atexit.register(listener.stop)
+
+    root.addHandler(QueueHandler(log_queue))
+    perf_logger.setLevel(logging.INFO)
@@ -7,7 +7,25 @@ from dotenv import load_dotenv
 class Settings:
     api_key: str
     model: str = "gemini-1.5-flash"
+    fast_model: str = ""  # low-latency model for short/command prompts; empty = always `model`
+    fast_max_words: int = 25  # longer prompts (without a command verb) go to `model`
+    escalate: bool = True  # re-ask `model` when the fast model's plan doesn't parse
     app_name: str = "Crow Desktop Agent"
+    context_tokens: int = 4000
+    cache_enabled: bool = True
+    cache_ttl: float = 7 * 24 * 3600
+    data_dir: str = ""  # memory, cache and learned files; empty = ~/.gemini_agent
+    request_timeout: float = 30.0
+    retries: int = 2
+    hedge: bool = True
+    api_endpoint: str = ""  # e.g. a local fake server; empty = Google's API
+    max_in_flight: int = 1  # concurrent Gemini requests; >1 means later ones miss earlier replies
+    supersede: bool = False  # a new message drops queued ones that haven't started
+    plan_templates: bool = True  # replay learned Gemini plans for same-shaped requests
+    prewarm_apps: bool = True  # start an app while "open wo…" is still being typed
+    prefetch: bool = True  # ask Gemini speculatively when typing pauses; reused if the text is sent
+    prefetch_delay_ms: int = 400  # typing pause before a speculative request
+    prefetch_budget: int = 5  # unused speculative requests allowed per minute
 
     @staticmethod
     def load() -> "Settings":
@@ -15,6 +33,45 @@ class Settings:
         load_dotenv(override=False)
         api_key = os.getenv("GEMINI_API_KEY", "")
         model = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
+        fast_model = os.getenv("GEMINI_FAST_MODEL", "")
+        fast_max_words = int(os.getenv("GEMINI_FAST_MAX_WORDS", "25"))
+        escalate = os.getenv("GEMINI_ESCALATE", "1").lower() not in ("0", "false", "no", "off")
+        context_tokens = int(os.getenv("GEMINI_CONTEXT_TOKENS", "4000"))
+        cache_enabled = os.getenv("GEMINI_CACHE", "1").lower() not in ("0", "false", "no", "off")
+        cache_ttl = float(os.getenv("GEMINI_CACHE_TTL", str(7 * 24 * 3600)))
+        data_dir = os.getenv("GEMINI_DATA_DIR", "")
+        request_timeout = float(os.getenv("GEMINI_TIMEOUT", "30"))
+        retries = int(os.getenv("GEMINI_RETRIES", "2"))
+        hedge = os.getenv("GEMINI_HEDGE", "1").lower() not in ("0", "false", "no", "off")
+        api_endpoint = os.getenv("GEMINI_API_ENDPOINT", "")
+        max_in_flight = int(os.getenv("GEMINI_MAX_IN_FLIGHT", "1"))
+        supersede = os.getenv("GEMINI_SUPERSEDE", "0").lower() in ("1", "true", "yes", "on")
+        plan_templates = os.getenv("GEMINI_PLAN_TEMPLATES", "1").lower() not in ("0", "false", "no", "off")
+        prewarm_apps = os.getenv("GEMINI_PREWARM_APPS", "1").lower() not in ("0", "false", "no", "off")
+        prefetch = os.getenv("GEMINI_PREFETCH", "1").lower() not in ("0", "false", "no", "off")
+        prefetch_delay_ms = int(os.getenv("GEMINI_PREFETCH_DELAY_MS", "400"))
+        prefetch_budget = int(os.getenv("GEMINI_PREFETCH_BUDGET", "5"))
         if not api_key:
             raise RuntimeError("GEMINI_API_KEY is missing. Create a .env file with your key.")
-        return Settings(api_key=api_key, model=model)
+        return Settings(
+            api_key=api_key,
+            model=model,
+            fast_model=fast_model,
+            fast_max_words=fast_max_words,
+            escalate=escalate,
+            context_tokens=context_tokens,
+            cache_enabled=cache_enabled,
+            cache_ttl=cache_ttl,
+            data_dir=data_dir,
+            request_timeout=request_timeout,
+            retries=retries,
+            hedge=hedge,
+            api_endpoint=api_endpoint,
+            max_in_flight=max_in_flight,
+            supersede=supersede,
+            plan_templates=plan_templates,
+            prewarm_apps=prewarm_apps,
+            prefetch=prefetch,
+            prefetch_delay_ms=prefetch_delay_ms,
+            prefetch_budget=prefetch_budget,
+        )
@@ -0,0 +1,60 @@
+"""Per-phase startup timings, printed with `--profile-startup`."""
+import logging
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Imported first thing by src.app, so this is (close to) process start
+_T0 = time.perf_counter()
+
+
+class StartupProfiler:
+    def __init__(self):
+        self.enabled = False
+        self._events = []  # (name, start offset, duration or None, thread name)
+        self._lock = threading.Lock()
+        self._reported = False
+
+    def _record(self, name: str, start: float, duration):
+        with self._lock:
+            self._events.append((name, start - _T0, duration, threading.current_thread().name))
+
+    @contextmanager
+    def phase(self, name: str):
+        """Time a block (an import group, a constructor, ...)."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            if self.enabled:
+                self._record(name, start, time.perf_counter() - start)
+
+    def mark(self, name: str):
+        """Record a milestone such as "first paint"."""
+        if self.enabled:
+            self._record(name, time.perf_counter(), None)
+
+    def report(self) -> str:
+        with self._lock:
+            events = sorted(self._events, key=lambda e: e[1])
+        lines = ["Startup profile (ms since launch):",
+                 f"  {'phase':<38}{'at':>9}{'took':>9}  thread"]
+        for name, at, took, thread in events:
+            took_s = f"{took * 1000:9.1f}" if took is not None else f"{'—':>9}"
+            lines.append(f"  {name:<38}{at * 1000:9.1f}{took_s}  {thread}")
+        return "\n".join(lines)
+
+    def report_once(self):
+        """Print the report (once) when startup has finished."""
+        if not self.enabled or self._reported:
+            return
+        self._reported = True
+        text = self.report()
+        print(text, file=sys.stderr)
+        logger.info(text)
+
+
+profiler = StartupProfiler()
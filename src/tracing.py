@@ -0,0 +1,211 @@
+"""Latency spans for each stage of an interaction, written as JSONL to the perf log.
+
+    with span("gemini.generate") as attrs:
+        ...
+        attrs["cached"] = True
+
+Spans are logged on the "perf" logger; `configure_logging` routes them to
+~/.gemini_agent/perf.jsonl through a background queue, so recording one costs
+a dict and a queue put. Every span carries the trace id of the user message
+that caused it (set with `trace()`), also across worker threads.
+
+    python -m src.tracing                 # p50/p95/p99 per stage
+    python -m src.tracing --slowest 5     # the slowest interactions
+    python -m src.tracing --trace 1a2b3c  # where one interaction's time went
+"""
+import argparse
+import contextvars
+import functools
+import itertools
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+
+perf_logger = logging.getLogger("perf")
+
+PERF_LOG = Path.home() / ".gemini_agent" / "perf.jsonl"
+
+_trace_id: contextvars.ContextVar = contextvars.ContextVar("trace_id", default=None)
+_parent_id: contextvars.ContextVar = contextvars.ContextVar("span_parent", default=None)
+_span_ids = itertools.count(1)
+
+
+# --- Recording ---
+def new_trace() -> str:
+    return uuid.uuid4().hex[:8]
+
+
+def current_trace() -> Optional[str]:
+    return _trace_id.get()
+
+
+@contextmanager
+def trace(trace_id: Optional[str]):
+    """Attribute spans in this block (and threads started with its context) to `trace_id`."""
+    token = _trace_id.set(trace_id)
+    try:
+        yield
+    finally:
+        _trace_id.reset(token)
+
+
+def record(name: str, start: float, seconds: float, parent: Optional[int] = None,
+           span_id: Optional[int] = None, **attrs):
+    """Log a finished span. `start` is a time.time() timestamp."""
+    if not perf_logger.isEnabledFor(logging.INFO):
+        return
+    data = {
+        "ts": round(start, 4),
+        "name": name,
+        "ms": round(seconds * 1000, 3),
+        "trace": _trace_id.get(),
+        "span": span_id or next(_span_ids),
+        "parent": parent if parent is not None else _parent_id.get(),
+        "thread": threading.current_thread().name,
+    }
+    data.update(attrs)
+    perf_logger.info(name, extra={"span": data})
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Time a block; yields a dict for attributes learned along the way."""
+    span_id = next(_span_ids)
+    parent = _parent_id.get()
+    token = _parent_id.set(span_id)
+    wall, start = time.time(), time.perf_counter()
+    try:
+        yield attrs
+    except BaseException as e:
+        attrs["error"] = type(e).__name__
+        raise
+    finally:
+        _parent_id.reset(token)
+        record(name, wall, time.perf_counter() - start, parent=parent, span_id=span_id, **attrs)
+
+
+def traced(name: str):
+    """Decorator form of `span`."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+class SpanFormatter(logging.Formatter):
+    """One JSON object per line for span records."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        return json.dumps(record.span, ensure_ascii=False, default=str)
+
+
+def is_span(record: logging.LogRecord) -> bool:
+    return hasattr(record, "span")
+
+
+# --- Report CLI ---
+def load_spans(path: Path, since: float = 0.0) -> List[dict]:
+    spans = []
+    for candidate in sorted(path.parent.glob(path.name + "*")):  # include rotated files
+        with open(candidate, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    data = json.loads(line)
+                except ValueError:
+                    continue
+                if data.get("ts", 0) >= since:
+                    spans.append(data)
+    return spans
+
+
+def _pct(values: List[float], q: float) -> float:
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def summarize(spans: List[dict]) -> str:
+    by_name: Dict[str, List[float]] = defaultdict(list)
+    for s in spans:
+        by_name[s["name"]].append(s["ms"])
+    lines = [f"{'stage':<32}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}"]
+    for name, values in sorted(by_name.items(), key=lambda kv: -sum(kv[1])):
+        values.sort()
+        lines.append(f"{name:<32}{len(values):>7}{_pct(values, 0.5):>10.1f}{_pct(values, 0.95):>10.1f}"
+                     f"{_pct(values, 0.99):>10.1f}{values[-1]:>10.1f}")
+    return "\n".join(lines)
+
+
+def _traces(spans: List[dict]) -> Dict[str, List[dict]]:
+    traces: Dict[str, List[dict]] = defaultdict(list)
+    for s in spans:
+        if s.get("trace"):
+            traces[s["trace"]].append(s)
+    return traces
+
+
+def _wall_ms(spans: List[dict]) -> float:
+    return (max(s["ts"] * 1000 + s["ms"] for s in spans) - min(s["ts"] for s in spans) * 1000)
+
+
+def slowest(spans: List[dict], count: int) -> str:
+    traces = sorted(_traces(spans).items(), key=lambda kv: -_wall_ms(kv[1]))[:count]
+    lines = [f"{'trace':<10}{'wall ms':>10}  {'spans':>5}  first stage"]
+    for trace_id, items in traces:
+        first = min(items, key=lambda s: s["ts"])
+        lines.append(f"{trace_id:<10}{_wall_ms(items):>10.1f}  {len(items):>5}  {first['name']}")
+    return "\n".join(lines)
+
+
+def show_trace(spans: List[dict], trace_id: str) -> str:
+    """Timeline of one interaction, nested by parent span."""
+    # Parents first when a child starts in the same instant
+    items = sorted(_traces(spans).get(trace_id, []), key=lambda s: (s["ts"], -s["ms"]))
+    if not items:
+        return f"No spans for trace {trace_id}"
+    parents = {s["span"]: s.get("parent") for s in items}
+
+    def depth(span_id) -> int:
+        parent = parents.get(span_id)
+        return depth(parent) + 1 if parent in parents else 0
+
+    t0 = items[0]["ts"]
+    lines = [f"Trace {trace_id}: {_wall_ms(items):.1f} ms wall",
+             f"  {'at ms':>9}{'took ms':>10}  stage"]
+    for s in items:
+        extra = {k: v for k, v in s.items() if k not in ("ts", "name", "ms", "trace", "span", "parent", "thread")}
+        detail = " ".join(f"{k}={v}" for k, v in extra.items())
+        lines.append(f"  {(s['ts'] - t0) * 1000:>9.1f}{s['ms']:>10.1f}  "
+                     f"{'  ' * depth(s['span'])}{s['name']}  [{s['thread']}] {detail}".rstrip())
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarize the perf log")
+    parser.add_argument("--file", type=Path, default=PERF_LOG)
+    parser.add_argument("--hours", type=float, help="only spans from the last N hours")
+    parser.add_argument("--slowest", type=int, metavar="N", help="list the N slowest interactions")
+    parser.add_argument("--trace", help="show the timeline of one interaction")
+    args = parser.parse_args(argv)
+
+    since = time.time() - args.hours * 3600 if args.hours else 0.0
+    spans = load_spans(args.file, since)
+    if not spans:
+        print(f"No spans in {args.file}")
+    elif args.trace:
+        print(show_trace(spans, args.trace))
+    elif args.slowest:
+        print(slowest(spans, args.slowest))
+    else:
+        print(summarize(spans))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+"""Virtualized chat history: a list model plus a delegate that paints bubbles."""
+import itertools
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import List, Tuple
+
+from PySide6.QtCore import (
+    QAbstractListModel, QEvent, QModelIndex, QRect, QSize, Qt, Signal
+)
+from PySide6.QtGui import QColor, QFont, QFontMetrics, QPainter
+from PySide6.QtWidgets import (
+    QAbstractItemView, QListView, QStyledItemDelegate, QStyleOptionViewItem
+)
+
+from src.tracing import span
+from src.ui.message_renderer import MessageRenderer, MessageStyle, is_collapsible
+
+# --- Bubble look (matches the old widget-per-message ChatBubble) ---
+BUBBLE_COLORS = {
+    "system": QColor("#555"),    # grey
+    "user": QColor("#4CAF50"),   # green
+    "model": QColor("#673AB7"),  # purple
+}
+TEXT_COLOR = QColor("white")
+TIME_COLOR = QColor("#ddd")
+LINK_COLOR = QColor("#B3E5FC")
+BUBBLE_MAX_WIDTH = 550
+TEXT_MAX_WIDTH = 500
+BUBBLE_RADIUS = 12
+PAD_X, PAD_Y = 12, 8     # inner bubble padding
+ROW_MARGIN = 9           # space around each bubble
+TIME_GAP = 6             # space between message and timestamp
+TOGGLE_GAP = 12          # space between "Show more" and the timestamp
+SHOW_MORE, SHOW_LESS = "Show more ▾", "Show less ▴"
+
+MessageRole = Qt.UserRole + 1
+KindRole = Qt.UserRole + 2
+TimeRole = Qt.UserRole + 3
+ExpandedRole = Qt.UserRole + 4
+KeyRole = Qt.UserRole + 5   # stable per message, unlike the row (older messages get prepended)
+
+_message_ids = itertools.count()
+
+
+@dataclass
+class ChatMessage:
+    who: str
+    text: str
+    kind: str  # "user", "model" or "system"
+    time: str
+    expanded: bool = False  # long messages start collapsed
+    uid: int = field(default_factory=lambda: next(_message_ids))
+
+
+class ChatModel(QAbstractListModel):
+    """Flat list of chat messages; rows are only materialized by the view."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._messages: List[ChatMessage] = []
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._messages)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        msg = self._messages[index.row()]
+        if role in (Qt.DisplayRole, MessageRole):
+            return msg.text
+        if role == KindRole:
+            return msg.kind
+        if role == TimeRole:
+            return msg.time
+        if role == ExpandedRole:
+            return msg.expanded
+        if role == KeyRole:
+            return msg.uid
+        return None
+
+    def setData(self, index, value, role=Qt.EditRole) -> bool:
+        if not index.isValid() or role != ExpandedRole:
+            return False
+        self._messages[index.row()].expanded = bool(value)
+        self.dataChanged.emit(index, index, [ExpandedRole])
+        return True
+
+    def append(self, who: str, text: str, kind: str) -> int:
+        row = len(self._messages)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self._messages.append(ChatMessage(who, text, kind, datetime.now().strftime("%H:%M")))
+        self.endInsertRows()
+        return row
+
+    def prepend(self, messages: List[ChatMessage]):
+        """Insert older messages above the existing rows."""
+        if not messages:
+            return
+        self.beginInsertRows(QModelIndex(), 0, len(messages) - 1)
+        self._messages[:0] = messages
+        self.endInsertRows()
+
+    def set_text(self, row: int, text: str):
+        self._messages[row].text = text
+        idx = self.index(row)
+        self.dataChanged.emit(idx, idx, [Qt.DisplayRole, MessageRole])
+
+
+class ChatDelegate(QStyledItemDelegate):
+    """
+    Paints chat bubbles directly; no per-message widgets or stylesheets.
+    Message text is laid out by a shared MessageRenderer (Markdown for model
+    replies); long messages collapse behind "Show more".
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.msg_font = QFont()
+        self.msg_font.setPixelSize(14)
+        self.time_font = QFont()
+        self.time_font.setPixelSize(11)
+        self._time_metrics = QFontMetrics(self.time_font)
+        self.renderer = MessageRenderer(MessageStyle(self.msg_font, TEXT_COLOR, LINK_COLOR))
+
+    # --- Geometry ---
+    def _layout(self, row_rect: QRect, index) -> Tuple[QRect, object]:
+        """Bubble rect and laid-out document for a row."""
+        text, kind = index.data(MessageRole), index.data(KindRole)
+        avail = max(50, min(TEXT_MAX_WIDTH, row_rect.width() - 2 * (ROW_MARGIN + PAD_X)))
+        # Wider windows past TEXT_MAX_WIDTH keep `avail`, so their layouts stay valid
+        doc = self.renderer.document(index.data(KeyRole), text, kind == "model",
+                                     bool(index.data(ExpandedRole)), avail)
+        text_size = self.renderer.size(doc)
+        footer_w = self._time_metrics.horizontalAdvance("00:00")
+        if is_collapsible(text):
+            footer_w += TOGGLE_GAP + self._time_metrics.horizontalAdvance(SHOW_LESS)
+        width = min(BUBBLE_MAX_WIDTH, int(max(text_size.width(), footer_w)) + 1 + 2 * PAD_X)
+        height = int(text_size.height()) + 1 + TIME_GAP + self._time_metrics.height() + 2 * PAD_Y
+
+        if kind == "system":
+            x = row_rect.left() + (row_rect.width() - width) // 2
+        elif kind == "user":
+            x = row_rect.right() - ROW_MARGIN - width
+        else:
+            x = row_rect.left() + ROW_MARGIN
+        return QRect(x, row_rect.top() + ROW_MARGIN, width, height), doc
+
+    def _footer_rect(self, bubble: QRect) -> QRect:
+        """Row at the bottom of a bubble with "Show more" and the timestamp."""
+        height = self._time_metrics.height()
+        return QRect(bubble.left() + PAD_X, bubble.bottom() - PAD_Y - height + 1,
+                     bubble.width() - 2 * PAD_X, height)
+
+    def _view_width(self, option: QStyleOptionViewItem) -> int:
+        view = self.parent()
+        if isinstance(view, QAbstractItemView):
+            return view.viewport().width()
+        return option.rect.width()
+
+    def sizeHint(self, option, index) -> QSize:
+        width = self._view_width(option)
+        bubble, _ = self._layout(QRect(0, 0, width, 0), index)
+        return QSize(width, bubble.height() + 2 * ROW_MARGIN)
+
+    # --- Painting ---
+    def paint(self, painter: QPainter, option, index):
+        kind = index.data(KindRole)
+        bubble, doc = self._layout(option.rect, index)
+
+        painter.save()
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.setPen(Qt.NoPen)
+        painter.setBrush(BUBBLE_COLORS.get(kind, BUBBLE_COLORS["model"]))
+        painter.drawRoundedRect(bubble, BUBBLE_RADIUS, BUBBLE_RADIUS)
+
+        self.renderer.paint(painter, doc, bubble.left() + PAD_X, bubble.top() + PAD_Y)
+
+        footer = self._footer_rect(bubble)
+        painter.setFont(self.time_font)
+        if is_collapsible(index.data(MessageRole)):
+            painter.setPen(LINK_COLOR)
+            painter.drawText(footer, Qt.AlignLeft, SHOW_LESS if index.data(ExpandedRole) else SHOW_MORE)
+        painter.setPen(TIME_COLOR)
+        painter.drawText(footer, Qt.AlignRight, index.data(TimeRole))
+        painter.restore()
+
+    # --- Show more / less ---
+    def editorEvent(self, event, model, option, index) -> bool:
+        if (event.type() == QEvent.MouseButtonRelease and event.button() == Qt.LeftButton
+                and is_collapsible(index.data(MessageRole))):
+            bubble, _ = self._layout(option.rect, index)
+            footer = self._footer_rect(bubble)
+            footer.setWidth(self._time_metrics.horizontalAdvance(SHOW_LESS))
+            if footer.contains(event.position().toPoint()):
+                with span("ui.toggle_message", chars=len(index.data(MessageRole))):
+                    model.setData(index, not index.data(ExpandedRole), ExpandedRole)
+                    self.sizeHintChanged.emit(index)
+                return True
+        return super().editorEvent(event, model, option, index)
+
+
+class ChatHistory(QListView):
+    """
+    Drop-in replacement for the old QScrollArea of ChatBubble widgets.
+
+    Older messages can be paged in above the current ones (`prepend_messages`);
+    `reached_top` asks for them when the user scrolls to the top. Keys returned
+    by `add_message` stay valid across prepends.
+    """
+
+    reached_top = Signal()
+
+    def __init__(self):
+        super().__init__()
+        self._older = 0  # rows prepended above the first added message
+        self.setObjectName("chatHistory")
+        self.chat_model = ChatModel(self)
+        self.setModel(self.chat_model)
+        self.setItemDelegate(ChatDelegate(self))
+
+        # Only lay out what is needed, a batch at a time
+        self.setUniformItemSizes(False)
+        self.setLayoutMode(QListView.Batched)
+        self.setBatchSize(100)
+        self.setResizeMode(QListView.Adjust)
+        self.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel)
+        self.verticalScrollBar().setSingleStep(20)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+
+        self.setSelectionMode(QAbstractItemView.NoSelection)
+        self.setFocusPolicy(Qt.NoFocus)
+
+        self.verticalScrollBar().valueChanged.connect(self._on_scroll)
+
+    def add_message(self, who: str, text: str, is_user=False, is_system=False) -> int:
+        """Append a message and return its key (used to update it later)."""
+        kind = "system" if is_system else ("user" if is_user else "model")
+        with span("ui.add_message", chars=len(text)):
+            row = self.chat_model.append(who, text, kind)
+            self.scrollToBottom()
+        return row - self._older
+
+    def prepend_messages(self, messages: List[Tuple[str, str, str]]):
+        """Insert older (who, text, kind) messages at the top, keeping the view where it is."""
+        if not messages:
+            return
+        with span("ui.prepend_messages", count=len(messages)):
+            at_bottom = self.chat_model.rowCount() == 0
+            self.chat_model.prepend([ChatMessage(who, text, kind, "") for who, text, kind in messages])
+            self._older += len(messages)
+            if at_bottom:
+                self.scrollToBottom()
+            else:
+                # The row that was on top stays on top
+                self.scrollTo(self.chat_model.index(len(messages)), QAbstractItemView.PositionAtTop)
+
+    def update_message(self, key: int, text: str):
+        """Replace the text of an existing message in place."""
+        row = key + self._older
+        with span("ui.update_message", chars=len(text)):
+            self.chat_model.set_text(row, text)
+            if row == self.chat_model.rowCount() - 1:
+                self.scrollToBottom()
+
+    def _on_scroll(self, value: int):
+        bar = self.verticalScrollBar()
+        if value == bar.minimum() and bar.maximum() > bar.minimum():
+            self.reached_top.emit()
+
+    def paintEvent(self, event):
+        with span("ui.paint"):
+            super().paintEvent(event)
@@ -1,102 +1,208 @@
 import logging
 import json
 import re
-from PySide6.QtCore import QObject, Signal, QRunnable, QThreadPool, Qt
+import queue
+import threading
+from PySide6.QtCore import QObject, Signal, QRunnable, QThreadPool, QTimer, Qt
 from PySide6.QtGui import QFont
 from PySide6.QtWidgets import (
     QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
     QLineEdit, QPushButton, QStatusBar, QMessageBox,
-    QLabel, QListWidget, QListWidgetItem, QSplitter,
-    QScrollArea, QSizePolicy
+    QLabel, QListWidget, QListWidgetItem, QSplitter
 )
-from src.ai.gemini_client import GeminiClient   # ✅ switched from HuggingFace to Gemini
-from src.agent.executor import try_execute_from_text
-from datetime import datetime
+from src.ai.gemini_client import DEFAULT_DATA_DIR, GeminiClient   # ✅ switched from HuggingFace to Gemini
+from src.ai.prefetch import Prefetcher
+from src.agent import commands, plan_cache
+from src.agent.executor import execute_commands, new_plan_parser, parse_plan, reply_text
+from src.agent.router import route_command
+from src.automation import readiness
+from src import tracing
+from src.lazy_import import preload
+from src.startup_profile import profiler
+from src.ui.chat_view import ChatHistory
+from src.ui.request_queue import RequestQueue
 
 logger = logging.getLogger(__name__)
 
+HISTORY_PAGE = 30  # remembered turns shown per scroll back
+
 
 # ---------------- Worker Thread ----------------
 class WorkerSignals(QObject):
+    partial = Signal(str)  # accumulated reply text so far (streaming only)
+    command = Signal(object)  # a command object that just closed in the stream
     finished = Signal(str)
     error = Signal(str)
 
 
 class GenerateWorker(QRunnable):
-    def __init__(self, client: GeminiClient, prompt: str):
+    """
+    Asks Gemini without touching history: the request queue commits the
+    exchange once every earlier reply has been delivered. With a
+    `speculation` (started while the user was typing) its reply is replayed
+    instead of asking again.
+    """
+
+    def __init__(self, client: GeminiClient, prompt: str, stream: bool = True, speculation=None):
         super().__init__()
         self.client = client
         self.prompt = prompt
+        self.stream = stream
+        self.speculation = speculation
         self.signals = WorkerSignals()
+        self.cancel_event = threading.Event()
+        self.trace_id = tracing.current_trace()
+
+    def cancel(self):
+        """Stop after the current chunk (a call already waiting on Gemini runs to its timeout)."""
+        self.cancel_event.set()
+        if self.speculation is not None:
+            self.speculation.cancel()
+
+    def run(self):
+        with tracing.trace(self.trace_id):
+            try:
+                if self.stream:
+                    text = ""
+                    parser = new_plan_parser()
+                    if self.speculation is not None:
+                        pieces = self.speculation.stream()
+                    else:
+                        pieces = self.client.generate_stream(self.prompt, remember=False)
+                    for piece in pieces:
+                        if self.cancel_event.is_set():
+                            break
+                        text += piece
+                        self.signals.partial.emit(text)
+                        # Dispatch each command as soon as its JSON object closes
+                        for cmd in parser.feed(piece):
+                            self.signals.command.emit(cmd)
+                    self.signals.finished.emit(text.strip())
+                else:
+                    text = self.client.generate(self.prompt, remember=False)
+                    self.signals.finished.emit(text)
+            except Exception as e:
+                self.signals.error.emit(str(e))
+
+
+class ClientInitSignals(QObject):
+    ready = Signal(object)
+    error = Signal(str)
+
+
+class ClientInitWorker(QRunnable):
+    """Builds the Gemini client (and loads chat memory) after the window is shown."""
+
+    def __init__(self, settings):
+        super().__init__()
+        self.settings = settings
+        self.signals = ClientInitSignals()
 
     def run(self):
         try:
-            text = self.client.generate(self.prompt)
-            self.signals.finished.emit(text)
+            with profiler.phase("GeminiClient() + load memory"):
+                client = GeminiClient(
+                    self.settings.api_key,
+                    self.settings.model,
+                    context_tokens=self.settings.context_tokens,
+                    cache_enabled=self.settings.cache_enabled,
+                    cache_ttl=self.settings.cache_ttl,
+                    data_dir=self.settings.data_dir or None,
+                    request_timeout=self.settings.request_timeout,
+                    retries=self.settings.retries,
+                    hedge=self.settings.hedge,
+                    api_endpoint=self.settings.api_endpoint or None,
+                    fast_model=self.settings.fast_model or None,
+                    fast_max_words=self.settings.fast_max_words,
+                    escalate=self.settings.escalate,
+                    plan_commands=commands.REGISTRY,
+                )
+            self.signals.ready.emit(client)
         except Exception as e:
+            logger.exception("Gemini client failed to start")
             self.signals.error.emit(str(e))
+            return
 
+        # Warm automation modules so the first command doesn't pay for the imports
+        try:
+            with profiler.phase("warm automation modules"):
+                from src.automation import text_input
+                from src.automation.windows import tracker
+                preload(text_input.pyautogui, text_input.pyperclip)
+                tracker.start()
+        except Exception:
+            logger.debug("Warming automation modules failed", exc_info=True)
 
-# ---------------- Chat Bubble UI ----------------
-class ChatBubble(QWidget):
-    def __init__(self, who: str, text: str, is_user: bool = False, is_system: bool = False):
-        super().__init__()
-        self.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Fixed)
-
-        layout = QHBoxLayout(self)
 
-        # --- Alignment ---
-        if is_system:
-            layout.setAlignment(Qt.AlignCenter)
-        else:
-            layout.setAlignment(Qt.AlignRight if is_user else Qt.AlignLeft)
-
-        # Bubble container
-        bubble = QWidget()
-        bubble_layout = QVBoxLayout(bubble)
-        bubble_layout.setContentsMargins(12, 8, 12, 8)
-
-        # Message text
-        msg = QLabel(text)
-        msg.setWordWrap(True)
-        msg.setStyleSheet("color: white; font-size: 14px;")
-        msg.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Preferred)
-        msg.setMaximumWidth(500)
-
-        # Timestamp
-        time_lbl = QLabel(datetime.now().strftime("%H:%M"))
-        time_lbl.setStyleSheet("color: #ddd; font-size: 11px;")
-        time_lbl.setAlignment(Qt.AlignRight)
-
-        bubble_layout.addWidget(msg)
-        bubble_layout.addWidget(time_lbl)
-
-        # --- Colors ---
-        if is_system:
-            color = "#555"     # grey
-        elif is_user:
-            color = "#4CAF50"  # green
-        else:
-            color = "#673AB7"  # purple
+class AutomationSignals(QObject):
+    step = Signal(str, str)  # say, result of one completed step
+    finished = Signal()
 
-        bubble.setStyleSheet(f"""
-            background-color: {color};
-            border-radius: 12px;
-        """)
-        bubble.setMaximumWidth(550)
 
-        layout.addWidget(bubble)
+class AutomationWorker(QRunnable):
+    """
+    Runs a command plan off the GUI thread, reporting each step as it completes.
+    Steps can keep arriving through `push()` while the plan runs (streamed
+    replies); `close()` marks the end of the plan.
 
+    With the `prompt` the plan answers, the outcome is reported to the plan
+    template cache: a Gemini plan that worked is learned, a plan filled in
+    from `template` that failed drops the template.
+    """
 
-class ChatHistory(QWidget):
-    def __init__(self):
+    def __init__(self, plan: list = None, prompt: str = None, template=None):
         super().__init__()
-        self.layout = QVBoxLayout(self)
-        self.layout.setAlignment(Qt.AlignTop)
+        self.cancel_event = threading.Event()
+        self.signals = AutomationSignals()
+        self.trace_id = tracing.current_trace()
+        self.prompt = prompt
+        self.template = template
+        self._ran = []       # commands handed to the executor
+        self._results = []
+        self._steps = queue.Queue()
+        for cmd in plan or []:
+            self.push(cmd)
+        if plan is not None:
+            self.close()
+
+    def push(self, cmd: dict):
+        self._steps.put(cmd)
+
+    def close(self):
+        self._steps.put(None)
+
+    def cancel(self):
+        self.cancel_event.set()
+        self.close()
+
+    def _incoming(self):
+        while True:
+            cmd = self._steps.get()
+            if cmd is None or self.cancel_event.is_set():
+                return
+            self._ran.append(cmd)
+            yield cmd
+
+    def _on_step(self, step, result: str):
+        self._results.extend(result.splitlines())
+        self.signals.step.emit(step.say, result)
 
-    def add_message(self, who: str, text: str, is_user=False, is_system=False):
-        bubble = ChatBubble(who, text, is_user, is_system)
-        self.layout.addWidget(bubble)
+    def run(self):
+        with tracing.trace(self.trace_id):
+            try:
+                execute_commands(self._incoming(), cancel_event=self.cancel_event, on_step=self._on_step)
+                if self.prompt and not self.cancel_event.is_set():
+                    plan_cache.templates.observe(self.prompt, self._ran, self._results, self.template)
+            except Exception as e:
+                logger.exception("Automation plan failed")
+                self.signals.step.emit("", f"⚠️ Automation failed: {e}")
+            finally:
+                self.signals.finished.emit()
+
+
+def _looks_like_command(text: str) -> bool:
+    """True if a (partial) reply is shaping up to be a JSON command plan."""
+    return text.lstrip().startswith(("{", "[", "```"))
 
 
 # ---------------- Main Window ----------------
@@ -107,10 +213,43 @@ class MainWindow(QMainWindow):
         self.setWindowTitle(settings.app_name if hasattr(settings, "app_name") else "Gemini Desktop Agent")
         self.resize(1100, 650)
 
-        # ✅ Use Gemini AI client
-        self.client = GeminiClient(settings.api_key, settings.model)
+        # Learned timings, app history and plan templates live next to the memory
+        data_dir = settings.data_dir or DEFAULT_DATA_DIR
+        readiness.use_data_dir(data_dir)
+        commands.use_data_dir(data_dir, prewarm=settings.prewarm_apps)
+        plan_cache.use_data_dir(data_dir, enabled=settings.plan_templates)
+
+        # ✅ Gemini AI client: built in the background once the window is up
+        self.client = None
+        self._client_waiters = []  # callbacks to run once the client is ready
+        self._client_init_started = False
+        self._painted = False
         self.pool = QThreadPool.globalInstance()
 
+        # Gemini requests: bounded concurrency, replies and history commits in order
+        self.requests = RequestQueue(
+            self.start_request,
+            lambda prompt, reply: self.with_client(lambda client: client.record(prompt, reply)),
+            max_in_flight=settings.max_in_flight,
+            supersede=settings.supersede,
+            parent=self,
+        )
+        self.requests.partial.connect(self.on_ai_partial)
+        self.requests.command.connect(self.on_ai_command)
+        self.requests.finished.connect(lambda rid, text: self.on_ai_reply(text, rid))
+        self.requests.error.connect(self.on_request_error)
+        self.requests.dropped.connect(self.on_request_dropped)
+        self.requests.busy_changed.connect(lambda busy: self.update_stop_button())
+
+        # Prompts of requests sent to Gemini, keyed by request id (plans learn from them)
+        self._prompts = {}
+        # Chat rows that are being grown by streaming replies, keyed by request id
+        self._stream_rows = {}
+        # Plans started from a still-streaming reply, keyed by request id
+        self._stream_plans = {}
+        # Automation plans currently running in the background
+        self._automation = set()
+
         # --- Sidebar ---
         sidebar = QListWidget()
         sidebar.setFixedWidth(200)
@@ -145,12 +284,28 @@ class MainWindow(QMainWindow):
         header.setStyleSheet("padding: 12px; background:#673AB7; color:white; border-radius:8px;")
         chat_layout.addWidget(header)
 
-        # Chat history (scrollable with bubbles)
-        scroll = QScrollArea()
-        scroll.setWidgetResizable(True)
+        # History search: results from the memory index as you type
+        self.search_box = QLineEdit()
+        self.search_box.setPlaceholderText("🔍 Search conversation history…")
+        self.search_box.setClearButtonEnabled(True)
+        self.search_box.setStyleSheet("padding:6px; border-radius:8px; background:#333; color:white;")
+        self._search_timer = QTimer(self, singleShot=True, interval=150)
+        self._search_timer.timeout.connect(self.run_search)
+        self.search_box.textChanged.connect(lambda _t: self._search_timer.start())
+        self.search_results = QListWidget()
+        self.search_results.setMaximumHeight(180)
+        self.search_results.setWordWrap(True)
+        self.search_results.setToolTip("Click a result to copy it into the message box")
+        self.search_results.itemClicked.connect(self.on_search_result_clicked)
+        self.search_results.hide()
+        chat_layout.addWidget(self.search_box)
+        chat_layout.addWidget(self.search_results)
+
+        # Chat history (virtualized list of painted bubbles)
         self.chat_history = ChatHistory()
-        scroll.setWidget(self.chat_history)
-        chat_layout.addWidget(scroll)
+        self.chat_history.reached_top.connect(self.load_older_messages)
+        self._older_pos = 0  # remembered turns before this one are not shown yet
+        chat_layout.addWidget(self.chat_history)
 
         # Input row
         input_row = QHBoxLayout()
@@ -158,6 +313,15 @@ class MainWindow(QMainWindow):
         self.input.setPlaceholderText("Type a message...")
         self.input.setFont(QFont("Segoe UI", 12))
         self.input.returnPressed.connect(self.on_send)
+        # Ask Gemini once typing pauses; the reply is reused if that text is sent
+        self.prefetch = Prefetcher(enabled=settings.prefetch, wasted_per_minute=settings.prefetch_budget)
+        self._prefetch_timer = QTimer(self, singleShot=True, interval=settings.prefetch_delay_ms)
+        self._prefetch_timer.timeout.connect(self.prefetch_reply)
+        self.input.textChanged.connect(lambda _t: self._prefetch_timer.start())
+        # Start the app a request is heading towards ("open wo…") while it is typed
+        self._prewarm_timer = QTimer(self, singleShot=True, interval=250)
+        self._prewarm_timer.timeout.connect(self.prewarm_predicted_app)
+        self.input.textChanged.connect(lambda _t: self._prewarm_timer.start())
         self.input.setStyleSheet("""
             QLineEdit {
                 background:#FFF;
@@ -181,8 +345,25 @@ class MainWindow(QMainWindow):
         """)
         self.send_btn.clicked.connect(self.on_send)
 
+        # Stop button: cancels pending Gemini requests and running automation plans
+        self.stop_btn = QPushButton("■")
+        self.stop_btn.setFixedSize(50, 50)
+        self.stop_btn.setToolTip("Stop pending replies and running commands")
+        self.stop_btn.setStyleSheet("""
+            QPushButton {
+                background:#C62828;
+                border-radius:25px;
+                color:white;
+                font-size:18px;
+            }
+            QPushButton:hover { background:#B71C1C; }
+        """)
+        self.stop_btn.clicked.connect(self.cancel_all)
+        self.stop_btn.hide()
+
         input_row.addWidget(self.input)
         input_row.addWidget(self.send_btn)
+        input_row.addWidget(self.stop_btn)
         chat_layout.addLayout(input_row)
 
         # --- Splitter for Sidebar + Chat ---
@@ -197,72 +378,282 @@ class MainWindow(QMainWindow):
         self.is_dark = True
         self.apply_theme()
 
+    # --- Startup ---
+    def showEvent(self, event):
+        super().showEvent(event)
+        if not self._client_init_started:
+            self._client_init_started = True
+            worker = ClientInitWorker(self.settings)
+            worker.signals.ready.connect(self.on_client_ready)
+            worker.signals.error.connect(self.on_client_error)
+            self.pool.start(worker)
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if not self._painted:
+            self._painted = True
+            profiler.mark("first paint")
+
+    def on_client_ready(self, client: GeminiClient):
+        profiler.mark("client ready")
+        profiler.report_once()
+        self.client = client
+        self.prefetch.client = client
+        self._older_pos = len(client.history)
+        self.load_older_messages()
+        waiters, self._client_waiters = self._client_waiters, []
+        for fn in waiters:
+            fn(client)
+        if waiters:
+            self.statusBar().clearMessage()
+
+    def on_client_error(self, error: str):
+        profiler.report_once()
+        self._client_waiters.clear()
+        self.requests.cancel()
+        QMessageBox.critical(self, "Error", error)
+
+    def with_client(self, fn):
+        """Run fn(client) now, or as soon as the background startup has built it."""
+        if self.client is not None:
+            fn(self.client)
+        else:
+            self._client_waiters.append(fn)
+            self.statusBar().showMessage("Starting Gemini…")
+
+    # --- Remembered conversation ---
+    def load_older_messages(self):
+        """Show the previous page of remembered turns above the chat."""
+        if self.client is None or self._older_pos == 0:
+            return
+        start = max(0, self._older_pos - HISTORY_PAGE)
+        turns = self.client.page(start, self._older_pos)
+        self._older_pos = start
+        self.chat_history.prepend_messages([
+            ("You", t["content"], "user") if t["role"] == "user" else ("Gemini", t["content"], "model")
+            for t in turns
+        ])
+
+    # --- History search ---
+    def run_search(self):
+        query = self.search_box.text().strip()
+        self.search_results.clear()
+        if not query or self.client is None:
+            self.search_results.hide()
+            return
+        hits = self.client.search(query, limit=20)
+        for _pos, turn in hits:
+            who = "You" if turn["role"] == "user" else "Gemini"
+            snippet = " ".join(turn["content"].split())[:160]
+            item = QListWidgetItem(f"{who}: {snippet}")
+            item.setData(Qt.UserRole, turn["content"])
+            self.search_results.addItem(item)
+        if not hits:
+            self.search_results.addItem("No matches")
+        self.search_results.show()
+
+    def on_search_result_clicked(self, item: QListWidgetItem):
+        text = item.data(Qt.UserRole)
+        if text:
+            self.input.setText(text)
+            self.input.setFocus()
+
+    def prewarm_predicted_app(self):
+        text = self.input.text()
+        if not self.settings.prewarm_apps or commands.app_registry.predict(text) is None:
+            return
+        # Checking running windows and launching can take a moment; keep it off the GUI thread
+        threading.Thread(target=commands.app_registry.prewarm_for, args=(text,),
+                         name="app-prewarm", daemon=True).start()
+
+    def prefetch_reply(self):
+        text = self.input.text().strip()
+        # Local plans (router or learned template) need no model, and while a
+        # request is busy its reply would land in history first and make the speculation stale
+        if (not text or route_command(text) is not None or self.requests.busy()
+                or plan_cache.templates.lookup(text, record=False) is not None):
+            self.prefetch.cancel()
+            return
+        self.prefetch.speculate(text)
+
     # --- Chat Helpers ---
     def append_message(self, who: str, text: str):
         if who == "System":
-            self.chat_history.add_message(who, text, is_system=True)
-        else:
-            self.chat_history.add_message(who, text, is_user=(who == "You"))
+            return self.chat_history.add_message(who, text, is_system=True)
+        return self.chat_history.add_message(who, text, is_user=(who == "You"))
 
     def on_send(self):
         text = self.input.text().strip()
         if not text:
             return
-        self.append_message("You", text)
-        self.input.clear()
-
-        worker = GenerateWorker(self.client, text)
-        worker.signals.finished.connect(self.on_ai_reply)
-        worker.signals.error.connect(lambda e: QMessageBox.critical(self, "Error", e))
+        # Everything this message causes (model call, plan, waits) shares one trace
+        with tracing.trace(tracing.new_trace()), tracing.span("ui.send"):
+            self.append_message("You", text)
+            self.input.clear()
+
+            # Fast path: recognizable commands run locally with no model round trip
+            route = route_command(text)
+            if route is not None:
+                self.run_local_plan(text, route.commands)
+                return
+
+            # Same shape as a plan Gemini gave before: fill in the new values
+            hit = plan_cache.templates.lookup(text)
+            if hit is not None:
+                logger.info("Plan template hit: %s", hit.template.pattern)
+                self.run_local_plan(text, hit.plan, template=hit.template)
+                return
+
+            self.requests.submit(text)
+
+    def start_request(self, request_id: int, prompt: str) -> GenerateWorker:
+        """Called by the request queue when a slot frees up."""
+        self._prompts[request_id] = prompt
+        worker = GenerateWorker(None, prompt, speculation=self.prefetch.take(prompt))
+        signals, requests = worker.signals, self.requests
+        signals.partial.connect(lambda t, rid=request_id: requests.on_partial(rid, t))
+        signals.command.connect(lambda c, rid=request_id: requests.on_command(rid, c))
+        signals.finished.connect(lambda t, rid=request_id: requests.on_finished(rid, t))
+        signals.error.connect(lambda e, rid=request_id: requests.on_error(rid, e))
+
+        def launch(client):
+            if worker.cancel_event.is_set():
+                signals.finished.emit("")  # cancelled before it started; free the slot
+                return
+            worker.client = client
+            self.pool.start(worker)
+        self.with_client(launch)
+        return worker
+
+    def on_request_error(self, request_id: int, error: str):
+        self._prompts.pop(request_id, None)
+        QMessageBox.critical(self, "Error", error)
+
+    def on_request_dropped(self, request_id: int, reason: str):
+        self._prompts.pop(request_id, None)
+        self._stream_rows.pop(request_id, None)
+        plan = self._stream_plans.pop(request_id, None)
+        if plan is not None:
+            plan.cancel()
+        self.append_message("System", f"⏹️ Reply {reason}.")
+
+    def run_local_plan(self, prompt: str, plan: list, template=None):
+        """Execute a plan built locally (router or plan template) and record it in history."""
+        logger.info("Routed locally: %s", [c["command"] for c in plan])
+        self.prefetch.cancel()
+        self.requests.record(prompt, json.dumps(plan, ensure_ascii=False))
+        self.run_plan(plan, prompt=prompt if template is not None else None, template=template)
+
+    # --- Automation ---
+    def run_plan(self, plan: list = None, prompt: str = None, template=None) -> AutomationWorker:
+        """
+        Run a command plan in the background; each step shows up as it completes.
+        With no plan, returns an open worker that steps are pushed into.
+        `prompt` and `template` are passed on for plan template learning.
+        """
+        worker = AutomationWorker(plan, prompt=prompt, template=template)
+        worker.signals.step.connect(self.on_step_done)
+        worker.signals.finished.connect(lambda w=worker: self.on_plan_finished(w))
+        self._automation.add(worker)
+        self.update_stop_button()
+        self.statusBar().showMessage("Running commands…")
         self.pool.start(worker)
+        return worker
+
+    def on_step_done(self, say: str, result: str):
+        if say:
+            self.append_message("Gemini", say)
+        if result:
+            self.append_message("System", result)
+
+    def on_plan_finished(self, worker: AutomationWorker):
+        self._automation.discard(worker)
+        self.update_stop_button()
+        if not self._automation:
+            self.statusBar().clearMessage()
+
+    def cancel_automation(self):
+        for worker in self._automation:
+            worker.cancel()
+        self.statusBar().showMessage("Cancelling after the current step…")
+
+    def cancel_all(self):
+        self.requests.cancel()
+        if self._automation:
+            self.cancel_automation()
+
+    def update_stop_button(self):
+        self.stop_btn.setVisible(bool(self._automation) or self.requests.busy())
+
+    def on_ai_partial(self, request_id: int, text: str):
+        """Grow a single Gemini message in place while the reply streams in."""
+        if _looks_like_command(text):
+            # Command plans are executed once complete; don't show raw JSON
+            self.statusBar().showMessage("Gemini is preparing commands…")
+            return
+
+        row = self._stream_rows.get(request_id)
+        if row is None:
+            self._stream_rows[request_id] = self.append_message("Gemini", text)
+        else:
+            self.chat_history.update_message(row, text)
 
-    def on_ai_reply(self, text: str):
+    def on_ai_command(self, request_id: int, cmd: dict):
+        """Start executing a streamed plan as soon as its first command closes."""
+        worker = self._stream_plans.get(request_id)
+        if worker is None:
+            worker = self._stream_plans[request_id] = self.run_plan(prompt=self._prompts.get(request_id))
+        worker.push(cmd)
+
+    @tracing.traced("ui.reply")
+    def on_ai_reply(self, text: str, request_id: int = None):
         """
         Handle Gemini replies. Supports JSON commands or plain text.
         """
-        executed = False
-
-        try:
-            data = json.loads(text)
-            if isinstance(data, list):
-                for cmd in data:
-                    say, result = try_execute_from_text(json.dumps(cmd))
-                    if say:
-                        self.append_message("Gemini", say)
-                    if result:
-                        self.append_message("System", result)
-                executed = True
-            elif isinstance(data, dict):
-                say, result = try_execute_from_text(text)
-                if say:
-                    self.append_message("Gemini", say)
-                if result:
-                    self.append_message("System", result)
-                executed = True
-        except Exception:
-            pass
+        if not self._automation:
+            self.statusBar().clearMessage()
+        prompt = self._prompts.pop(request_id, None)
+        stream_row = self._stream_rows.pop(request_id, None)
+        streamed_plan = self._stream_plans.pop(request_id, None)
+
+        plan = parse_plan(text) if streamed_plan is None else None
+        if streamed_plan is not None or plan is not None:
+            if stream_row is not None:
+                # Prose streamed before the JSON; keep only the prose
+                cut = min(i for i in (text.find("{"), text.find("["), text.find("```")) if i != -1)
+                self.chat_history.update_message(stream_row, text[:cut].strip() or "…")
+            if streamed_plan is not None:
+                streamed_plan.close()  # every step was already dispatched while streaming
+            else:
+                self.run_plan(plan, prompt=prompt)
+            return
 
-        # Fallback for plain text
-        if not executed:
-            say, result = try_execute_from_text(text)
-            self.append_message("Gemini", say or text)
-            if result:
-                self.append_message("System", result)
+        # Plain text reply (or commands we don't support: show what they'd have said)
+        text = reply_text(text)
+        if stream_row is not None:
+            self.chat_history.update_message(stream_row, text)
+        else:
+            self.append_message("Gemini", text)
 
     def closeEvent(self, event):
+        self.requests.cancel()
+        self.cancel_automation()
         # Optional: save memory if implemented later
-        if hasattr(self.client, "save_memory"):
+        if self.client is not None and hasattr(self.client, "save_memory"):
             self.client.save_memory()
+        stats = self.prefetch.stats()
+        if stats.started:
+            logger.info("Prefetch stats: %s (hit rate %.0f%%)", stats, stats.hit_rate * 100)
         super().closeEvent(event)
 
     def apply_theme(self):
         if self.is_dark:
             self.setStyleSheet("""
                 QMainWindow { background-color: #121212; color: #EEE; }
-                QScrollArea { background-color: #1E1E1E; border:none; }
+                QListView#chatHistory { background-color: #1E1E1E; border:none; }
             """)
         else:
             self.setStyleSheet("""
                 QMainWindow { background-color: #F5F5F5; color: #111; }
-                QScrollArea { background-color: #FFFFFF; border:1px solid #CCC; }
+                QListView#chatHistory { background-color: #FFFFFF; border:1px solid #CCC; }
             """)
@@ -0,0 +1,109 @@
+"""Markdown message layout for chat bubbles: cached QTextDocuments, collapsed long replies."""
+from collections import OrderedDict
+from typing import Hashable, Tuple
+
+from PySide6.QtCore import QRectF, QSizeF
+from PySide6.QtGui import (
+    QAbstractTextDocumentLayout, QColor, QFont, QPainter, QPalette, QTextDocument, QTextOption
+)
+
+COLLAPSE_CHARS = 1500   # longer messages show a preview and "Show more"
+CACHE_SIZE = 300        # laid-out documents kept around (one per message)
+FENCE = "```"
+
+
+class MessageStyle:
+    """
+    Everything a message document needs, built once and shared by every
+    document (the old bubbles each parsed their own stylesheet).
+    """
+
+    def __init__(self, font: QFont, text_color: QColor, link_color: QColor):
+        self.font = font
+        self.option = QTextOption()
+        self.option.setWrapMode(QTextOption.WrapAtWordBoundaryOrAnywhere)
+        self.paint_context = QAbstractTextDocumentLayout.PaintContext()
+        palette = QPalette()
+        palette.setColor(QPalette.Text, text_color)
+        palette.setColor(QPalette.Link, link_color)
+        self.paint_context.palette = palette
+
+    def apply(self, doc: QTextDocument):
+        doc.setDefaultFont(self.font)
+        doc.setDefaultTextOption(self.option)
+        doc.setDocumentMargin(0)
+        doc.setUndoRedoEnabled(False)
+
+
+def preview(text: str, limit: int = COLLAPSE_CHARS) -> str:
+    """The part of a long message shown while it is collapsed."""
+    if len(text) <= limit:
+        return text
+    cut = text.rfind("\n\n", 0, limit)
+    if cut < limit // 2:
+        cut = text.rfind(" ", 0, limit)
+    if cut < limit // 2:
+        cut = limit
+    head = text[:cut].rstrip() + " …"
+    if head.count(FENCE) % 2:
+        head += "\n" + FENCE  # don't leave a code block open
+    return head
+
+
+def is_collapsible(text: str) -> bool:
+    return len(text) > COLLAPSE_CHARS
+
+
+class MessageRenderer:
+    """
+    Turns message text into a laid-out QTextDocument, once. Model replies are
+    rendered as Markdown, everything else as plain text. Documents are cached
+    per message: a reply that is streaming in replaces its own entry instead
+    of adding one per chunk (which would push the visible rows out of the
+    cache), a collapsed reply keeps reusing its preview, and the hidden part
+    is only parsed and laid out once the message is expanded. Layout is
+    redone only when the text width actually changes.
+    """
+
+    def __init__(self, style: MessageStyle, cache_size: int = CACHE_SIZE):
+        self.style = style
+        self.cache_size = cache_size
+        # message key -> (markdown, shown text, document)
+        self._docs: "OrderedDict[Hashable, Tuple[bool, str, QTextDocument]]" = OrderedDict()
+
+    def document(self, key: Hashable, text: str, markdown: bool, expanded: bool,
+                 width: int) -> QTextDocument:
+        """The laid-out document for message `key` showing `text` at `width` pixels."""
+        shown = text if expanded else preview(text)
+        entry = self._docs.get(key)
+        if entry is not None and entry[:2] == (markdown, shown):
+            self._docs.move_to_end(key)
+            doc = entry[2]
+        else:
+            doc = entry[2] if entry is not None else QTextDocument()
+            if entry is None:
+                self.style.apply(doc)
+            if markdown:
+                doc.setMarkdown(shown)
+            else:
+                doc.setPlainText(shown)
+            self._docs[key] = (markdown, shown, doc)
+            self._docs.move_to_end(key)
+            while len(self._docs) > self.cache_size:
+                self._docs.popitem(last=False)
+        if doc.textWidth() != width:
+            doc.setTextWidth(width)
+        return doc
+
+    @staticmethod
+    def size(doc: QTextDocument) -> QSizeF:
+        """Size of the laid-out text; narrower than the width for short messages."""
+        return QSizeF(min(doc.idealWidth(), doc.textWidth()), doc.size().height())
+
+    def paint(self, painter: QPainter, doc: QTextDocument, left: int, top: int):
+        painter.save()
+        painter.translate(left, top)
+        ctx = self.style.paint_context
+        ctx.clip = QRectF(0, 0, doc.textWidth(), doc.size().height())
+        doc.documentLayout().draw(painter, ctx)
+        painter.restore()
@@ -0,0 +1,208 @@
+"""Per-conversation Gemini request queue: bounded concurrency, in-order replies."""
+import logging
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+from PySide6.QtCore import QObject, Signal
+
+from src import tracing
+from src.ai.gemini_client import ERROR_PREFIX
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Request:
+    id: int
+    prompt: str
+    local: bool = False          # answered without Gemini; only needs committing
+    reply: Optional[str] = None
+    error: Optional[str] = None
+    done: bool = False
+    worker: object = None        # anything with cancel(); set once started
+    partial: str = ""            # buffered until this request reaches the head
+    commands: List[dict] = field(default_factory=list)
+    flushed: bool = False        # buffered output has been emitted
+    trace: Optional[str] = field(default_factory=tracing.current_trace)
+
+
+class RequestQueue(QObject):
+    """
+    Runs at most `max_in_flight` requests at once and hands their output to
+    the UI strictly in submission order: a later reply that finishes first is
+    held back until everything before it has been delivered. Each delivered
+    exchange is committed to history (via `commit`) in that same order, so
+    history is never interleaved. Lives on the GUI thread; workers report
+    back through queued signals.
+
+    With `supersede`, a new message drops requests that have not started yet.
+    When more than `max_pending` are waiting, the oldest waiting one is dropped.
+    """
+
+    partial = Signal(int, str)      # request id, accumulated text
+    command = Signal(int, object)   # request id, streamed command
+    finished = Signal(int, str)     # request id, full reply
+    error = Signal(int, str)
+    dropped = Signal(int, str)      # request id, reason
+    busy_changed = Signal(bool)
+
+    def __init__(self, start: Callable[[int, str], object], commit: Callable[[str, str], None],
+                 max_in_flight: int = 1, max_pending: int = 4, supersede: bool = False,
+                 parent=None):
+        """
+        Args:
+            start: start(request_id, prompt) launches a worker and returns it;
+                the worker must have cancel() and report back via on_* slots.
+            commit: commit(prompt, reply) records a finished exchange in history.
+        """
+        super().__init__(parent)
+        self._start = start
+        self._commit = commit
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_pending = max(0, max_pending)
+        self.supersede = supersede
+        self._order: deque = deque()            # undelivered requests, in submission order
+        self._requests: Dict[int, Request] = {}
+        self._waiting: deque = deque()          # ids not started yet
+        self._running: Dict[int, Request] = {}  # started and not discarded yet
+        self._next_id = 0
+        self._busy = False
+
+    # --- Submitting ---
+    def submit(self, prompt: str) -> int:
+        """Queue a prompt for Gemini and return its request id."""
+        if self.supersede:
+            self._drop_waiting(len(self._waiting), "superseded by a newer message")
+        elif len(self._waiting) >= self.max_pending:
+            self._drop_waiting(len(self._waiting) - self.max_pending + 1, "too many queued messages")
+        req = self._add(Request(self._new_id(), prompt))
+        self._waiting.append(req.id)
+        self._pump()
+        self._deliver()  # marks it as the head if nothing is ahead of it
+        return req.id
+
+    def record(self, prompt: str, reply: str) -> int:
+        """Commit an exchange answered locally, after everything queued before it."""
+        req = self._add(Request(self._new_id(), prompt, local=True, reply=reply, done=True))
+        self._deliver()
+        return req.id
+
+    def cancel(self):
+        """Cancel every request that has not been delivered yet."""
+        for req in list(self._order):
+            if req.local:
+                continue
+            if req.worker is not None:
+                req.worker.cancel()
+            self._discard(req, "cancelled")
+        self._waiting.clear()
+        self._deliver()
+        self._pump()
+
+    def busy(self) -> bool:
+        return any(not r.local for r in self._order) or bool(self._running)
+
+    # --- Worker callbacks ---
+    def on_partial(self, request_id: int, text: str):
+        req = self._live(request_id)
+        if req is None:
+            return
+        req.partial = text
+        if req.flushed:
+            with tracing.trace(req.trace):
+                self.partial.emit(req.id, text)
+
+    def on_command(self, request_id: int, cmd: dict):
+        req = self._live(request_id)
+        if req is None:
+            return
+        if req.flushed:
+            with tracing.trace(req.trace):
+                self.command.emit(req.id, cmd)
+        else:
+            req.commands.append(cmd)
+
+    def on_finished(self, request_id: int, text: str):
+        self._running.pop(request_id, None)
+        req = self._live(request_id)
+        if req is not None:
+            req.reply, req.done = text, True
+        self._deliver()  # commit first, so the next request's context includes it
+        self._pump()
+
+    def on_error(self, request_id: int, error: str):
+        self._running.pop(request_id, None)
+        req = self._live(request_id)
+        if req is not None:
+            req.error, req.done = error, True
+        self._deliver()
+        self._pump()
+
+    # --- Internals ---
+    def _new_id(self) -> int:
+        self._next_id += 1
+        return self._next_id
+
+    def _add(self, req: Request) -> Request:
+        self._order.append(req)
+        self._requests[req.id] = req
+        return req
+
+    def _live(self, request_id: int) -> Optional[Request]:
+        """The request if it is still waiting to be delivered."""
+        return self._requests.get(request_id)
+
+    def _discard(self, req: Request, reason: str):
+        # A cancelled worker may sit in a model call until its timeout; its
+        # result is ignored, so don't let it hold a slot for the next message
+        self._running.pop(req.id, None)
+        self._order.remove(req)
+        del self._requests[req.id]
+        logger.info("Request %d %s", req.id, reason)
+        self.dropped.emit(req.id, reason)
+
+    def _drop_waiting(self, count: int, reason: str):
+        for _ in range(count):
+            self._discard(self._requests[self._waiting.popleft()], reason)
+
+    def _pump(self):
+        """Start waiting requests while there are free slots."""
+        while self._waiting and len(self._running) < self.max_in_flight:
+            req = self._requests[self._waiting.popleft()]
+            self._running[req.id] = req
+            with tracing.trace(req.trace):
+                req.worker = self._start(req.id, req.prompt)
+        self._update_busy()
+
+    def _deliver(self):
+        """Hand finished requests at the head of the line to the UI, in order."""
+        while self._order:
+            req = self._order[0]
+            with tracing.trace(req.trace):
+                if not req.flushed and not req.local:
+                    # Now at the head: show what streamed in while it was waiting
+                    req.flushed = True
+                    if req.partial:
+                        self.partial.emit(req.id, req.partial)
+                    for cmd in req.commands:
+                        self.command.emit(req.id, cmd)
+                    req.commands.clear()
+                if not req.done:
+                    break
+                self._order.popleft()
+                del self._requests[req.id]
+                if req.error is not None:
+                    self.error.emit(req.id, req.error)
+                    continue
+                if ERROR_PREFIX not in req.reply:
+                    self._commit(req.prompt, req.reply)
+                if not req.local:
+                    self.finished.emit(req.id, req.reply)
+        self._update_busy()
+
+    def _update_busy(self):
+        busy = self.busy()
+        if busy != self._busy:
+            self._busy = busy
+            self.busy_changed.emit(busy)